@@ -0,0 +1,160 @@
+"""
+The agenda of the Rete engine: which rule fires next.
+
+Every activation of a rule (a set of bindings for its antecedent) is
+kept in a priority queue, ordered by a conflict resolution strategy.
+Activations are added as the network finds them and dropped as they
+go away, so picking the next rule to fire takes O(log n) time, not a
+scan over every rule.  The strategies are:
+
+ - 'order': the first rule in the list, and among its activations
+   the first in sorted order.  This is how forward_chain() has always
+   picked rules.  The naive engine takes the bindings of a rule in
+   whatever order it finds them, which can change from run to run
+   (with PYTHONHASHSEED), so with rules that DELETE facts its result
+   can change too; the result of 'order' is always one of them.
+ - 'recency': the rule with the activation whose bindings came
+   about most recently.
+ - 'specificity': the rule with the most conditions (counting the
+   patterns in its AND, OR and NOT conditions), then rule order.
+ - 'salience': the rule with the highest salience (see IF), then
+   rule order.
+
+Whatever the strategy, a rule that fires does so on all of its
+activations that change the data, in the strategy's order, or just
+for one change with apply_only_one.
+
+Only 'order' is sure to give a result the naive engine could give.
+Rules that test with NOT (or DELETE facts) can come up with different
+facts if they fire in a different order: with the family_rules of lab1.py on
+black_data, 'recency' and 'specificity' derive facts such as
+'brother sirius sirius', because the rule that says everyone is
+the same as themselves hasn't fired yet when the sibling rule's NOT
+tests for it.
+"""
+
+from heapq import heapify, heappush, heappop
+
+from production import RuleExpression
+
+
+def _patterns(condition):
+    if isinstance(condition, RuleExpression):
+        return sum([_patterns(part) for part in condition])
+    return 1
+
+# Each strategy maps a Production (see rete.py), one of its tokens
+# and when the token came about to a sort key: the smallest fires
+# first.
+STRATEGIES = {
+    'order': lambda production, token, born: (production.index, token),
+    'recency': lambda production, token, born: (-born, production.index,
+                                                token),
+    'specificity': lambda production, token, born: (
+        -_patterns(production.rule.antecedent()), production.index, token),
+    'salience': lambda production, token, born: (
+        -production.rule.salience(), production.index, token),
+}
+
+
+class Agenda(object):
+    """
+    The activations waiting to be considered, in a heap ordered by a
+    strategy.  An activation that goes away is only marked as gone,
+    and skipped when it comes to the top; the heap is rebuilt when
+    most of it is gone.
+    """
+    def __init__(self, strategy='order'):
+        if strategy not in STRATEGIES:
+            raise ValueError("Unknown conflict resolution strategy: %s"
+                             % strategy)
+        self.strategy = STRATEGIES[strategy]
+        self._heap = []
+        # production -> {token: its heap entry}
+        self._queued = {}
+        self._count = 0
+        self._serial = 0
+        # Whether each activation changed since mark() was queued then
+        self._saved = None
+
+    def __len__(self):
+        return self._count
+
+    def clear(self):
+        """Drop every activation."""
+        self._heap = []
+        self._queued = {}
+        self._count = 0
+        self._saved = None
+
+    def add(self, production, token, born=0):
+        """Queue an activation, unless it is already queued."""
+        tokens = self._queued.setdefault(production, {})
+        if token in tokens: return
+        self._save(production, token, False)
+        self._serial += 1
+        # The serial number breaks ties, so productions are never
+        # compared
+        entry = (self.strategy(production, token, born), self._serial,
+                 production, token)
+        tokens[token] = entry
+        self._count += 1
+        heappush(self._heap, entry)
+        if len(self._heap) > 2 * self._count + 64:
+            self._heap = [entry for tokens in self._queued.values()
+                          for entry in tokens.values()]
+            heapify(self._heap)
+
+    def remove(self, production, token):
+        """Drop an activation, if it is queued."""
+        tokens = self._queued.get(production)
+        if tokens and tokens.pop(token, None) is not None:
+            self._count -= 1
+            self._save(production, token, True)
+
+    def pop(self):
+        """
+        Take the first activation off the agenda, as a (production,
+        token) pair, or return None if there are none.
+        """
+        heap = self._heap
+        while heap:
+            entry = heappop(heap)
+            key, serial, production, token = entry
+            tokens = self._queued.get(production)
+            if tokens and tokens.get(token) is entry:
+                del tokens[token]
+                self._count -= 1
+                return production, token
+        return None
+
+    def mark(self):
+        """Start keeping track of the changes to undo with restore()."""
+        self._saved = {}
+
+    def forget(self):
+        """Stop keeping track, keeping the changes since mark()."""
+        self._saved = None
+
+    def restore(self):
+        """
+        Put the activations back the way they were at mark(): queue
+        again those that were queued then (with Production.queue, so
+        only if they are still activations), and drop the rest.
+        """
+        saved, self._saved = self._saved, None
+        for (production, token), was_queued in saved.items():
+            if was_queued:
+                production.queue(token)
+            else:
+                self.remove(production, token)
+
+    def _save(self, production, token, was_queued):
+        if self._saved is not None:
+            self._saved.setdefault((production, token), was_queued)
+
+    def take(self, production):
+        """Take all of the activations of 'production', in order."""
+        tokens = self._queued.pop(production, {})
+        self._count -= len(tokens)
+        return [entry[3] for entry in sorted(tokens.values())]
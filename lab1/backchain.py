@@ -1,5 +1,6 @@
 from production import AND, OR, NOT, PASS, FAIL, IF, THEN, \
      match, populate, simplify, variables
+from utils import AIRegex, compile_pattern
 from zookeeper import ZOOKEEPER_RULES
 
 # This function, which you need to write, takes in a hypothesis
@@ -15,27 +16,175 @@ from zookeeper import ZOOKEEPER_RULES
 
 
 def backchain_to_goal_tree(rules, hypothesis):
-    unbound = [ (rule.antecedent(),
-                 match(rule.consequent()[0], hypothesis))
-                for rule in rules if not
-                match(rule.consequent()[0], hypothesis)
-                is None ]
-    bound = OR( hypothesis )
-    for (ante, binding) in unbound:
-        if type(ante) is AND:
-            node_list = [populate(exp, binding)
-                         for exp in ante]
-            bound.append(AND([backchain_to_goal_tree(rules, node)
-                              for node in node_list]))
-        elif type(ante) is OR:
-            node_list = [populate(exp, binding)
-                         for exp in ante]
-            bound.append(OR([backchain_to_goal_tree(rules, node)
-                             for node in node_list]))
+    """
+    Build the goal tree for 'hypothesis': an OR of the hypothesis
+    itself and, for every rule whose (first) consequent matches it,
+    the goal tree of that rule's antecedent, filled in with the
+    match.
+
+    Each hypothesis is expanded only once and the result shared
+    wherever it comes up again, so the tree is built as a DAG and
+    then flattened by simplify().  A hypothesis that comes up again
+    while it is still being expanded -- as it does with recursive
+    rules -- is left as a plain goal at that point, so the expansion
+    always ends.  Variables that a rule's consequent doesn't bind are
+    left in its antecedent's goals, renamed if need be so that they
+    aren't mistaken for variables that are already in the tree.
+    """
+    index = RuleIndex(rules)
+    used = set(_variables(hypothesis))
+    tree, cut = _goal_tree(index, hypothesis, {}, set(), used)
+    return simplify(tree)
+
+def _goal_tree(index, hypothesis, memo, active, used):
+    """
+    Return the goal tree for 'hypothesis', and the set of the
+    hypotheses being expanded above it (in 'active') at which it
+    stopped.  A tree that didn't stop at any of them doesn't depend
+    on where it came up, so it is kept in 'memo' for next time.
+    'used' is the set of the variables in the tree so far.
+
+    The hypotheses in 'active' are kept as _canonical() keys, so that
+    one that only differs from a hypothesis above it in the names of
+    its variables stops there too.
+    """
+    if not isinstance(hypothesis, str):
+        # An AND, OR or NOT of goals
+        parts, cut = [], set()
+        for part in hypothesis:
+            tree, part_cut = _goal_tree(index, part, memo, active, used)
+            parts.append(tree)
+            cut |= part_cut
+        return hypothesis.__class__(*parts), cut
+
+    if hypothesis in memo:
+        return memo[hypothesis], set()
+    key = _canonical(hypothesis)
+    if key in active:
+        return hypothesis, set([key])
+
+    active.add(key)
+    tree, cut = OR(hypothesis), set()
+    for rule, binding in index.matches(hypothesis):
+        binding = rename_apart(rule, binding, used)
+        subtree, subtree_cut = _goal_tree(index,
+                                          fill(rule.antecedent(), binding),
+                                          memo, active, used)
+        tree.append(subtree)
+        cut |= subtree_cut
+    active.remove(key)
+
+    cut.discard(key)
+    if not cut:
+        memo[hypothesis] = tree
+    return tree, cut
+
+def _canonical(hypothesis):
+    # The hypothesis with its variables numbered in order, so that it
+    # is the same whatever they are called
+    numbers = {}
+    def number(variable):
+        name = variable.group(1)
+        if name not in numbers:
+            numbers[name] = '(?%d)' % len(numbers)
+        return numbers[name]
+    return AIRegex.sub(number, hypothesis)
+
+def _variables(template):
+    # The variables of a string or an AND, OR or NOT of strings
+    if isinstance(template, str):
+        return AIRegex.findall(template)
+    result = []
+    for part in template:
+        result.extend(_variables(part))
+    return result
+
+def rename_apart(rule, binding, used):
+    """
+    Add to 'binding' a new name for each variable of the rule's
+    antecedent that 'binding' has no value for and that is already
+    in 'used', the set of the variables in the goal tree so far, so
+    that it isn't mistaken for that one.  The names it keeps or is
+    given are added to 'used'.
+    """
+    names = set(_variables(rule.antecedent()) +
+                _variables(list(rule.consequent())))
+    binding = dict(binding)
+    for name in _variables(rule.antecedent()):
+        if name in binding: continue
+        if name in used:
+            number = 1
+            while (name + str(number) in used or
+                   name + str(number) in names):
+                number += 1
+            binding[name] = '(?%s%d)' % (name, number)
+            used.add(name + str(number))
         else:
-            node = populate(ante, binding)
-            bound.append(backchain_to_goal_tree(rules, node))
-    return simplify(bound)
+            binding[name] = '(?%s)' % name
+            used.add(name)
+    return binding
+
+
+def fill(template, binding):
+    """
+    Like populate(), but a variable that 'binding' has no value for
+    is left in place instead of raising KeyError.
+    """
+    if isinstance(template, str):
+        return AIRegex.sub(lambda m: binding.get(m.group(1), m.group(0)),
+                           template)
+    return template.__class__(*[fill(part, binding) for part in template])
+
+
+class RuleIndex(object):
+    """
+    A list of rules, indexed by the shape of their first consequent
+    -- its number of words, and which of them are literal -- so
+    that finding the rules that conclude a hypothesis doesn't mean
+    matching it against all of them.
+    """
+    def __init__(self, rules):
+        self.rules = list(rules)
+        # number of words -> positions of the literal words ->
+        # the literal words -> indexes of rules
+        self._shapes = {}
+        # Rules whose consequent isn't made of whole words
+        self._others = []
+        for number, rule in enumerate(self.rules):
+            pattern = compile_pattern(rule.consequent()[0])
+            if pattern.length is None:
+                self._others.append(number)
+                continue
+            positions = tuple([position for (position, word)
+                               in pattern.constants])
+            words = tuple([word for (position, word) in pattern.constants])
+            (self._shapes.setdefault(pattern.length, {})
+             .setdefault(positions, {}).setdefault(words, [])
+             .append(number))
+
+    def candidates(self, hypothesis):
+        """The indexes of the rules that might conclude 'hypothesis'."""
+        if ' '.join(hypothesis.split()) != hypothesis:
+            return range(len(self.rules))
+        words = hypothesis.split(' ')
+        numbers = list(self._others)
+        for positions, rules in self._shapes.get(len(words), {}).items():
+            numbers.extend(rules.get(tuple([words[position]
+                                            for position in positions]),
+                                     ()))
+        numbers.sort()
+        return numbers
+
+    def matches(self, hypothesis):
+        """
+        Generate (rule, bindings) for each rule, in order, whose first
+        consequent matches 'hypothesis'.
+        """
+        for number in self.candidates(hypothesis):
+            rule = self.rules[number]
+            binding = match(rule.consequent()[0], hypothesis)
+            if binding is not None:
+                yield rule, binding
 
 
 # Here's an example of running the backward chainer - uncomment
@@ -0,0 +1,536 @@
+# Timing runs for the rule engine in production.py.
+#
+# Run 'python benchmark.py' from this directory.  The data sets are
+# synthetic family trees in the style of simpsons_data and black_data
+# in lab1.py, big enough that the differences between the engines
+# show up.
+
+import os
+import random
+import re
+import time
+import tracemalloc
+
+import production
+from production import forward_chain, derives
+from production import IF, AND, OR, NOT, THEN, simplify, RuleExpression
+from factstore import FactStore
+from utils import (AIStringToRegex, compile_pattern, NoClobberDict,
+                   ClobberedDictKey)
+from planner import explain, plan
+from parallel import parallel_forward_chain
+from lab1 import family_rules, transitive_rule, TEST_DATA_2
+from zookeeper import ZOOKEEPER_RULES
+import backchain
+from tms import TruthMaintenance
+from profiler import Profiler
+from snapshot import cached_forward_chain
+from batch import batch_forward_chain
+
+
+def family_tree(generations, children=3, seed=6034):
+    """
+    Build a family tree, as a list of 'male'/'female'/'parent'
+    facts, in which each couple in a generation has 'children'
+    children, who then marry into the next generation.
+    """
+    rng = random.Random(seed)
+    facts = []
+    count = [0]
+
+    def person():
+        count[0] += 1
+        name = "p%d" % count[0]
+        facts.append("%s %s" % (rng.choice(("male", "female")), name))
+        return name
+
+    couples = [(person(), person())]
+    for generation in range(generations):
+        next_couples = []
+        for (mother, father) in couples:
+            for child in range(children):
+                name = person()
+                facts.append("parent %s %s" % (mother, name))
+                facts.append("parent %s %s" % (father, name))
+                next_couples.append((name, person()))
+        couples = next_couples
+    return facts
+
+
+def timed(fn, *args, **kwargs):
+    start = time.time()
+    result = fn(*args, **kwargs)
+    return result, time.time() - start
+
+
+def bench_engines(sizes=(1, 2, 3, 4), naive_limit=100):
+    """
+    forward_chain(family_rules, ...) with the naive and Rete engines.
+    The naive engine is only timed up to 'naive_limit' input facts;
+    past that it takes minutes.
+    """
+    print("forward_chain(family_rules): naive vs. rete")
+    print("%12s %12s %12s %12s %8s" % ("input facts", "output facts",
+                                       "naive (s)", "rete (s)", "speedup"))
+    for generations in sizes:
+        data = family_tree(generations)
+        rete, rete_time = timed(forward_chain, family_rules, data,
+                                engine='rete')
+        if len(data) > naive_limit:
+            print("%12d %12d %12s %12.3f %8s" %
+                  (len(data), len(rete), "-", rete_time, "-"))
+            continue
+        naive, naive_time = timed(forward_chain, family_rules, data)
+        assert naive == rete, "engines disagree"
+        print("%12d %12d %12.3f %12.3f %7.1fx" %
+              (len(data), len(rete), naive_time, rete_time,
+               naive_time / max(rete_time, 1e-9)))
+    print()
+
+
+def _uncompiled_match(template, AIStr):
+    # production.match() as it was before compile_pattern()
+    try:
+        return re.match(AIStringToRegex(template), AIStr).groupdict()
+    except AttributeError:
+        return None
+
+def _match_all(rules, data):
+    # Every binding of every rule, found by calling match() on each
+    # fact (a plain list of data doesn't go through a FactStore)
+    return [list(production.RuleExpression().test_term_matches(
+                rule.antecedent(), data)) for rule in rules]
+
+def bench_pattern_cache(generations=1, repeat=5):
+    """
+    Match family_rules against the closure of a family tree, with
+    templates recompiled on every match() (before) and with the
+    compile_pattern() cache (after).
+    """
+    data = list(forward_chain(family_rules, family_tree(generations),
+                              engine='rete'))
+    print("matching family_rules against %d facts: pattern cache"
+          % len(data))
+    match = production.match
+    try:
+        production.match = _uncompiled_match
+        before, before_time = min([timed(_match_all, family_rules, data)
+                                   for i in range(repeat)],
+                                  key=lambda run: run[1])
+    finally:
+        production.match = match
+    after, after_time = min([timed(_match_all, family_rules, data)
+                             for i in range(repeat)], key=lambda run: run[1])
+    assert before == after, "results differ"
+    print("%12s %12s %8s" % ("before (s)", "after (s)", "speedup"))
+    print("%12.3f %12.3f %7.1fx" % (before_time, after_time,
+                                    before_time / max(after_time, 1e-9)))
+    print("cache:", compile_pattern.cache_info())
+    print()
+
+def beats_chain(length):
+    """A ranking like poker_data: 'h1 beats h0', 'h2 beats h1', ..."""
+    return ["h%d beats h%d" % (i + 1, i) for i in range(length)]
+
+def bench_seminaive(chain_lengths=(10, 20, 40), generations=(2, 3)):
+    """Naive vs. semi-naive evaluation on transitive and family rules."""
+    print("naive vs. seminaive")
+    print("%-24s %12s %12s %12s %8s" % ("rules / input", "output facts",
+                                        "naive (s)", "seminaive (s)",
+                                        "speedup"))
+    runs = ([("transitive_rule / %d" % n, [transitive_rule],
+              beats_chain(n)) for n in chain_lengths] +
+            [("family_rules / %d" % len(family_tree(g)), family_rules,
+              family_tree(g)) for g in generations])
+    for name, rules, data in runs:
+        naive, naive_time = timed(forward_chain, rules, data)
+        semi, semi_time = timed(forward_chain, rules, data,
+                                engine='seminaive')
+        assert naive == semi, "engines disagree"
+        print("%-24s %12d %12.3f %12.3f %7.1fx" %
+              (name, len(semi), naive_time, semi_time,
+               naive_time / max(semi_time, 1e-9)))
+    print()
+
+# Written in the order that reads best, not the order that matches
+# fastest: the first two conditions join on nothing.
+cousin_rule = IF( AND( 'parent (?a) (?x)',
+                       'parent (?b) (?y)',
+                       'sibling (?a) (?b)',
+                       NOT('sibling (?x) (?y)') ),
+                  THEN( 'cousin (?x) (?y)' ) )
+
+def bench_planner(generations=(2, 3)):
+    """The naive engine with and without join planning."""
+    print("join planning: naive engine, plan_joins=False vs. True")
+    data = list(forward_chain(family_rules, family_tree(generations[0]),
+                              engine='rete'))
+    print(explain(cousin_rule, data))
+    print("%12s %14s %12s %8s" % ("input facts", "as written (s)",
+                                  "planned (s)", "speedup"))
+    for g in generations:
+        data = list(forward_chain(family_rules, family_tree(g),
+                                  engine='rete'))
+        written, written_time = timed(forward_chain, [cousin_rule], data)
+        planned, planned_time = timed(forward_chain, [cousin_rule], data,
+                                      plan_joins=True)
+        assert written == planned, "results differ"
+        print("%12d %14.3f %12.3f %7.1fx" %
+              (len(data), written_time, planned_time,
+               written_time / max(planned_time, 1e-9)))
+    print()
+
+def scaled(data, copies):
+    """'copies' disjoint copies of a data set, with renamed people."""
+    facts = []
+    for copy in range(copies):
+        for fact in data:
+            words = fact.split()
+            facts.append(' '.join([words[0]] + ["%s_%d" % (word, copy)
+                                                for word in words[1:]]))
+    return facts
+
+def _dict_matches(rules, conditions, cumulative_dict=None):
+    # AND matching as it was before slot arrays: a new NoClobberDict
+    # for every candidate, updated key by key
+    if cumulative_dict == None:
+        cumulative_dict = NoClobberDict()
+    if len(conditions) == 0:
+        yield cumulative_dict
+        return
+    condition = conditions[0]
+    for bindings in production.RuleExpression().test_term_matches(
+            condition, rules, cumulative_dict):
+        bindings = NoClobberDict(bindings)
+        try:
+            bindings.update(cumulative_dict)
+            for bindings2 in _dict_matches(rules, conditions[1:], bindings):
+                yield bindings2
+        except ClobberedDictKey:
+            pass
+
+def _count(matches):
+    # Counted as they come, so that the peak memory use is that of the
+    # matching, not of a list of results
+    count = 0
+    for bindings in matches:
+        count += 1
+    return count
+
+def _count_dict_matches(conditions, store):
+    return sum([_count(_dict_matches(store, list(condition)))
+                for condition in conditions])
+
+def _count_matches(conditions, store):
+    return sum([_count(condition.test_matches(store))
+                for condition in conditions])
+
+def _allocation(fn, *args):
+    # The result, the time taken (which tracing slows down), and the
+    # most memory in use at once while computing it
+    tracemalloc.start()
+    try:
+        result, seconds = timed(fn, *args)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return result, seconds, peak
+
+def bench_bindings(copies=100):
+    """
+    Match the AND rules of family_rules against TEST_DATA_2 (and what
+    they derive from it), scaled up 'copies' times, with NoClobberDict
+    bindings (before) and slot arrays (after).  The rules are planned
+    first: as written, cousinhood joins every parent with every
+    other one.
+    """
+    store = FactStore(forward_chain(family_rules,
+                                    scaled(TEST_DATA_2, copies),
+                                    engine='seminaive'))
+    conditions = [plan(rule.antecedent(), store) for rule in family_rules
+                  if isinstance(rule.antecedent(), AND)]
+    print("matching %d AND rules against %d facts: binding environments"
+          % (len(conditions), len(store)))
+    print("%-12s %10s %10s %14s %14s" % ("", "matches", "time (s)",
+                                         "peak (KiB)", "untraced (s)"))
+    for name, fn in (("NoClobberDict", _count_dict_matches),
+                     ("slot arrays", _count_matches)):
+        count, traced, peak = _allocation(fn, conditions, store)
+        count, seconds = timed(fn, conditions, store)
+        print("%-12s %10d %10.3f %14.1f %14.3f" %
+              (name, count, traced, peak / 1024.0, seconds))
+    print()
+
+def bench_parallel(generations=7, workers=(1, 2, 4), shards=(1, 2)):
+    """
+    forward_chain(family_rules, ...) on a genealogy of about 13,000
+    facts (generations=7), with the naive engine (planning its joins,
+    as the workers do) and with the parallel engine.  The speedup
+    depends on how many CPUs there are.
+    """
+    data = family_tree(generations)
+    print("forward_chain(family_rules) on %d facts, %d CPUs: parallel"
+          % (len(data), os.cpu_count() or 1))
+    naive, naive_time = timed(forward_chain, family_rules, data,
+                              plan_joins=True)
+    print("%8s %8s %12s %8s" % ("workers", "shards", "time (s)", "speedup"))
+    print("%8s %8s %12.3f %8s" % ("naive", "-", naive_time, "-"))
+    for count in workers:
+        for shard_count in shards:
+            result, seconds = timed(parallel_forward_chain, family_rules,
+                                    data, workers=count, shards=shard_count)
+            assert result == naive, "engines disagree"
+            print("%8d %8d %12.3f %7.1fx" %
+                  (count, shard_count, seconds,
+                   naive_time / max(seconds, 1e-9)))
+    print()
+
+def taxonomy_rules(count=500, parents=2, seed=6034):
+    """
+    'count' rules in the style of ZOOKEEPER_RULES: '(?x) is a c<i>'
+    follows from '(?x) is a c<j>', for one of 'parents' earlier
+    categories j, and a feature of its own.  The first category is
+    a zookeeper 'mammal'.
+    """
+    rng = random.Random(seed)
+    names = ['mammal']
+    rules = []
+    while len(rules) < count:
+        i = len(names)
+        names.append('c%d' % i)
+        for parent in sorted(set([rng.randrange(max(0, i - 8), i)
+                                  for p in range(parents)])):
+            rules.append(IF(AND('(?x) is a %s' % names[parent],
+                                '(?x) has feature %d' % i),
+                            THEN('(?x) is a %s' % names[i])))
+    return list(ZOOKEEPER_RULES) + rules[:count], names
+
+def _str_simplify(node):
+    # simplify() as it was before hash-consing: branches compared by
+    # str(), and shared subtrees simplified again wherever they occur
+    if not isinstance(node, RuleExpression): return node
+    seen, branches = {}, []
+    for branch in [_str_simplify(x) for x in node]:
+        if str(branch) not in seen:
+            branches.append(branch)
+            seen[str(branch)] = True
+    if isinstance(node, AND):
+        return production._reduce_singletons(
+            production._simplify_and(branches))
+    elif isinstance(node, OR):
+        return production._reduce_singletons(
+            production._simplify_or(branches))
+    return node
+
+def _distinct_nodes(node, seen=None):
+    # The number of different node objects in a tree
+    if seen is None: seen = set()
+    if isinstance(node, RuleExpression) and id(node) not in seen:
+        seen.add(id(node))
+        for branch in node:
+            _distinct_nodes(branch, seen)
+    return len(seen)
+
+def bench_simplify(count=500, hypotheses=(20, 40, 55)):
+    """
+    simplify() on the goal trees (before flattening) of hypotheses
+    from ZOOKEEPER_RULES plus a taxonomy of 'count' rules, comparing
+    branches by str() (before) and by structure (after).
+    """
+    rules, names = taxonomy_rules(count)
+    index = backchain.RuleIndex(rules)
+    print("simplify() on goal trees from %d rules" % len(rules))
+    print("%-22s %10s %12s %12s %8s" % ("hypothesis", "nodes after",
+                                         "before (s)", "after (s)",
+                                         "speedup"))
+    for number in hypotheses:
+        hypothesis = 'zed is a %s' % names[number]
+        tree = backchain._goal_tree(index, hypothesis, {}, set())[0]
+        before, before_time = timed(_str_simplify, tree)
+        after, after_time = timed(simplify, tree)
+        assert str(before) == str(after), "results differ"
+        print("%-22s %10d %12.3f %12.3f %7.1fx" %
+              (hypothesis, _distinct_nodes(after), before_time, after_time,
+               before_time / max(after_time, 1e-9)))
+    print()
+
+def bench_streaming(generations=(3, 4)):
+    """
+    Asking whether a family tree has a fact with derives(), which
+    stops when it comes up, against computing the whole closure.
+    """
+    print("derives() vs. forward_chain(family_rules) for one fact")
+    print("%12s %-28s %12s %12s" % ("input facts", "fact", "closure (s)",
+                                    "derives (s)"))
+    for g in generations:
+        data = family_tree(g)
+        closure, closure_time = timed(forward_chain, family_rules, data,
+                                      plan_joins=True)
+        fact = [f for f in closure if f.startswith('sibling ')][0]
+        found, found_time = timed(derives, family_rules, data, fact)
+        assert found, "fact not derived"
+        print("%12d %-28s %12.3f %12.3f" % (len(data), fact, closure_time,
+                                            found_time))
+    print()
+
+def bench_tms(generations=(3, 4), retractions=20, seed=6034):
+    """
+    Retracting 'parent' facts one at a time from a family tree: a
+    TruthMaintenance update against forward chaining what is left
+    from scratch.
+    """
+    print("retracting %d parent facts from forward_chain(family_rules)"
+          % retractions)
+    print("%12s %16s %16s %8s" % ("input facts", "from scratch (s)",
+                                  "tms update (s)", "speedup"))
+    rng = random.Random(seed)
+    for g in generations:
+        data = family_tree(g)
+        tms = TruthMaintenance(family_rules, data)
+        gone = rng.sample([fact for fact in data
+                           if fact.startswith('parent ')], retractions)
+        left = list(data)
+        scratch_time = update_time = 0.0
+        for fact in gone:
+            left.remove(fact)
+            expected, elapsed = timed(forward_chain, family_rules, left,
+                                      plan_joins=True)
+            scratch_time += elapsed
+            update_time += timed(tms.retract, fact)[1]
+            assert tms.as_tuple() == expected, "wrong data after retracting"
+        print("%12d %16.3f %16.3f %7.1fx" % (len(data), scratch_time,
+                                             update_time,
+                                             scratch_time / update_time))
+    print()
+
+def bench_profiler(generations=3):
+    """
+    What profiling forward_chain(family_rules) shows, and what it
+    costs.
+    """
+    data = family_tree(generations)
+    result, plain_time = timed(forward_chain, family_rules, data)
+    profile = Profiler()
+    profiled, profiled_time = timed(forward_chain, family_rules, data,
+                                    profiler=profile)
+    assert profiled == result, "profiling changed the result"
+    print("forward_chain(family_rules) on %d facts, profiled" % len(data))
+    print(profile.table())
+    print("%16s %16s" % ("unprofiled (s)", "profiled (s)"))
+    print("%16.3f %16.3f" % (plain_time, profiled_time))
+    print()
+
+def bench_snapshot(generations=4, path='family.snapshot'):
+    """
+    Starting forward_chain(family_rules) from a snapshot file: the
+    same data again, and the data with one more family in it.
+    """
+    data = family_tree(generations)
+    more = data + ['female q1', 'male q2', 'parent q1 q3', 'parent q2 q3',
+                   'male q3', 'parent q1 q4', 'parent q2 q4', 'female q4']
+    if os.path.exists(path): os.remove(path)
+    try:
+        print("forward_chain(family_rules) on %d facts, from a snapshot"
+              % len(data))
+        print("%-32s %12s" % ("", "time (s)"))
+        for label, facts in (("no snapshot", data),
+                             ("same data", data),
+                             ("%d new facts" % (len(more) - len(data)), more)):
+            result, elapsed = timed(cached_forward_chain, family_rules,
+                                    facts, path)
+            assert result == forward_chain(family_rules, facts), \
+                "wrong result from the snapshot"
+            print("%-32s %12.3f" % (label, elapsed))
+        print("snapshot of %d facts: %d bytes" % (len(result),
+                                                  os.path.getsize(path)))
+    finally:
+        if os.path.exists(path): os.remove(path)
+    print()
+
+def bench_agenda(generations=(2, 3), strategies=('order', 'recency',
+                                                 'specificity', 'salience')):
+    """
+    forward_chain(family_rules, apply_only_one=True), which fires one
+    rule on one binding at a time, with the Rete engine's agenda and
+    each of its conflict resolution strategies.
+    """
+    print("forward_chain(family_rules, apply_only_one=True): "
+          "rete agenda strategies")
+    print("%12s %12s" % ("input facts", "output facts") +
+          "".join(["%13s" % strategy for strategy in strategies]))
+    for size in generations:
+        data = family_tree(size)
+        times = []
+        for strategy in strategies:
+            result, elapsed = timed(forward_chain, family_rules, data,
+                                    apply_only_one=True, engine='rete',
+                                    strategy=strategy)
+            if strategy == 'order':
+                expected = result
+            times.append(elapsed)
+        print("%12d %12d" % (len(data), len(expected)) +
+              "".join(["%13.3f" % elapsed for elapsed in times]))
+    print()
+
+def zoo_animals(count, seed=6034):
+    """
+    'count' animals, each with a few of the observable features that
+    ZOOKEEPER_RULES test for (the ones no rule concludes), as one
+    list of facts per animal.
+    """
+    rng = random.Random(seed)
+    concluded = set()
+    features = set()
+    for rule in ZOOKEEPER_RULES:
+        concluded.update([fact.split(' ', 1)[1]
+                          for fact in rule.consequent()])
+        condition = rule.antecedent()
+        if isinstance(condition, str): condition = [condition]
+        features.update([pattern.split(' ', 1)[1] for pattern in condition
+                         if isinstance(pattern, str)])
+    features = sorted(features - concluded)
+    return [["animal%d %s" % (index, feature)
+             for feature in rng.sample(features, rng.randint(1, 8))]
+            for index in range(count)]
+
+def bench_batch(counts=(100, 1000), workers=(1, 2)):
+    """
+    forward_chain(ZOOKEEPER_RULES) on one small data set per animal:
+    one call per animal, against one batch_forward_chain() call.
+    """
+    print("forward_chain(ZOOKEEPER_RULES), one data set per animal")
+    print("%8s %12s %12s" % ("animals", "naive (s)", "rete (s)") +
+          "".join(["%12s" % ("batch x%d" % count) for count in workers]) +
+          "%12s" % "facts/s")
+    for count in counts:
+        animals = zoo_animals(count)
+        expected, naive_time = timed(
+            lambda: [forward_chain(ZOOKEEPER_RULES, data)
+                     for data in animals])
+        result, rete_time = timed(
+            lambda: [forward_chain(ZOOKEEPER_RULES, data, engine='rete')
+                     for data in animals])
+        line = "%8d %12.3f %12.3f" % (count, naive_time, rete_time)
+        for processes in workers:
+            batch = batch_forward_chain(ZOOKEEPER_RULES, animals,
+                                        workers=processes)
+            assert list(batch) == expected, "wrong batch result"
+            line += "%12.3f" % batch.elapsed
+        print(line + "%12.0f" % batch.facts_per_second())
+    print()
+
+
+if __name__ == '__main__':
+    bench_engines()
+    bench_pattern_cache()
+    bench_seminaive()
+    bench_planner()
+    bench_bindings()
+    bench_parallel()
+    bench_simplify()
+    bench_streaming()
+    bench_tms()
+    bench_profiler()
+    bench_snapshot()
+    bench_agenda()
+    bench_batch()
@@ -0,0 +1,397 @@
+"""
+An indexed set of facts for the rule engine in production.py.
+
+Facts are plain strings such as 'parent marge bart'.  A FactStore
+keeps each one split into a tuple of interned words, and indexes it
+by its number of words and by the word at each position, so that a
+pattern like 'parent (?x) (?y)' -- or, once ?x is bound, 'parent
+marge (?y)' -- only has to look at the facts it could match instead
+of running its regular expression over all of them.
+
+Every fact is also stamped with the time (a count of additions) at
+which it was added, and a FactWindow views just the facts added in a
+range of times; the semi-naive engine uses one to match rules against
+only the facts that are new since the rule last ran.
+
+forward_chain() accepts a FactStore in place of a list or tuple of
+facts, and then updates and returns that store.
+"""
+
+from itertools import chain
+from sys import intern
+
+from utils import compile_pattern, unify
+
+try:
+    set()
+except NameError:
+    from sets import Set as set, ImmutableSet as frozenset
+
+
+def _split(fact):
+    """
+    The words of a fact, or None if it isn't single-space separated
+    words; such facts can't be indexed and are matched by regex.
+    """
+    if ' '.join(fact.split()) != fact:
+        return None
+    return tuple([intern(word) for word in fact.split(' ')])
+
+
+class FactStore(object):
+    """
+    A set of facts, indexed by shape.  It supports 'in', len() and
+    iteration like a set, plus match(), which finds the bindings of
+    a pattern without looking at facts that can't match it.
+    """
+    def __init__(self, facts=()):
+        # fact -> its words
+        self._facts = {}
+        # number of words -> facts
+        self._by_length = {}
+        # (number of words, position, word) -> facts
+        self._index = {}
+        # (number of words, position) -> how many different words
+        # are found there
+        self._distinct = {}
+        # Facts that _split() can't handle
+        self._irregular = set()
+        # When each fact was added (a count of additions), and the
+        # fact added at each of those times that is still here.
+        # Removing a fact forgets its stamp, so a store whose facts
+        # keep coming and going doesn't grow.
+        self._clock = 0
+        self._stamps = {}
+        self._by_stamp = {}
+        for fact in facts:
+            self.add(fact)
+
+    def __contains__(self, fact):
+        return fact in self._facts
+
+    def __len__(self):
+        return len(self._facts)
+
+    def __iter__(self):
+        return iter(self._facts)
+
+    def __repr__(self):
+        return 'FactStore(%r)' % (self.as_tuple(),)
+
+    def copy(self):
+        return FactStore(self)
+
+    def as_tuple(self):
+        """The facts as a sorted tuple, which is what forward_chain()
+        returns for a list or tuple of data."""
+        return tuple(sorted(self))
+
+    def clock(self):
+        """The stamp that the next fact added will get."""
+        return self._clock
+
+    def stamp(self, fact):
+        """When a stored fact was added."""
+        return self._stamps[fact]
+
+    def window(self, since=0, until=None):
+        """The facts added at or after 'since' and before 'until'."""
+        return FactWindow(self, since, until)
+
+    def _between(self, since, until):
+        by_stamp = self._by_stamp
+        for stamp in range(since, until):
+            fact = by_stamp.get(stamp)
+            if fact is not None:
+                yield fact
+
+    def words(self, fact):
+        """The interned words of a stored fact (None if irregular)."""
+        return self._facts[fact]
+
+    def add(self, fact):
+        """Add a fact; return True if it was not already here."""
+        if fact in self._facts: return False
+        fact = intern(fact)
+        words = _split(fact)
+        self._facts[fact] = words
+        self._stamps[fact] = self._clock
+        self._by_stamp[self._clock] = fact
+        self._clock += 1
+        if words is None:
+            self._irregular.add(fact)
+            return True
+        length = len(words)
+        self._by_length.setdefault(length, set()).add(fact)
+        for position, word in enumerate(words):
+            key = (length, position, word)
+            if key not in self._index:
+                self._index[key] = set()
+                self._count_distinct(length, position, 1)
+            self._index[key].add(fact)
+        return True
+
+    def remove(self, fact):
+        """Remove a fact; return True if it was here."""
+        if fact not in self._facts: return False
+        words = self._facts.pop(fact)
+        del self._by_stamp[self._stamps.pop(fact)]
+        if words is None:
+            self._irregular.discard(fact)
+            return True
+        length = len(words)
+        self._discard(self._by_length, length, fact)
+        for position, word in enumerate(words):
+            if self._discard(self._index, (length, position, word), fact):
+                self._count_distinct(length, position, -1)
+        return True
+
+    def _discard(self, index, key, fact):
+        """Remove a fact from an index entry; True if that empties it."""
+        facts = index[key]
+        facts.discard(fact)
+        if facts: return False
+        del index[key]
+        return True
+
+    def _count_distinct(self, length, position, delta):
+        key = (length, position)
+        count = self._distinct.get(key, 0) + delta
+        if count: self._distinct[key] = count
+        else: del self._distinct[key]
+
+    def candidates(self, template, bound=None):
+        """
+        The indexed facts that might match 'template', given the
+        variable values in 'bound': the smallest of the index entries
+        for its length, its literal words and its bound variables.
+        Irregular facts are not included.  Returns None if the
+        template can't be matched word by word.
+        """
+        pattern = compile_pattern(template)
+        length = pattern.length
+        if length is None: return None
+        keys = list(pattern.constants)
+        if bound:
+            keys.extend([(position, bound[var])
+                         for (position, var) in pattern.slots
+                         if var in bound])
+        return self._best(length, keys)
+
+    def _best(self, length, keys):
+        # The smallest index entry among the facts of 'length' words
+        # and those with each (position, word) in 'keys'
+        best = self._by_length.get(length, ())
+        for position, word in keys:
+            facts = self._index.get((length, position, word), ())
+            if len(facts) < len(best):
+                best = facts
+                if not best: break
+        return best
+
+    def _restrict(self, candidates, count, since, until):
+        # Limit 'count' candidate facts to those stamped in a range
+        if not since and until is None:
+            return candidates
+        if until is None: until = self._clock
+        if until - since < count:
+            return self._between(since, until)
+        stamps = self._stamps
+        return [fact for fact in candidates
+                if since <= stamps[fact] < until]
+
+    def estimate(self, template, bound_vars=()):
+        """
+        Estimate how many facts match 'template' once the variables
+        in 'bound_vars' have values: the size of its best index
+        entry, divided by the number of different words found at the
+        position of each bound variable.
+        """
+        pattern = compile_pattern(template)
+        length = pattern.length
+        if length is None: return float(len(self))
+        size = float(len(self.candidates(template)))
+        for position, var in pattern.slots:
+            if var in bound_vars:
+                size /= max(self._distinct.get((length, position), 1), 1)
+        return size + len(self._irregular)
+
+    def match(self, template, bound=None, since=0, until=None):
+        """
+        Generate the bindings (as dictionaries) of every fact that
+        'template' matches, agreeing with the variable values in
+        'bound' if it is given.  This finds the same bindings as
+        calling production.match() on every fact.
+
+        'since' and 'until' limit the search to the facts added in
+        that range of stamps.
+        """
+        pattern = compile_pattern(template)
+        candidates = self.candidates(template, bound)
+        if candidates is None:
+            candidates, count = self._facts, len(self._facts)
+        else:
+            count = len(candidates) + len(self._irregular)
+            candidates = chain(candidates, self._irregular)
+        candidates = self._restrict(candidates, count, since, until)
+
+        for fact in candidates:
+            bindings = self._test(pattern, fact, bound)
+            if bindings is not None:
+                yield bindings
+
+    def match_slots(self, template, table, values, since=0, until=None,
+                    stats=None):
+        """
+        Like match(), but with bindings kept as slot arrays numbered
+        by 'table' (a utils.VariableTable): generate the slot array
+        'values' extended by the bindings of each fact that matches.
+        Only the facts that match allocate anything.
+
+        If 'stats' is given, its 'scanned' count goes up by one for
+        every candidate fact looked at, and its 'rejected' count for
+        every one that matches 'template' but binds a variable to a
+        different value than it has in 'values'.
+        """
+        pattern = compile_pattern(template)
+        length = pattern.length
+        if length is None:
+            if stats is not None:
+                stats.scanned += len(self)
+            for bindings in self.match(template, table.as_dict(values),
+                                       since, until):
+                extended = table.unify(values, bindings)
+                if extended is not None:
+                    yield extended
+            return
+
+        slots = table.slots(pattern)
+        constants = pattern.constants
+        keys = list(constants)
+        keys.extend([(position, values[number])
+                     for (position, number) in slots
+                     if values[number] is not None])
+        candidates = self._best(length, keys)
+        count = len(candidates) + len(self._irregular)
+        candidates = self._restrict(chain(candidates, self._irregular),
+                                    count, since, until)
+        if stats is not None:
+            candidates = _counted(candidates, stats)
+
+        facts = self._facts
+        for fact in candidates:
+            words = facts[fact]
+            if words is not None:
+                if not _fits(words, length, constants): continue
+                extended = unify(values, slots, words)
+            else:
+                bindings = pattern.match(fact)
+                if bindings is None: continue
+                extended = table.unify(values, bindings)
+            if extended is not None:
+                yield extended
+            elif stats is not None:
+                stats.rejected += 1
+
+    def _test(self, pattern, fact, bound):
+        words = self._facts[fact]
+        if words is None or pattern.length is None:
+            bindings = pattern.match(fact)
+        elif len(words) != pattern.length:
+            return None
+        else:
+            for position, word in pattern.constants:
+                if words[position] != word: return None
+            bindings = dict([(var, words[position])
+                             for (position, var) in pattern.slots])
+        if bindings is not None and _agrees(bindings, bound):
+            return bindings
+        return None
+
+
+class FactWindow(FactStore):
+    """
+    A read-only view of the facts in a FactStore that were added at
+    or after 'since' and before 'until' (None for no limit).  It can
+    be matched against just like the store itself.
+    """
+    def __init__(self, store, since=0, until=None):
+        self.store = store
+        self.since = since
+        self.until = until
+
+    def __contains__(self, fact):
+        if fact not in self.store: return False
+        stamp = self.store.stamp(fact)
+        return (self.since <= stamp and
+                (self.until is None or stamp < self.until))
+
+    def __iter__(self):
+        until = self.until
+        if until is None: until = self.store.clock()
+        return self.store._between(self.since, until)
+
+    def __len__(self):
+        return len(list(iter(self)))
+
+    def __repr__(self):
+        return 'FactWindow(%r, %r, %r)' % (self.store, self.since,
+                                           self.until)
+
+    def words(self, fact):
+        return self.store.words(fact)
+
+    def stamp(self, fact):
+        return self.store.stamp(fact)
+
+    def clock(self):
+        return self.store.clock()
+
+    def add(self, fact):
+        raise TypeError("A FactWindow is read-only")
+
+    remove = add
+
+    def candidates(self, template, bound=None):
+        return self.store.candidates(template, bound)
+
+    def estimate(self, template, bound_vars=()):
+        until = self.until
+        if until is None: until = self.store.clock()
+        return min(self.store.estimate(template, bound_vars),
+                   float(until - self.since))
+
+    def _clamp(self, since, until):
+        since = max(since, self.since)
+        if until is None or (self.until is not None and self.until < until):
+            until = self.until
+        return since, until
+
+    def match(self, template, bound=None, since=0, until=None):
+        since, until = self._clamp(since, until)
+        return self.store.match(template, bound, since, until)
+
+    def match_slots(self, template, table, values, since=0, until=None,
+                    stats=None):
+        since, until = self._clamp(since, until)
+        return self.store.match_slots(template, table, values, since, until,
+                                      stats)
+
+
+def _counted(facts, stats):
+    for fact in facts:
+        stats.scanned += 1
+        yield fact
+
+def _fits(words, length, constants):
+    if len(words) != length: return False
+    for position, word in constants:
+        if words[position] != word: return False
+    return True
+
+def _agrees(bindings, bound):
+    if not bound: return True
+    for var in bindings:
+        if var in bound and bound[var] != bindings[var]:
+            return False
+    return True
@@ -0,0 +1,282 @@
+"""
+Parallel matching for forward_chain(..., engine='parallel').
+
+Each pass of the naive engine tries the rules in order against the
+same data until one of them changes it.  Until that happens, matching
+one rule doesn't depend on matching any other, so this engine matches
+several of them at once in a pool of worker processes -- as many
+rules ahead of the one it is waiting for as there are workers -- each
+of which sends back what its rule would add and delete (see
+IF.effects).  The effects are then applied in rule order, exactly as
+the naive engine would apply them: the first rule that changes the
+data fires, the results for the rules after it are thrown away, and
+the next pass starts over from the top.  The result is the same as
+the naive engine's.
+
+With shards > 1, the bindings of each rule are also split between
+that many tasks, by a hash of how its first condition matched.
+
+Every worker keeps its own FactStore.  The changes that each pass
+makes are appended to a log file, which the workers read on from
+where they left off to catch up with the data before they match.
+
+A rule that changed nothing can only do something different once a
+fact that one of its templates matches has been added or deleted,
+so after a rule fires, only those rules are matched again; the rest
+are skipped, as the naive engine would find them changing nothing.
+Without that, every firing would send every rule before it back to
+the workers.
+
+apply_only_one=True fires one change at a time, in the order the
+bindings are found, so it is handed to the naive engine.
+
+Starting the workers and sending them the data costs more than the
+matching it saves unless there is a lot of data, and the speedup
+depends on how many CPUs there are; bench_parallel (see benchmark.py)
+measures it.  With fewer than 'min_facts' facts, the rules are
+matched in this process instead, by the naive engine with planned
+joins, which is what the workers would do.
+"""
+
+import os
+import pickle
+import tempfile
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+
+from production import AND, RuleExpression, forward_chain, join
+from utils import compile_pattern
+from factstore import FactStore
+from planner import plan
+
+# The state of a worker process: its rules, its copy of the data, the
+# log of changes to the data, and how many entries of it it has read,
+# up to which byte.
+_worker = {}
+
+
+def _start_worker(rules, log_path):
+    _worker['rules'] = rules
+    _worker['store'] = FactStore()
+    _worker['log'] = log_path
+    _worker['version'] = 0
+    _worker['position'] = 0
+
+def _catch_up(version):
+    if _worker['version'] >= version: return
+    store = _worker['store']
+    with open(_worker['log'], 'rb') as log:
+        log.seek(_worker['position'])
+        while _worker['version'] < version:
+            added, deleted = pickle.load(log)
+            for fact in added:
+                store.add(fact)
+            for fact in deleted:
+                store.remove(fact)
+            _worker['version'] += 1
+        _worker['position'] = log.tell()
+
+def _match(index, shard, shards, version):
+    """Find the effects of rule 'index' on the data as of 'version'."""
+    _catch_up(version)
+    rule = _worker['rules'][index]
+    store = _worker['store']
+    return _changes(list(rule.effects(shard_bindings(rule.antecedent(),
+                                                     store, shard,
+                                                     shards))),
+                    store)
+
+def _changes(effects, store):
+    """
+    Leave out of 'effects' the additions of facts that are already in
+    'store' and the deletions of facts that aren't, which do nothing
+    -- unless the same effects also delete or add them -- so that
+    there is less to send back.
+    """
+    deleted = set()
+    for adds, deletes in effects:
+        deleted.update(deletes)
+    if not deleted:
+        # No DELETE, which is the usual case
+        return [(adds, []) for adds in
+                [[fact for fact in adds if fact not in store]
+                 for adds, deletes in effects] if adds]
+    added = set()
+    for adds, deletes in effects:
+        added.update(adds)
+    result = []
+    for adds, deletes in effects:
+        adds = [fact for fact in adds
+                if fact not in store or fact in deleted]
+        deletes = [fact for fact in deletes
+                   if fact in store or fact in added]
+        if adds or deletes:
+            result.append((adds, deletes))
+    return result
+
+
+def _shard_of(bindings, shards):
+    # A hash that is the same in every process, unlike hash()
+    key = repr(sorted(bindings.items())).encode('utf-8')
+    return zlib.crc32(key) % shards
+
+def shard_bindings(condition, store, shard=0, shards=1):
+    """
+    The bindings of 'condition' in 'store' that belong to 'shard', one
+    of 'shards' disjoint parts, split by how the first condition of
+    the (planned) AND matched.  A condition that can't be split that
+    way belongs to shard 0.
+    """
+    condition = plan(condition, store)
+    if shards == 1:
+        return RuleExpression().test_term_matches(condition, store)
+    if isinstance(condition, str):
+        return [bindings for bindings in store.match(condition)
+                if _shard_of(bindings, shards) == shard]
+    if isinstance(condition, AND) and condition and isinstance(condition[0],
+                                                              str):
+        first = [bindings for bindings in store.match(condition[0])
+                 if _shard_of(bindings, shards) == shard]
+        return join(list(condition),
+                    [first] + [store] * (len(condition) - 1))
+    if shard == 0:
+        return RuleExpression().test_term_matches(condition, store)
+    return []
+
+
+class _Log(object):
+    """The file the workers read the changes to the data from."""
+    def __init__(self):
+        descriptor, self.path = tempfile.mkstemp(suffix='.log')
+        self.file = os.fdopen(descriptor, 'wb')
+        self.version = 0
+
+    def append(self, added, deleted):
+        pickle.dump((added, deleted), self.file, pickle.HIGHEST_PROTOCOL)
+        self.file.flush()
+        self.version += 1
+
+    def close(self):
+        self.file.close()
+        os.remove(self.path)
+
+
+def parallel_forward_chain(rules, data, apply_only_one=False,
+                           verbose=False, workers=None, shards=1,
+                           min_facts=0):
+    """
+    Run forward_chain() with rule matching spread over a pool of
+    'workers' processes (by default, one per CPU), and the bindings of
+    each rule split into 'shards' tasks.  The result is the same as
+    the naive engine's: a sorted tuple of data, or the FactStore that
+    was passed in, updated.
+
+    With fewer than 'min_facts' facts (by default, there is always
+    a pool) the rules are matched in this process instead.
+    """
+    if apply_only_one:
+        return forward_chain(rules, data, apply_only_one, verbose)
+
+    if isinstance(data, FactStore):
+        store = data
+    else:
+        store = FactStore(data)
+    if len(store) < min_facts:
+        forward_chain(rules, store, verbose=verbose, plan_joins=True)
+    else:
+        _run_pool(rules, store, verbose, workers, shards)
+
+    if store is data:
+        return store
+    return store.as_tuple()
+
+def _run_pool(rules, store, verbose, workers, shards):
+    """
+    Fire the rules on 'store' until none of them changes it, matching
+    them in a pool of 'workers' processes.
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    ahead = max(1, workers // shards)
+
+    log = _Log()
+    try:
+        log.append(list(store), [])
+        pool = ProcessPoolExecutor(workers, initializer=_start_worker,
+                                   initargs=(rules, log.path))
+        try:
+            patterns = [_templates(rule) for rule in rules]
+            # The rules known to change nothing on the data as it is
+            quiet = set()
+            while True:
+                touched = _run_pass(pool, rules, store, log, shards,
+                                    ahead, quiet, verbose)
+                if touched is None: break
+                quiet = set([index for index in quiet
+                             if not _matched(patterns[index], touched)])
+        finally:
+            pool.shutdown()
+    finally:
+        log.close()
+
+def _templates(rule):
+    # The compiled templates of a rule's conditions and actions
+    def strings(condition):
+        if isinstance(condition, str): return [condition]
+        result = []
+        for part in condition:
+            result.extend(strings(part))
+        return result
+    return [compile_pattern(template) for template in
+            set(strings(rule.antecedent()) + list(rule.consequent()) +
+                list(rule.delete_clause()))]
+
+def _matched(patterns, facts):
+    """Whether any of 'facts' matches any of 'patterns'."""
+    for pattern in patterns:
+        for fact in facts:
+            if pattern.match(fact) is not None:
+                return True
+    return False
+
+def _run_pass(pool, rules, store, log, shards, ahead, quiet, verbose):
+    """
+    Match the rules that aren't 'quiet', and fire the first one that
+    changes the data, keeping up to 'ahead' rules matching at once.
+    The rules matched before it, which changed nothing, are added to
+    'quiet'.  Return the facts that firing added or deleted, or None
+    if no rule fired.
+    """
+    waiting = [index for index in range(len(rules)) if index not in quiet]
+    tasks = {}
+    def submit(position):
+        if position < len(waiting):
+            tasks[waiting[position]] = [
+                pool.submit(_match, waiting[position], shard, shards,
+                            log.version)
+                for shard in range(shards)]
+    for position in range(ahead):
+        submit(position)
+    try:
+        for position, index in enumerate(waiting):
+            submit(position + ahead)
+            effects = []
+            for task in tasks.pop(index):
+                effects.extend(task.result())
+            touched = {}
+            for added, deleted in effects:
+                for fact in added + deleted:
+                    touched.setdefault(fact, fact in store)
+            if rules[index].apply_effects(store, effects, False, verbose):
+                changed = [fact for fact in touched
+                           if touched[fact] != (fact in store)]
+                log.append([fact for fact in changed if fact in store],
+                           [fact for fact in changed if fact not in store])
+                return changed
+            quiet.add(index)
+        return None
+    finally:
+        # The data has changed under the rules that are left
+        for shard_tasks in tasks.values():
+            for task in shard_tasks:
+                task.cancel()
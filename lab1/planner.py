@@ -0,0 +1,221 @@
+"""
+Join ordering for the conditions of an AND.
+
+AND matches its conditions left to right, each one narrowed down by
+the variables that the ones before it have bound.  Written in the
+order that reads best, a rule can start with its least selective
+condition -- 'parent (?x) (?y)' before 'sibling (?x) (?z)', say --
+and build a large intermediate result only to throw most of it away.
+
+plan() rewrites a condition so that every AND in it matches its
+conditions cheapest first.  The cost of a condition is the number of
+facts a FactStore estimates it will match, given the variables that
+are bound by the time it runs (see FactStore.estimate).  Reordering
+the positive conditions doesn't change the bindings an AND finds,
+only the order it finds them in.
+
+NOT needs more care, because what it tests depends on where it is:
+with all of its variables bound it rejects the bindings that fill it
+in to a known fact, and with any of them unbound it rejects
+everything if its bare pattern matches a fact at all.  So a NOT whose
+variables were all bound where it was written is moved to just after
+the conditions that bind them, one that had a variable unbound there
+(which can't depend on the bindings) is checked first, and an AND
+with a NOT that could go either way is left as written.
+
+explain() shows the order chosen for a rule, with the estimated and
+the actual number of bindings after each step.
+"""
+
+from production import AND, OR, NOT, IF, RuleExpression
+from factstore import FactStore
+from utils import AIStringVars
+
+try:
+    set()
+except NameError:
+    from sets import Set as set, ImmutableSet as frozenset
+
+
+def bound_vars(condition):
+    """The variables that every binding of 'condition' gives a value."""
+    if isinstance(condition, str):
+        return set(AIStringVars(condition))
+    elif isinstance(condition, NOT):
+        return set()
+    elif isinstance(condition, AND):
+        result = set()
+        for part in condition:
+            result |= bound_vars(part)
+        return result
+    elif isinstance(condition, OR):
+        result = None
+        for part in condition:
+            if result is None: result = bound_vars(part)
+            else: result &= bound_vars(part)
+        return result or set()
+    raise ValueError("Don't know how to plan a %s" % type(condition))
+
+def possible_vars(condition):
+    """The variables that some binding of 'condition' may give a value."""
+    if isinstance(condition, str):
+        return set(AIStringVars(condition))
+    elif isinstance(condition, NOT):
+        return set()
+    result = set()
+    for part in condition:
+        result |= possible_vars(part)
+    return result
+
+
+def estimate(condition, store, bound=()):
+    """
+    Estimate the number of bindings 'condition' finds in 'store' for
+    each set of values of the variables in 'bound'.
+    """
+    if isinstance(condition, str):
+        return store.estimate(condition, bound)
+    elif isinstance(condition, NOT):
+        return 1.0
+    elif isinstance(condition, OR):
+        # Nested ORs and ANDs ignore the bindings so far
+        return sum([estimate(part, store) for part in condition])
+    elif isinstance(condition, AND):
+        size = 1.0
+        bound = set()
+        for part in order(list(condition), estimator(store))[0]:
+            size *= estimate(part, store, bound)
+            bound |= bound_vars(part)
+        return size
+    raise ValueError("Don't know how to plan a %s" % type(condition))
+
+def estimator(stores):
+    """
+    The cost function order() wants, for conditions matched against
+    'stores' (one per condition, or one FactStore for all of them).
+    """
+    if isinstance(stores, FactStore):
+        return lambda index, condition, bound: estimate(condition, stores,
+                                                        bound)
+    return lambda index, condition, bound: estimate(condition,
+                                                    stores[index], bound)
+
+
+def order(conditions, cost, bound=()):
+    """
+    Choose the order in which to match the conditions of an AND.
+
+    'cost(index, condition, bound_vars)' estimates how many bindings
+    conditions[index] finds once the variables in 'bound_vars' are
+    bound.  Each step takes the cheapest of the conditions left (the
+    first one written on a tie).  'bound' names variables that are
+    bound before the AND starts.
+
+    Returns (conditions, indexes): the conditions in their new order,
+    and where each one was in the original list.
+    """
+    # Sort out the NOTs: which ones always see all of their variables
+    # bound, and which ones never do.
+    guaranteed, possible = set(bound), set(bound)
+    free, waiting = [], {}
+    for index, condition in enumerate(conditions):
+        if isinstance(condition, NOT):
+            if len(condition) != 1 or not isinstance(condition[0], str):
+                return _as_written(conditions)
+            variables = set(AIStringVars(condition[0]))
+            if variables <= guaranteed:
+                waiting[index] = variables
+            elif variables - possible:
+                free.append(index)
+            else:
+                return _as_written(conditions)
+        else:
+            guaranteed |= bound_vars(condition)
+            possible |= possible_vars(condition)
+
+    chosen = list(free)
+    remaining = [index for index in range(len(conditions))
+                 if not isinstance(conditions[index], NOT)]
+    bound = set(bound)
+    while True:
+        # A NOT goes in as soon as its variables are bound
+        for index in sorted(waiting):
+            if waiting[index] <= bound:
+                chosen.append(index)
+                del waiting[index]
+        if not remaining: break
+        best = min(remaining,
+                   key=lambda index: (cost(index, conditions[index], bound),
+                                      index))
+        remaining.remove(best)
+        chosen.append(best)
+        bound |= bound_vars(conditions[best])
+
+    return [conditions[index] for index in chosen], chosen
+
+def _as_written(conditions):
+    return list(conditions), list(range(len(conditions)))
+
+
+def plan(condition, store):
+    """
+    Return 'condition' with the conditions of every AND in it put in
+    the order that order() picks for 'store'.  The result finds the
+    same bindings as 'condition'.
+    """
+    if not isinstance(store, FactStore):
+        store = FactStore(store)
+    return _plan(condition, store)
+
+def _plan(condition, store):
+    if isinstance(condition, str) or isinstance(condition, NOT):
+        return condition
+    parts = [_plan(part, store) for part in condition]
+    if isinstance(condition, AND):
+        parts = order(parts, estimator(store))[0]
+    return condition.__class__(*parts)
+
+
+def explain(rule, store):
+    """
+    Describe how plan() orders the antecedent of 'rule' (an IF, or
+    just a condition) against 'store': the conditions in the order
+    they are matched, with the estimated and the actual number of
+    bindings after each one.
+    """
+    if not isinstance(store, FactStore):
+        store = FactStore(store)
+    if isinstance(rule, IF):
+        condition = rule.antecedent()
+    else:
+        condition = rule
+    if isinstance(condition, AND):
+        conditions, indexes = order(list(condition), estimator(store))
+    else:
+        conditions, indexes = [condition], [0]
+
+    lines = [str(rule),
+             "%4s %4s  %-40s %10s %10s" % ("step", "was", "condition",
+                                           "estimated", "actual")]
+    size, bound = 1.0, set()
+    for step in range(len(conditions)):
+        part = conditions[step]
+        if isinstance(part, NOT):
+            size *= _pass_rate(part, store, bound)
+        else:
+            size *= estimate(part, store, bound)
+            bound |= bound_vars(part)
+        actual = len(list(RuleExpression().test_term_matches(
+            AND(*conditions[:step + 1]), store)))
+        lines.append("%4d %4d  %-40s %10.1f %10d" %
+                     (step + 1, indexes[step] + 1, part, size, actual))
+    return '\n'.join(lines)
+
+def _pass_rate(condition, store, bound):
+    """Estimate the fraction of bindings that get through a NOT."""
+    pattern = condition[0]
+    if set(AIStringVars(pattern)) <= bound:
+        return max(0.0, 1.0 - estimate(pattern, store, bound))
+    for bindings in store.match(pattern):
+        return 0.0
+    return 1.0
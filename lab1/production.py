@@ -1,5 +1,6 @@
 import re
 from utils import *
+from factstore import FactStore
 try:
     set()
 except NameError:
@@ -21,7 +22,9 @@ except NameError:
 ### >>> import production
 ### >>> help(production)
 
-def forward_chain(rules, data, apply_only_one=False, verbose=False):
+def forward_chain(rules, data, apply_only_one=False, verbose=False,
+                  engine='naive', plan_joins=False, profiler=None,
+                  strategy='order'):
     """
     Apply a list of IF-expressions (rules) through a set of data
     in order.  Return the modified data set that results from the
@@ -32,17 +35,127 @@ def forward_chain(rules, data, apply_only_one=False, verbose=False):
     _all_ possible bindings of its variables at the same time,
     making the code considerably more efficient. In the end, only
     DELETE rules will act differently.
+
+    'data' may be a list or tuple of facts, in which case the
+    result is a sorted tuple, or a FactStore, which is updated in
+    place and returned.
+
+    'engine' picks how the rules are matched.  'naive' re-tests
+    every rule against all of the data on every pass; 'rete' (see
+    rete.py) compiles the rules into a network that is updated
+    incrementally as facts are added and deleted; 'seminaive' (see
+    seminaive.py) matches each rule only against the facts that are
+    new since it last ran; 'parallel' (see parallel.py) matches the
+    rules in a pool of worker processes.  All of them reach the same
+    result.
+
+    Set plan_joins=True to have the naive engine match the
+    conditions of each AND in the order that planner.py estimates
+    to be cheapest for the current data, rather than as written.
+    The semi-naive engine always does this.
+
+    To keep the result up to date as facts are added to and
+    retracted from the data, use a tms.TruthMaintenance instead.
+
+    Pass a profiler.Profiler as 'profiler' to find out how much
+    matching each rule, and each condition of its AND, takes.  Only
+    the naive engine can be profiled.
+
+    'strategy' decides which rule fires when more than one could:
+    'order' (the first in the list), 'recency', 'specificity' or
+    'salience' (see agenda.py).  Strategies other than 'order' need
+    engine='rete'.
     """
-    old_data = ()
+    if profiler is not None and engine != 'naive':
+        raise ValueError("Only the naive engine can be profiled")
+    if strategy != 'order' and engine != 'rete':
+        raise ValueError("Only the rete engine has conflict resolution "
+                         "strategies other than 'order'")
+    if engine == 'rete':
+        from rete import rete_forward_chain
+        return rete_forward_chain(rules, data, apply_only_one, verbose,
+                                  strategy)
+    elif engine == 'seminaive':
+        from seminaive import seminaive_forward_chain
+        return seminaive_forward_chain(rules, data, apply_only_one,
+                                       verbose)
+    elif engine == 'parallel':
+        from parallel import parallel_forward_chain
+        return parallel_forward_chain(rules, data, apply_only_one,
+                                      verbose)
+    elif engine != 'naive':
+        raise ValueError("Unknown forward_chain engine: %s" % engine)
+
+    if isinstance(data, FactStore):
+        store = data
+    else:
+        store = FactStore(data)
+
+    for event in forward_chain_iter(rules, store, apply_only_one, verbose,
+                                    plan_joins, profiler):
+        pass
 
-    while set(old_data) != set(data):
-        old_data = list(data)
-        for condition in rules:
-            data = condition.apply(data, apply_only_one, verbose)
-            if set(data) != set(old_data):
+    if store is data:
+        return store
+    return store.as_tuple()
+
+def forward_chain_iter(rules, data, apply_only_one=False, verbose=False,
+                       plan_joins=False, profiler=None):
+    """
+    Run forward_chain() with the naive engine one step at a time,
+    generating a (rule, bindings, added, deleted) event as soon as
+    a rule fires on a set of bindings and changes the data: 'added'
+    and 'deleted' are the lists of facts that it added and deleted.
+
+    Stop iterating at any time to stop chaining there.  Pass a
+    FactStore as 'data' to see the data as it changes; a list or
+    tuple is copied first.  'plan_joins' and 'profiler' are as for
+    forward_chain().
+    """
+    if isinstance(data, FactStore):
+        store = data
+    else:
+        store = FactStore(data)
+
+    changed = True
+    while changed:
+        changed = False
+        for rule in rules:
+            # Find all of the bindings before changing anything, so
+            # that they all see the same data.
+            condition = rule.antecedent()
+            if plan_joins:
+                from planner import plan
+                condition = plan(condition, store)
+            if profiler is None:
+                bindings = list(RuleExpression().test_term_matches(
+                    condition, store))
+            else:
+                bindings = profiler.match(rule, condition, store)
+            before = {}
+            for k, added, deleted in rule.carry_out(
+                    store, zip(bindings, rule.effects(bindings)), before,
+                    apply_only_one, verbose):
+                if profiler is not None:
+                    profiler.fired(rule, added, deleted)
+                yield rule, k, added, deleted
+            if [d for d in before if before[d] != (d in store)]:
+                changed = True
                 break
 
-    return data
+def derives(rules, data, fact, apply_only_one=False):
+    """
+    Return True if forward chaining 'rules' on 'data' would come up
+    with 'fact' (or it is in the data to begin with), stopping as
+    soon as it does.
+    """
+    if fact in data:
+        return True
+    for rule, bindings, added, deleted in forward_chain_iter(
+            rules, data, apply_only_one):
+        if fact in added:
+            return True
+    return False
 
 def instantiate(template, values_dict):
     """
@@ -59,7 +172,7 @@ def instantiate(template, values_dict):
         return template.__class__(*[populate(x, values_dict) 
                                     for x in template])
     elif isinstance(template, str):
-        return AIStringToPyTemplate(template) % values_dict
+        return compile_pattern(template).fill(values_dict)
     else: raise ValueError("Don't know how to populate a %s" %
                            type(template))
 
@@ -75,13 +188,11 @@ def match(template, AIStr):
     Returns a dictionary of the set of variables that would need
     to be substituted into template in order to make it equal to
     AIStr, or None if no such set exists.
+
+    Templates are compiled once and cached; see compile_pattern()
+    in utils.py.
     """
-    try:
-        return re.match( AIStringToRegex(template), 
-                         AIStr ).groupdict()
-    except AttributeError: # The re.match() expression probably
-                           # just returned None
-        return None
+    return compile_pattern(template).match(AIStr)
 
 def is_variable(string):
     """Is 'str' a variable, of the form '(?x)'?"""
@@ -116,9 +227,12 @@ class IF(object):
     The delete_clause is an expression or list of expressions
     that will be deleted when the rule fires. Again, variables
     can be filled in from the antecedent.
+
+    The salience is a number that ranks the rule when rules are
+    picked by salience (see agenda.py): higher fires first.
     """
     def __init__(self, conditional, action = None, 
-                 delete_clause = ()):
+                 delete_clause = (), salience = 0):
         # Deal with an edge case imposed by type_encode()
         if type(conditional) == list and action == None:
             return apply(self.__init__, conditional)
@@ -131,6 +245,7 @@ class IF(object):
         self._conditional = conditional
         self._action = action
         self._delete_clause = delete_clause
+        self._salience = salience
 
     def apply(self, rules, apply_only_one=False, verbose=False):
         """
@@ -141,34 +256,90 @@ class IF(object):
         return immediately instead of continuing. This is the
         behavior described in class, but it is slower.
         """
-        new_rules = set(rules)
-        old_rules_count = len(new_rules)
-        bindings = RuleExpression().test_term_matches(
-            self._conditional, new_rules)
+        new_rules = FactStore(rules)
+        self.apply_to(new_rules, apply_only_one, verbose)
+        return new_rules.as_tuple() # Uniquify and sort the
+                                    # output list
 
+    def apply_to(self, store, apply_only_one=False, verbose=False,
+                 bindings=None):
+        """
+        Like apply(), but update a FactStore in place instead of
+        returning new data.  Return True if the data changed.
+
+        If the bindings of the antecedent are already known, pass
+        them in as 'bindings' to fire on just those.
+        """
+        # Find all of the bindings before changing anything, so
+        # that they all see the same data.
+        if bindings is None:
+            bindings = list(RuleExpression().test_term_matches(
+                self._conditional, store))
+        return self.apply_effects(store, self.effects(bindings),
+                                  apply_only_one, verbose)
+
+    def effects(self, bindings):
+        """
+        Generate what firing on each of 'bindings' would do, as a
+        pair of lists for each: the facts it adds and the facts it
+        deletes.  Nothing is changed.
+        """
         for k in bindings:
-            for a in self._action:
-                new_rules.add( populate(a, k) )
-                if len(new_rules) != old_rules_count:
-                    if verbose:
-                        print("Rule:", self)
-                        print("Added:", populate(a, k))
-                    if apply_only_one:
-                        return tuple(sorted(new_rules))
+            added = [populate(a, k) for a in self._action]
+            deleted = []
             for d in self._delete_clause:
                 try:
-                    new_rules.remove( populate(d, k) )
-                    if len(new_rules) != old_rules_count:
-                        if verbose:
-                            print("Rule:", self)
-                            print("Deleted:", populate(d, k))
-                        if apply_only_one:
-                            return tuple(sorted(new_rules))
+                    deleted.append(populate(d, k))
                 except KeyError:
-                    pass
-                    
-        return tuple(sorted(new_rules)) # Uniquify and sort the
-                                        # output list
+                    continue
+            yield added, deleted
+
+    def apply_effects(self, store, effects, apply_only_one=False,
+                      verbose=False):
+        """
+        Carry out 'effects', as generated by effects(), on a
+        FactStore.  Return True if the data changed.
+        """
+        before = {}
+        for change in self.carry_out(store, [(None, effect)
+                                             for effect in effects],
+                                     before, apply_only_one, verbose):
+            pass
+        return bool([d for d in before if before[d] != (d in store)])
+
+    def carry_out(self, store, fired, before, apply_only_one=False,
+                  verbose=False):
+        """
+        Carry out each (bindings, (added, deleted)) in 'fired' on a
+        FactStore, and generate (bindings, added, deleted) with the
+        facts that each one actually added and deleted, for those that
+        changed anything.  'before' records, for every fact changed,
+        whether it was in the store beforehand.
+        """
+        for k, (adds, deletes) in fired:
+            added, deleted = [], []
+            for datum in adds:
+                if store.add(datum):
+                    before.setdefault(datum, False)
+                    added.append(datum)
+                    if verbose:
+                        print("Rule:", self)
+                        print("Added:", datum)
+                    if apply_only_one:
+                        yield k, added, deleted
+                        return
+            for datum in deletes:
+                if store.remove(datum):
+                    before.setdefault(datum, True)
+                    deleted.append(datum)
+                    if verbose:
+                        print("Rule:", self)
+                        print("Deleted:", datum)
+                    if apply_only_one:
+                        yield k, added, deleted
+                        return
+            if added or deleted:
+                yield k, added, deleted
 
 
     def __str__(self):
@@ -181,6 +352,12 @@ class IF(object):
     def consequent(self):
         return self._action
 
+    def delete_clause(self):
+        return self._delete_clause
+
+    def salience(self):
+        return self._salience
+
     __repr__ = __str__
 
 class RuleExpression(list):
@@ -218,7 +395,8 @@ class RuleExpression(list):
         Given an expression which might be just a string, check
         it against the rules.
         """
-        rules = set(rules)
+        if not isinstance(rules, FactStore):
+            rules = set(rules)
         if context_so_far == None: context_so_far = {}
 
         # Deal with nesting first If we're a nested term, we
@@ -232,8 +410,12 @@ class RuleExpression(list):
                                           rules, context_so_far)
 
     def basecase_bindings(self, condition, rules, context_so_far):
-        for rule in rules:
-            bindings = match(condition, rule)
+        if isinstance(rules, FactStore):
+            # Let the store's indexes narrow down the candidates
+            matches = rules.match(condition, context_so_far)
+        else:
+            matches = [match(condition, rule) for rule in rules]
+        for bindings in matches:
             if bindings is None: continue
             try:
                 context = NoClobberDict(context_so_far)
@@ -263,7 +445,7 @@ class RuleExpression(list):
         return type(self) == type(other) and list.__eq__(self, other)
 
     def __hash__(self):
-        return hash((self.__class__.__name__, list(self)))
+        return hash((self.__class__.__name__, tuple(self)))
 
 class AND(RuleExpression):
     """A conjunction of patterns, all of which must match."""
@@ -271,42 +453,135 @@ class AND(RuleExpression):
         pass
     
     def test_matches(self, rules, context_so_far = {}):
-        return self._test_matches_iter(rules, list(self))
+        return join(list(self), [rules] * len(self))
+
+
+def join(conditions, sources, context=None, profile=None):
+    """
+    Generate all possible matches of AND(*conditions), matching each
+    condition against its own entry in 'sources': a FactStore, a set
+    of facts, or, for a condition that isn't a string, a list of the
+    bindings it has already been found to have.  If 'context' is
+    given, only the matches that agree with the bindings in it are
+    generated, as if they had been bound before the AND started.
+
+    'profile', if given, is a list of one profiler.ConditionProfile
+    per condition, to count and time what matching each one does.
+
+    The bindings are built up as slot arrays (see VariableTable in
+    utils.py), so a partial match is shared by everything that
+    extends it; each complete match is handed back as a
+    NoClobberDict.
+    """
+    table = VariableTable()
+    for condition in conditions:
+        if isinstance(condition, str):
+            names = compile_pattern(condition).variables
+        else:
+            names = sorted(condition.get_condition_vars())
+        for name in names:
+            table.number(name)
+    if profile is None:
+        steps = [_join_step(condition, source, table)
+                 for condition, source in zip(conditions, sources)]
+    else:
+        steps = [stats.step(_join_step(condition, source, table, stats))
+                 for condition, source, stats
+                 in zip(conditions, sources, profile)]
+
+    # A depth-first search, with a stack of the matches left to try
+    # for each condition so far
+    start = table.empty()
+    if context:
+        start = table.unify(start, context)
+    stack = [iter((start,))]
+    while stack:
+        for values in stack[-1]:
+            break
+        else:
+            stack.pop()
+            continue
+        if len(stack) > len(steps):
+            yield table.as_dict(values)
+        else:
+            stack.append(iter(steps[len(stack) - 1](values)))
+
+def _join_step(condition, source, table, stats=None):
+    """
+    A function from a slot array to the slot arrays that extend it
+    with the bindings of 'condition'.  If 'stats' is given, the
+    candidates it looks at and rejects are counted in it (see
+    FactStore.match_slots).
+    """
+    if isinstance(source, list):
+        return _known_step(source, table, stats)
+    elif isinstance(condition, str):
+        if isinstance(source, FactStore):
+            return lambda values: source.match_slots(condition, table, values,
+                                                     stats=stats)
+        return lambda values: _match_each(condition, source, table, values,
+                                          stats)
+    elif isinstance(condition, NOT):
+        if (isinstance(source, FactStore) and isinstance(condition[0], str)
+            and compile_pattern(condition[0]).length is not None):
+            pattern = compile_pattern(condition[0])
+            slots = table.slots(pattern)
+            return lambda values: _negate_words(condition, pattern, slots,
+                                                source, table, values, stats)
+        return lambda values: _negate(condition, source, table, values)
+    else:
+        # A nested AND or OR doesn't depend on the bindings so far, so
+        # its own bindings only need finding once
+        return _known_step(condition.test_matches(source), table, stats)
+
+def _known_step(found, table, stats=None):
+    known = []
+    def step(values):
+        if not known:
+            known.append([table.unify(table.empty(), bindings)
+                          for bindings in found])
+        result = [extended for extended in [merge(values, other)
+                                            for other in known[0]]
+                  if extended is not None]
+        if stats is not None:
+            stats.scanned += len(known[0])
+            stats.rejected += len(known[0]) - len(result)
+        return result
+    return step
+
+def _match_each(condition, facts, table, values, stats=None):
+    for fact in facts:
+        if stats is not None: stats.scanned += 1
+        bindings = match(condition, fact)
+        if bindings is not None:
+            extended = table.unify(values, bindings)
+            if extended is not None:
+                yield extended
+            elif stats is not None:
+                stats.rejected += 1
+
+def _negate_words(condition, pattern, slots, store, table, values,
+                  stats=None):
+    # With all of its variables bound to plain words, the filled-in
+    # pattern matches just the facts whose words are the same, which
+    # the store's indexes find without compiling it
+    for position, number in slots:
+        value = values[number]
+        if value is None or not is_plain(value):
+            return _negate(condition, store, table, values)
+    for extended in store.match_slots(pattern.template, table, values,
+                                      stats=stats):
+        return ()
+    return (values,)
+
+def _negate(condition, source, table, values):
+    # NOT.test_matches yields once if nothing matches, and not at all
+    # otherwise
+    for bindings in condition.test_matches(source, table.as_dict(values)):
+        return (values,)
+    return ()
 
-    def _test_matches_iter(self, rules, conditions = None, 
-                           cumulative_dict = None):
-        """
-        Recursively generate all possible matches.
-        """
-        # Set default values for variables.  We can't set these
-        # in the function header because values defined there are
-        # class-local, and we need these to be reinitialized on
-        # each function call.
-        if cumulative_dict == None:
-            cumulative_dict = NoClobberDict()
-
-        # If we have no more conditions to analyze, pass the
-        # dictionary that we've accumulated back up the
-        # function-call stack.
-        if len(conditions) == 0:
-            yield cumulative_dict
-            return
-            
-        # Recursive Case
-        condition = conditions[0]
-        for bindings in self.test_term_matches(condition, rules,
-                                               cumulative_dict):
-            bindings = NoClobberDict(bindings)
-            
-            try:
-                bindings.update(cumulative_dict)
-                for bindings2 in self._test_matches_iter(rules,
-                  conditions[1:], bindings):
-                    yield bindings2
-            except ClobberedDictKey:
-                pass
 
-            
 class OR(RuleExpression):
     """A disjunction of patterns, one of which must match."""
     def test_matches(self, rules, context_so_far = {}):
@@ -363,16 +638,21 @@ class DELETE(THEN):
 
 def uniq(lst):
     """
-    this is like list(set(lst)) except that it gets around
-    unhashability by stringifying everything.  If str(a) ==
-    str(b) then this will get rid of one of them.
+    this is like list(set(lst)) except that it keeps the first of
+    each item in order.  Items that can't be hashed are compared by
+    str() instead.
     """
-    seen = {}
+    seen = set()
     result = []
     for item in lst:
-        if not str(item) in seen:
+        try:
+            key = (True, item)
+            hash(key)
+        except TypeError:
+            key = (False, str(item))
+        if key not in seen:
             result.append(item)
-            seen[str(item)]=True
+            seen.add(key)
     return result
 
 def simplify(node):
@@ -382,14 +662,65 @@ def simplify(node):
 
     You should do this to the expressions you produce by backward
     chaining.
+
+    Equal subtrees of the result are the same object, and a subtree
+    that appears in more than one place in 'node' (as in the DAGs
+    that backchain_to_goal_tree builds) is only simplified once.
     """
-    if not isinstance(node, RuleExpression): return node
-    branches = uniq([simplify(x) for x in node])
-    if isinstance(node, AND):
-        return _reduce_singletons(_simplify_and(branches))
-    elif isinstance(node, OR):
-        return _reduce_singletons(_simplify_or(branches))
-    else: return node
+    return _Simplifier().simplify(node)
+
+class _Simplifier(object):
+    """
+    The state of one simplify() call.  Every simplified node is
+    hash-consed: there is one node for each structure, identified by
+    a number, and a node's structure is its class and the numbers
+    (or, for strings, the text) of its branches.  So comparing two
+    subtrees takes one look-up, not a walk over both.
+    """
+    def __init__(self):
+        # id() of each input node -> what it simplified to
+        self.done = {}
+        # structure -> node, and id() of each such node -> its number
+        self.nodes = {}
+        self.numbers = {}
+
+    def key(self, node):
+        if id(node) in self.numbers: return self.numbers[id(node)]
+        return node
+
+    def intern(self, node):
+        """The one node with the structure of 'node'."""
+        if not isinstance(node, RuleExpression): return node
+        if id(node) in self.numbers: return node
+        structure = (node.__class__, tuple([self.key(self.intern(branch))
+                                            for branch in node]))
+        if structure not in self.nodes:
+            self.nodes[structure] = node
+            self.numbers[id(node)] = len(self.numbers)
+        return self.nodes[structure]
+
+    def uniq(self, branches):
+        seen = set()
+        result = []
+        for branch in branches:
+            key = self.key(branch)
+            if key not in seen:
+                result.append(branch)
+                seen.add(key)
+        return result
+
+    def simplify(self, node):
+        if not isinstance(node, RuleExpression): return node
+        if id(node) in self.done: return self.done[id(node)]
+        branches = self.uniq([self.simplify(x) for x in node])
+        if isinstance(node, AND):
+            result = _reduce_singletons(_simplify_and(branches))
+        elif isinstance(node, OR):
+            result = _reduce_singletons(_simplify_or(branches))
+        else: result = node
+        result = self.intern(result)
+        self.done[id(node)] = result
+        return result
 
 def _reduce_singletons(node):
     if not isinstance(node, RuleExpression): return node
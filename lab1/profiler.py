@@ -0,0 +1,180 @@
+"""
+Profiling for forward_chain().
+
+    >>> profile = Profiler()
+    >>> forward_chain(rules, data, profiler=profile)
+    >>> print(profile.table())
+
+A Profiler collects, for every rule, how often it was matched, the
+bindings it found, how many of them changed the data and how long
+matching it took; and for each condition of its AND (or for the
+antecedent as a whole, if it isn't an AND):
+
+ - 'calls': the bindings so far that it was matched with
+ - 'scanned': the candidate facts (or, for a nested AND or OR, the
+   bindings of it) that were looked at
+ - 'rejected': those that matched the condition but gave one of its
+   variables a different value than it already had -- what
+   NoClobberDict would refuse with ClobberedDictKey
+ - 'produced': the bindings that came out of it, which is the size
+   of the join up to that condition
+ - 'time': the seconds spent matching it, not counting the
+   conditions after it
+
+Conditions are listed in the order they were matched in, which
+with forward_chain(..., plan_joins=True) may not be how they were
+written.  table() lays this out for reading, and as_json() for
+other programs.
+
+When no profiler is passed in, forward_chain() does none of this.
+"""
+
+import json
+from time import perf_counter
+
+from production import AND, join
+
+
+class ConditionProfile(object):
+    """What matching one condition of a rule took."""
+    def __init__(self, condition):
+        self.condition = condition
+        self.calls = 0
+        self.scanned = 0
+        self.rejected = 0
+        self.produced = 0
+        self.time = 0.0
+
+    def step(self, step):
+        """Wrap a join step (see production._join_step) to time it."""
+        def timed(values):
+            self.calls += 1
+            return self._timed(step(values))
+        return timed
+
+    def _timed(self, matches):
+        matches = iter(matches)
+        while True:
+            start = perf_counter()
+            try:
+                values = next(matches)
+            except StopIteration:
+                self.time += perf_counter() - start
+                return
+            self.time += perf_counter() - start
+            self.produced += 1
+            yield values
+
+    def as_dict(self):
+        return {'condition': str(self.condition), 'calls': self.calls,
+                'scanned': self.scanned, 'rejected': self.rejected,
+                'produced': self.produced, 'time': self.time}
+
+
+class RuleProfile(object):
+    """What matching and firing one rule took."""
+    def __init__(self, rule):
+        self.rule = rule
+        self.tried = 0
+        self.bindings = 0
+        self.fired = 0
+        self.added = 0
+        self.deleted = 0
+        self.time = 0.0
+        # str(condition) -> its ConditionProfile, in the order first
+        # matched
+        self.conditions = {}
+        self._order = []
+
+    def condition(self, condition):
+        key = str(condition)
+        if key not in self.conditions:
+            self.conditions[key] = ConditionProfile(condition)
+            self._order.append(key)
+        return self.conditions[key]
+
+    def as_dict(self):
+        return {'rule': str(self.rule), 'tried': self.tried,
+                'bindings': self.bindings, 'fired': self.fired,
+                'added': self.added, 'deleted': self.deleted,
+                'time': self.time,
+                'conditions': [self.conditions[key].as_dict()
+                               for key in self._order]}
+
+
+class Profiler(object):
+    """
+    Collects a RuleProfile for every rule that forward_chain(...,
+    profiler=...) matches, in the order they were first matched.
+    One Profiler can be passed to several runs to add them up.
+    """
+    def __init__(self):
+        self.rules = []
+        self._by_rule = {}
+
+    def rule(self, rule):
+        """The RuleProfile of 'rule'."""
+        if rule not in self._by_rule:
+            self._by_rule[rule] = RuleProfile(rule)
+            self.rules.append(self._by_rule[rule])
+        return self._by_rule[rule]
+
+    def match(self, rule, condition, store):
+        """
+        Find the bindings of 'condition', the antecedent of 'rule', in
+        'store', counting and timing the work.
+        """
+        profile = self.rule(rule)
+        if isinstance(condition, AND):
+            conditions = list(condition)
+        else:
+            conditions = [condition]
+        start = perf_counter()
+        bindings = list(join(conditions, [store] * len(conditions),
+                             profile=[profile.condition(part)
+                                      for part in conditions]))
+        profile.time += perf_counter() - start
+        profile.tried += 1
+        profile.bindings += len(bindings)
+        return bindings
+
+    def fired(self, rule, added, deleted):
+        """Count a firing of 'rule' that changed the data."""
+        profile = self.rule(rule)
+        profile.fired += 1
+        profile.added += len(added)
+        profile.deleted += len(deleted)
+
+    def as_json(self, **options):
+        """The profiles as JSON; 'options' go to json.dumps()."""
+        return json.dumps([profile.as_dict() for profile in self.rules],
+                          **options)
+
+    def table(self, width=44):
+        """
+        The profiles as a table, slowest rule first, with the
+        conditions of each under it.  Rules and conditions are cut
+        short to 'width' characters.
+        """
+        lines = ["%-*s %7s %9s %9s %8s %8s %9s" % (
+                     width, "rule / condition", "tried", "bindings",
+                     "fired", "added", "deleted", "time (s)"),
+                 "%-*s %7s %9s %9s %8s %8s" % (
+                     width, "", "calls", "scanned", "rejected",
+                     "produced", "")]
+        for profile in sorted(self.rules, key=lambda p: -p.time):
+            lines.append("%-*s %7d %9d %9d %8d %8d %9.4f" % (
+                width, _cut(str(profile.rule), width), profile.tried,
+                profile.bindings, profile.fired, profile.added,
+                profile.deleted, profile.time))
+            for key in profile._order:
+                condition = profile.conditions[key]
+                lines.append("%-*s %7d %9d %9d %8d %8s %9.4f" % (
+                    width, _cut('  ' + key, width), condition.calls,
+                    condition.scanned, condition.rejected,
+                    condition.produced, "", condition.time))
+        return '\n'.join(lines)
+
+def _cut(text, width):
+    if len(text) <= width: return text
+    return text[:width - 3] + '...'
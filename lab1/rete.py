@@ -0,0 +1,560 @@
+"""
+A Rete network for the production system in production.py.
+
+forward_chain(rules, data, engine='rete') compiles the antecedent of
+every IF into a network of alpha memories (one per distinct pattern,
+shared between rules) and beta nodes (one per prefix of every AND).
+Asserting or deleting a fact then only does the work needed to update
+the matches that the fact takes part in, instead of re-matching every
+rule against the whole data set on every pass.
+
+Which rule fires next is up to the network's agenda (see agenda.py),
+a priority queue of the rules' activations.  By default rules fire in
+the same order as in the naive engine: the first rule, in order, that
+would change the data fires.  A rule that fires does so for all of
+its new bindings at once, or for just one change if apply_only_one is
+set.
+"""
+
+from heapq import heapify, heappush, heappop
+
+from production import AND, OR, NOT, populate
+from utils import AIStringVars, compile_pattern
+from factstore import FactStore
+from agenda import Agenda
+
+try:
+    set()
+except NameError:
+    from sets import Set as set, ImmutableSet as frozenset
+
+# Which input of a two-input node an activation arrives on.
+LEFT = 0
+RIGHT = 1
+
+
+def _token(bindings):
+    """Turn a dictionary of bindings into a hashable, ordered token."""
+    return tuple(sorted(bindings.items()))
+
+def _merge(left, right):
+    """
+    Combine two tokens, or return None if they bind the same variable
+    to two different values (the NoClobberDict rule).
+    """
+    if not left: return right
+    if not right: return left
+    merged = dict(left)
+    for key, value in right:
+        if merged.setdefault(key, value) != value:
+            return None
+    return _token(merged)
+
+def _project(token, keys):
+    """The values a token binds to 'keys', or None if some are unbound."""
+    if not keys: return ()
+    bindings = dict(token)
+    try:
+        return tuple([bindings[key] for key in keys])
+    except KeyError:
+        return None
+
+
+class ReteNode(object):
+    """
+    A node in the network.  Every node keeps a memory of the tokens
+    (variable bindings) that currently reach it, counted with
+    multiplicity, and passes each change on to its successors.
+    """
+    def __init__(self, variables=()):
+        self.memory = {}
+        self.successors = []
+        # The variables bound by every token that reaches this node
+        self.variables = frozenset(variables)
+
+    def add_successor(self, node, side=LEFT):
+        self.successors.append((node, side))
+        # Bring the new successor up to date with what we already hold
+        for token, count in list(self.memory.items()):
+            node.activate(token, count, side)
+
+    def insert(self, token, delta):
+        count = self.memory.get(token, 0) + delta
+        if count:
+            self.memory[token] = count
+        else:
+            del self.memory[token]
+        for node, side in self.successors:
+            node.activate(token, delta, side)
+
+    def activate(self, token, delta, side):
+        raise NotImplementedError
+
+    def reset(self):
+        """Forget every token, as if no fact had ever arrived."""
+        self.memory = {}
+
+
+class TopNode(ReteNode):
+    """The start of every AND chain: a single, empty set of bindings."""
+    def __init__(self):
+        ReteNode.__init__(self)
+        self.memory[()] = 1
+
+    def reset(self):
+        # The empty bindings are always here
+        pass
+
+
+class AlphaMemory(ReteNode):
+    """All of the facts that match one pattern."""
+    def __init__(self, pattern):
+        ReteNode.__init__(self, AIStringVars(pattern))
+        self.pattern = pattern
+        self.compiled = compile_pattern(pattern)
+
+    def test(self, fact):
+        bindings = self.compiled.match(fact)
+        if bindings is None: return None
+        return _token(bindings)
+
+
+class JoinNode(ReteNode):
+    """
+    The join of an AND prefix (the left input) with the next
+    condition (the right input).  Both sides are indexed on the
+    variables they are guaranteed to share.
+    """
+    def __init__(self, left, right):
+        ReteNode.__init__(self, left.variables | right.variables)
+        self.keys = sorted(left.variables & right.variables)
+        self.indexes = ({}, {})
+        left.add_successor(self, LEFT)
+        right.add_successor(self, RIGHT)
+
+    def activate(self, token, delta, side):
+        key = _project(token, self.keys)
+        bucket = self.indexes[side].setdefault(key, {})
+        count = bucket.get(token, 0) + delta
+        if count:
+            bucket[token] = count
+        else:
+            del bucket[token]
+            if not bucket: del self.indexes[side][key]
+
+        for other, other_count in list(self.indexes[1 - side]
+                                       .get(key, {}).items()):
+            if side == LEFT:
+                merged = _merge(token, other)
+            else:
+                merged = _merge(other, token)
+            if merged is not None:
+                self.insert(merged, delta * other_count)
+
+    def reset(self):
+        ReteNode.reset(self)
+        self.indexes = ({}, {})
+
+
+class NegativeNode(ReteNode):
+    """
+    NOT(pattern) inside an AND.  A token from the left passes when no
+    fact matches the pattern filled in with its bindings; if it
+    leaves some of the pattern's variables unbound, it passes only
+    when no fact matches the pattern at all, as in NOT.test_matches.
+    """
+    def __init__(self, left, alpha):
+        ReteNode.__init__(self, left.variables)
+        self.pattern_keys = sorted(alpha.variables)
+        # Left tokens, by the values they give the pattern's variables
+        self.waiting = {}
+        # Matching facts, by the same values
+        self.blockers = {}
+        self.total = 0
+        alpha.add_successor(self, RIGHT)
+        left.add_successor(self, LEFT)
+
+    def _blocked(self, key):
+        if key is None: return self.total > 0
+        return self.blockers.get(key, 0) > 0
+
+    def activate(self, token, delta, side):
+        key = _project(token, self.pattern_keys)
+        if side == LEFT:
+            bucket = self.waiting.setdefault(key, {})
+            count = bucket.get(token, 0) + delta
+            if count:
+                bucket[token] = count
+            else:
+                del bucket[token]
+                if not bucket: del self.waiting[key]
+            if not self._blocked(key):
+                self.insert(token, delta)
+            return
+
+        was_blocked, was_any = self._blocked(key), self.total > 0
+        count = self.blockers.get(key, 0) + delta
+        if count:
+            self.blockers[key] = count
+        else:
+            del self.blockers[key]
+        self.total += delta
+
+        for wait_key, changed in ((key, was_blocked != self._blocked(key)),
+                                  (None, was_any != (self.total > 0))):
+            if not changed: continue
+            sign = self._blocked(wait_key) and -1 or 1
+            for waiting, waiting_count in list(self.waiting
+                                               .get(wait_key, {}).items()):
+                self.insert(waiting, sign * waiting_count)
+
+    def reset(self):
+        ReteNode.reset(self)
+        self.waiting, self.blockers, self.total = {}, {}, 0
+
+
+class UnionNode(ReteNode):
+    """An OR: every token from any of its branches passes."""
+    def __init__(self, branches):
+        variables = None
+        for branch in branches:
+            if variables is None: variables = set(branch.variables)
+            else: variables &= branch.variables
+        ReteNode.__init__(self, variables or ())
+        for branch in branches:
+            branch.add_successor(self)
+
+    def activate(self, token, delta, side):
+        self.insert(token, delta)
+
+
+class Production(ReteNode):
+    """
+    The end of the network for rules[index].  Its memory holds the
+    rule's current activations, which it puts on the network's agenda
+    as they come about and takes off as they go away; 'born' records
+    when each one came about.
+    """
+    def __init__(self, network, rule, node, index=0):
+        ReteNode.__init__(self, node.variables)
+        self.network = network
+        self.rule = rule
+        self.index = index
+        self.born = {}
+        self._effects = {}
+        node.add_successor(self)
+
+    def activate(self, token, delta, side):
+        count = self.memory.get(token, 0) + delta
+        if count:
+            if token not in self.memory:
+                self.born[token] = self.network.tick()
+                self.network.agenda.add(self, token, self.born[token])
+            self.memory[token] = count
+        else:
+            del self.memory[token]
+            del self.born[token]
+            self.network.agenda.remove(self, token)
+            self._effects.pop(token, None)
+
+    def reset(self):
+        ReteNode.reset(self)
+        self.born, self._effects = {}, {}
+
+    def queue(self, token):
+        """Put an activation back on the agenda, if it is still one."""
+        if token in self.memory:
+            self.network.agenda.add(self, token, self.born[token])
+
+    def effects(self, token):
+        """The facts that firing on 'token' adds and deletes."""
+        if token not in self._effects:
+            bindings = dict(token)
+            added = [populate(a, bindings)
+                     for a in (self.rule.consequent() or ())]
+            deleted = []
+            for d in self.rule.delete_clause():
+                # As in IF.effects, a delete pattern with a variable
+                # the antecedent doesn't bind deletes nothing
+                try:
+                    deleted.append(populate(d, bindings))
+                except KeyError:
+                    continue
+            self._effects[token] = (added, deleted)
+            self.network.watch(self, token, added + deleted)
+        return self._effects[token]
+
+    def changes(self, token):
+        """Whether firing on 'token' would change the data."""
+        if token not in self.memory: return False
+        facts = self.network.facts
+        added, deleted = self.effects(token)
+        return bool([f for f in added if f not in facts] or
+                    [f for f in deleted if f in facts])
+
+
+class ReteNetwork(object):
+    """
+    The compiled form of a list of rules, plus the current data.
+    'strategy' picks which rule fires next (see agenda.py).
+    """
+    def __init__(self, rules, strategy='order'):
+        self.facts = FactStore()
+        self.top = TopNode()
+        self.alphas = {}
+        self.agenda = Agenda(strategy)
+        self._clock = 0
+        self.productions = [Production(self, rule,
+                                       self.compile(rule.antecedent()),
+                                       index)
+                            for index, rule in enumerate(rules)]
+        self._watchers = {}
+        self._stuck = []
+        self._dispatch = None
+
+    def tick(self):
+        """Count another activation coming about, and return the count."""
+        self._clock += 1
+        return self._clock
+
+    def alpha(self, pattern):
+        if pattern not in self.alphas:
+            self.alphas[pattern] = AlphaMemory(pattern)
+            self._dispatch = None
+        return self.alphas[pattern]
+
+    def _index_alphas(self):
+        """
+        Index the alpha memories of word patterns by their number of
+        words and their first literal word, so that a fact is only
+        tested against the patterns that have the same word in the
+        same place.  The rest are tested against every fact.
+        """
+        shapes, others = {}, []
+        for alpha in self.alphas.values():
+            compiled = alpha.compiled
+            if compiled.length is None or not compiled.constants:
+                others.append(alpha)
+                continue
+            positions, alphas = shapes.setdefault(compiled.length, ([], {}))
+            position, word = compiled.constants[0]
+            if position not in positions: positions.append(position)
+            alphas.setdefault((position, word), []).append(alpha)
+        self._dispatch = shapes, others
+
+    def _alphas_for(self, fact):
+        """The alpha memories that 'fact' might match."""
+        if self._dispatch is None: self._index_alphas()
+        shapes, others = self._dispatch
+        # A pattern's '$' also matches before a trailing newline,
+        # which splitting into words would miss
+        if fact.endswith('\n'): return list(self.alphas.values())
+        words = fact.split(' ')
+        shape = shapes.get(len(words))
+        if shape is None: return others
+        positions, alphas = shape
+        result = list(others)
+        for position in positions:
+            result.extend(alphas.get((position, words[position]), ()))
+        return result
+
+    def compile(self, condition):
+        """Build (or reuse) the nodes that match 'condition'."""
+        if isinstance(condition, str):
+            return self.alpha(condition)
+        elif isinstance(condition, NOT):
+            return NegativeNode(self.top, self._negated(condition))
+        elif isinstance(condition, AND):
+            node = self.top
+            for part in condition:
+                if isinstance(part, NOT):
+                    node = NegativeNode(node, self._negated(part))
+                elif node is self.top:
+                    node = self.compile(part)
+                else:
+                    node = JoinNode(node, self.compile(part))
+            return node
+        elif isinstance(condition, OR):
+            return UnionNode([self.compile(part) for part in condition])
+        else:
+            raise ValueError("Don't know how to compile a %s" %
+                             type(condition))
+
+    def _negated(self, condition):
+        assert len(condition) == 1 # NOT is unary
+        if not isinstance(condition[0], str):
+            raise ValueError("The Rete engine can only negate a single "
+                             "pattern, not %s" % (condition[0],))
+        return self.alpha(condition[0])
+
+    def watch(self, production, token, facts):
+        """Re-check an activation whenever one of 'facts' changes."""
+        for fact in facts:
+            self._watchers.setdefault(fact, []).append((production, token))
+
+    def _touch(self, fact):
+        watchers = self._watchers.get(fact)
+        if not watchers: return
+        # Drop the activations that have gone away since
+        watchers[:] = [(p, t) for (p, t) in watchers if t in p.memory]
+        for production, token in watchers:
+            production.queue(token)
+
+    def load(self, store):
+        """Take over a FactStore as the network's data."""
+        self.facts = FactStore()
+        for fact in store:
+            self._propagate(fact, 1)
+        self.facts = store
+
+    def reset(self):
+        """
+        Forget all of the data, leaving the network as it was when
+        the rules were compiled, so that it can be used again on
+        other data without compiling them again.
+        """
+        nodes, seen = [self.top] + list(self.alphas.values()), set()
+        while nodes:
+            node = nodes.pop()
+            if id(node) in seen: continue
+            seen.add(id(node))
+            node.reset()
+            nodes.extend([successor for successor, side in node.successors])
+        self.facts = FactStore()
+        self.agenda.clear()
+        self._clock = 0
+        self._watchers = {}
+        self._stuck = []
+        # Bring the nodes after the top back up to date with it, as
+        # add_successor did when they were built
+        for node, side in self.top.successors:
+            for token, count in self.top.memory.items():
+                node.activate(token, count, side)
+
+    def _propagate(self, fact, delta):
+        for alpha in self._alphas_for(fact):
+            token = alpha.test(fact)
+            if token is not None: alpha.insert(token, delta)
+
+    def add_fact(self, fact):
+        if not self.facts.add(fact): return False
+        self._propagate(fact, 1)
+        self._touch(fact)
+        return True
+
+    def remove_fact(self, fact):
+        if not self.facts.remove(fact): return False
+        self._propagate(fact, -1)
+        self._touch(fact)
+        return True
+
+    def fire(self, production, tokens, apply_only_one=False,
+             verbose=False):
+        """
+        Carry out the actions of 'production' for each of 'tokens',
+        and return True if the data changed as a result.
+
+        Like the naive engine, which carries out every binding of a
+        rule in turn, a later activation of the rule that wouldn't
+        have changed anything on its own is carried out too if one
+        before it changes one of its facts.
+        """
+        strategy = self.agenda.strategy
+        def key(token):
+            return strategy(production, token, production.born[token])
+        pending = [(key(token), token) for token in tokens]
+        heapify(pending)
+        seen = set(tokens)
+        before = {}
+        while pending:
+            order, token = heappop(pending)
+            added, deleted = production.effects(token)
+            changed = []
+            for fact in added:
+                if fact in self.facts: continue
+                before.setdefault(fact, False)
+                self.add_fact(fact)
+                changed.append(fact)
+                if verbose:
+                    print("Rule:", production.rule)
+                    print("Added:", fact)
+                if apply_only_one: break
+            else:
+                for fact in deleted:
+                    if fact not in self.facts: continue
+                    before.setdefault(fact, True)
+                    self.remove_fact(fact)
+                    changed.append(fact)
+                    if verbose:
+                        print("Rule:", production.rule)
+                        print("Deleted:", fact)
+                    if apply_only_one: break
+            if apply_only_one and changed:
+                # Leave the rest for later
+                for token in tokens:
+                    production.queue(token)
+                break
+            for fact in changed:
+                for watcher, other in self._watchers.get(fact, ()):
+                    if (watcher is production and other not in seen and
+                        other in production.memory and key(other) > order):
+                        seen.add(other)
+                        heappush(pending, (key(other), other))
+
+        return bool([f for f in before if before[f] != (f in self.facts)])
+
+    def run(self, apply_only_one=False, verbose=False):
+        """Fire rules until none of them can change the data."""
+        agenda = self.agenda
+        while True:
+            # Activations that wouldn't change anything are dropped;
+            # they come back if one of the facts they add or delete
+            # does (see watch)
+            activation = agenda.pop()
+            while activation and not activation[0].changes(activation[1]):
+                activation = agenda.pop()
+            if activation is None:
+                return
+
+            production, token = activation
+            tokens = [token]
+            if not apply_only_one:
+                tokens.extend([other for other in agenda.take(production)
+                               if production.changes(other)])
+            agenda.mark()
+            if self.fire(production, tokens, apply_only_one, verbose):
+                agenda.forget()
+                # Rules that were stuck may be able to do something now
+                for stuck, stuck_tokens in self._stuck:
+                    for stuck_token in stuck_tokens:
+                        stuck.queue(stuck_token)
+                self._stuck = []
+            else:
+                # Its actions cancelled out; like the naive engine,
+                # move on to the next rule until something changes.
+                # Adding and deleting the same facts may have queued
+                # activations, its own among them, through _touch or
+                # a NOT that blocked them and let them go again; but
+                # nothing has changed for them, so put the agenda
+                # back as it was, or they could fire again forever.
+                agenda.restore()
+                self._stuck.append((production, tokens))
+
+
+def rete_forward_chain(rules, data, apply_only_one=False, verbose=False,
+                       strategy='order'):
+    """
+    Run forward_chain() through a Rete network, picking which rule
+    fires next by 'strategy' (see agenda.py).  With the default,
+    'order', the result is the same as the naive engine's: a sorted
+    tuple of data, or the FactStore that was passed in, updated.
+    """
+    network = ReteNetwork(rules, strategy)
+    if isinstance(data, FactStore):
+        network.load(data)
+        network.run(apply_only_one, verbose)
+        return data
+    for fact in data:
+        network.add_fact(fact)
+    network.run(apply_only_one, verbose)
+    return network.facts.as_tuple()
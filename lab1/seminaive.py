@@ -0,0 +1,132 @@
+"""
+Semi-naive evaluation for forward_chain(..., engine='seminaive').
+
+The naive engine matches a rule against all of the data every time
+it tries the rule, so a rule like transitive_rule in lab1.py finds
+every 'beats' fact it already knows again on every pass.  Without
+DELETE the data only grows, so a binding that a rule didn't have the
+last time it ran must use at least one fact added since then (the
+delta).  This engine looks for just those bindings: for each
+condition of an AND in turn it matches that condition against the
+delta, the conditions before it against the older facts, and the
+ones after it against everything.
+
+NOT only gets harder to satisfy as facts are added, so a binding that
+failed a NOT before can never pass it later; NOT conditions are
+simply checked against all of the current data.
+
+The conditions of each AND are matched in the order that planner.py
+picks, with the delta's size as the estimate for the condition that
+is matched against it.
+
+Rules are tried in the same order as by the naive engine, so the
+result is the same.  Rule sets that DELETE anything are handed to the
+naive engine, since deleting a fact can let a rule fire again on old
+facts.
+"""
+
+from production import AND, OR, NOT, RuleExpression, forward_chain, join
+from factstore import FactStore
+from planner import order, estimate, plan
+
+def delta_matches(condition, store, since, context_so_far=None):
+    """
+    Generate the bindings of 'condition' against 'store' that use at
+    least one fact added at or after the stamp 'since'.
+    """
+    if isinstance(condition, str):
+        return RuleExpression().test_term_matches(
+            condition, store.window(since), context_so_far)
+    elif isinstance(condition, NOT):
+        return iter(())
+    elif isinstance(condition, OR):
+        return _chain([delta_matches(part, store, since)
+                       for part in condition])
+    elif isinstance(condition, AND):
+        return _and_delta_matches(list(condition), store, since)
+    else:
+        raise ValueError("Don't know how to match a %s" % type(condition))
+
+def _chain(generators):
+    for generator in generators:
+        for bindings in generator:
+            yield bindings
+
+def _and_delta_matches(conditions, store, since):
+    old = store.window(0, since)
+    delta = store.window(since)
+    for position, condition in enumerate(conditions):
+        if isinstance(condition, NOT): continue
+        # Conditions before this one only need the older facts; any
+        # binding that uses a new fact for them is found when it is
+        # their turn to be matched against the delta.
+        sources = []
+        for other, part in enumerate(conditions):
+            if other == position and isinstance(part, str):
+                sources.append(delta)
+            elif other == position:
+                sources.append(list(delta_matches(part, store, since)))
+            elif other < position and isinstance(part, str):
+                sources.append(old)
+            else:
+                sources.append(store)
+
+        def cost(index, condition, bound):
+            if isinstance(sources[index], list):
+                return float(len(sources[index]))
+            return estimate(condition, sources[index], bound)
+        ordered, indexes = order(conditions, cost)
+        for bindings in join(ordered, [sources[index]
+                                       for index in indexes]):
+            yield bindings
+
+def seminaive_forward_chain(rules, data, apply_only_one=False,
+                            verbose=False, since=None):
+    """
+    Run forward_chain() by semi-naive evaluation.  The result is the
+    same as the naive engine's: a sorted tuple of data, or the
+    FactStore that was passed in, updated.
+
+    If the facts in a FactStore that were added before the stamp
+    'since' are already all that the rules derive from them (as when
+    they are what forward_chain() returned), pass 'since' to match
+    the rules only against what was added after that.
+    """
+    if [rule for rule in rules if rule.delete_clause()]:
+        return forward_chain(rules, data, apply_only_one, verbose)
+
+    if isinstance(data, FactStore):
+        store = data
+    else:
+        store = FactStore(data)
+
+    # The store's clock when each rule last matched, or None if it
+    # hasn't yet.
+    seen = [since] * len(rules)
+
+    changed = True
+    while changed:
+        changed = False
+        for index, rule in enumerate(rules):
+            since, now = seen[index], store.clock()
+            if since == now:
+                continue
+            elif since is None:
+                # Match against everything
+                bindings = list(RuleExpression().test_term_matches(
+                    plan(rule.antecedent(), store), store))
+            else:
+                bindings = list(delta_matches(rule.antecedent(), store,
+                                              since))
+            seen[index] = now
+            if rule.apply_to(store, apply_only_one, verbose, bindings):
+                if apply_only_one:
+                    # It only fired once; the rest of what it matched
+                    # is still to come.
+                    seen[index] = since
+                changed = True
+                break
+
+    if store is data:
+        return store
+    return store.as_tuple()
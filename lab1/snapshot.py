@@ -0,0 +1,398 @@
+"""
+Saving what forward_chain() derived, to start from next time.
+
+A snapshot file holds the facts of a FactStore in the order they
+were added, with a flag on each that says whether it was given
+(base data) or derived, and SHA-256 digests of the rules and of the
+base data they were derived from.  Facts are stored as lists of
+numbers into a table of their distinct words, so each word is only
+stored once:
+
+    header      MAGIC, VERSION, BYTE_ORDER, the two digests, and the
+                number of words in the table, of facts and of words
+                in all of the facts together
+    tokens      (words + 1) offsets into the text, as unsigned ints
+    facts       (facts + 1) offsets into the fact words
+    fact words  a word number for every word of every fact
+    flags       a byte for every fact: 1 for base data, 0 if derived
+    text        the words of the table, as UTF-8
+
+A fact that isn't single-space separated words is stored as one
+"word".  The numbers are in the byte order of the machine that wrote
+the file, which is checked on loading.
+
+load() maps the file into memory rather than reading it, so several
+processes that load the same snapshot share one copy of it, and only
+decode the facts they look at.
+
+cached_forward_chain() is forward_chain() with a snapshot file.  If
+the snapshot was made by the same rules from the same data, it just
+returns the facts in it.  If the data only has new facts in it, it
+chains on from the snapshot, matching the rules only against what is
+new (see seminaive.py) -- unless a new fact turns out to match a NOT
+that one of the rules tested in coming up with the old ones, in
+which case it starts over.  That takes rules that don't DELETE
+anything, and don't test with NOT for anything that they might
+derive later on (see _stratified), since otherwise what they derive
+depends on the order in which the facts come along.
+Either way, the snapshot is brought up to date.
+"""
+
+import hashlib
+import mmap
+import os
+import struct
+from array import array
+
+from production import AND, NOT, forward_chain, join
+from utils import AIStringVars, compile_pattern
+from factstore import FactStore
+from planner import bound_vars
+from seminaive import seminaive_forward_chain
+
+MAGIC = b'FCSNAP\r\n'
+VERSION = 1
+# Written as an unsigned int, this reads back the same only on a
+# machine with the same byte order
+BYTE_ORDER = 0x01020304
+
+_HEADER = struct.Struct('=8sII32s32sIII')
+_UINT = array('I').itemsize
+
+
+def rules_digest(rules):
+    """A SHA-256 digest of 'rules': their conditions and actions."""
+    digest = hashlib.sha256()
+    for rule in rules:
+        text = '%r\0%r\0%r\n' % (rule.antecedent(), list(rule.consequent()),
+                                 list(rule.delete_clause()))
+        digest.update(text.encode('utf-8'))
+    return digest.digest()
+
+def data_digest(data):
+    """A SHA-256 digest of a set of facts, in any order."""
+    digest = hashlib.sha256()
+    for fact in sorted(set(data)):
+        fact = fact.encode('utf-8')
+        digest.update(struct.pack('=I', len(fact)))
+        digest.update(fact)
+    return digest.digest()
+
+
+def save(path, rules, data, store):
+    """
+    Save the facts in 'store' (a FactStore), which 'rules' derived
+    from the base facts in 'data', to the file 'path'.  The file is
+    written in full before it replaces whatever was there, so that
+    a process loading it never sees half of it.
+    """
+    base = set(data)
+    numbers, words = {}, []
+    offsets, fact_words, flags = array('I', [0]), array('I'), []
+    for fact in sorted(store, key=store.stamp):
+        for word in store.words(fact) or (fact,):
+            if word not in numbers:
+                numbers[word] = len(words)
+                words.append(word)
+            fact_words.append(numbers[word])
+        offsets.append(len(fact_words))
+        flags.append(fact in base)
+
+    text = [word.encode('utf-8') for word in words]
+    tokens = array('I', [0])
+    for word in text:
+        tokens.append(tokens[-1] + len(word))
+
+    header = _HEADER.pack(MAGIC, VERSION, BYTE_ORDER, rules_digest(rules),
+                          data_digest(base), len(words), len(flags),
+                          len(fact_words))
+    temporary = '%s.%d.tmp' % (path, os.getpid())
+    try:
+        output = open(temporary, 'wb')
+        try:
+            output.write(header)
+            output.write(tokens.tobytes())
+            output.write(offsets.tobytes())
+            output.write(fact_words.tobytes())
+            output.write(_padded(bytes(bytearray(flags))))
+            output.write(b''.join(text))
+        finally:
+            output.close()
+        os.replace(temporary, path)
+    except BaseException:
+        if os.path.exists(temporary):
+            os.remove(temporary)
+        raise
+
+def _padded(data):
+    # Keep what follows aligned for unsigned ints
+    return data + b'\0' * (-len(data) % _UINT)
+
+
+def _ascending(offsets):
+    # Whether 'offsets' go up from 0 without going back
+    if offsets[0] != 0: return False
+    previous = 0
+    for offset in offsets:
+        if offset < previous: return False
+        previous = offset
+    return True
+
+
+def load(path):
+    """
+    Map the snapshot in the file 'path' into memory.  Raises
+    ValueError if the file isn't a whole snapshot, as save() wrote it.
+    """
+    return Snapshot(path)
+
+class Snapshot(object):
+    """
+    A snapshot file, mapped into memory.  It supports len() and
+    iteration over its facts, in the order they were added; 'in'
+    decodes all of them the first time it is used.
+    """
+    def __init__(self, path):
+        handle = open(path, 'rb')
+        try:
+            self._map = mmap.mmap(handle.fileno(), 0,
+                                  access=mmap.ACCESS_READ)
+        finally:
+            handle.close()
+        try:
+            self._read()
+        except BaseException:
+            self.close()
+            raise
+
+    def _read(self):
+        if len(self._map) < _HEADER.size:
+            raise ValueError("Not a snapshot file")
+        (magic, version, order, self.rules_digest, self.data_digest,
+         token_count, fact_count, word_count) = _HEADER.unpack_from(
+             self._map)
+        if magic != MAGIC:
+            raise ValueError("Not a snapshot file")
+        if version != VERSION:
+            raise ValueError("Unknown snapshot version %d" % version)
+        if order != BYTE_ORDER:
+            raise ValueError("Snapshot written with a different byte order")
+
+        position = _HEADER.size
+        size = (position + (token_count + 1 + fact_count + 1 + word_count)
+                * _UINT + fact_count + (-fact_count % _UINT))
+        if size > len(self._map):
+            raise ValueError("Snapshot file is cut short")
+
+        self._view = view = memoryview(self._map)
+        def uints(count):
+            start = position
+            return view[start:start + count * _UINT].cast('I')
+        self._tokens = uints(token_count + 1)
+        position += (token_count + 1) * _UINT
+        self._offsets = uints(fact_count + 1)
+        position += (fact_count + 1) * _UINT
+        self._words = uints(word_count)
+        position += word_count * _UINT
+        self._flags = view[position:position + fact_count]
+        position += fact_count + (-fact_count % _UINT)
+        self._text = position
+        if position + self._tokens[token_count] > len(self._map):
+            raise ValueError("Snapshot file is cut short")
+        if position + self._tokens[token_count] < len(self._map):
+            raise ValueError("Snapshot file has more in it than it says")
+        # Offsets that go backwards or out of the tables would make
+        # facts come out wrong, or fail only when they are looked at
+        if not (_ascending(self._tokens) and _ascending(self._offsets) and
+                self._offsets[fact_count] == word_count and
+                (not word_count or max(self._words) < token_count)):
+            raise ValueError("Snapshot file is corrupt")
+        # Words decoded so far, by number
+        self._decoded = [None] * token_count
+        self._facts = None
+
+    def close(self):
+        for name in ('_tokens', '_offsets', '_words', '_flags', '_view'):
+            if hasattr(self, name):
+                getattr(self, name).release()
+                delattr(self, name)
+        self._map.close()
+
+    def __len__(self):
+        return len(self._flags)
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self.fact(index)
+
+    def __contains__(self, fact):
+        if self._facts is None:
+            self._facts = set(self)
+        return fact in self._facts
+
+    def word(self, number):
+        """The word numbered 'number' in the table."""
+        word = self._decoded[number]
+        if word is None:
+            start = self._text + self._tokens[number]
+            end = self._text + self._tokens[number + 1]
+            word = self._map[start:end].decode('utf-8')
+            self._decoded[number] = word
+        return word
+
+    def fact(self, index):
+        """The fact added 'index'th."""
+        return ' '.join([self.word(number) for number in
+                         self._words[self._offsets[index]:
+                                     self._offsets[index + 1]]])
+
+    def is_base(self, index):
+        """Whether the fact added 'index'th was base data."""
+        return bool(self._flags[index])
+
+    def base(self):
+        """The base facts, in the order they were added."""
+        return [self.fact(index) for index in range(len(self))
+                if self._flags[index]]
+
+    def store(self):
+        """A new FactStore of the facts, added in the same order."""
+        return FactStore(self)
+
+
+def _stratified(rules):
+    """
+    Whether every fact that a NOT in a rule tests for can only be
+    derived by rules before it, from facts that only rules before it
+    derive, and so on: then the rules before it are done with what
+    it tests for by the time it fires, however the data came to be.
+    """
+    def producers(pattern):
+        return [index for index, rule in enumerate(rules)
+                if [action for action in rule.consequent()
+                    if _overlap(action, pattern)]]
+    for index, rule in enumerate(rules):
+        patterns = _negated(rule.antecedent())
+        needed = set()
+        while patterns:
+            for producer in producers(patterns.pop()):
+                if producer >= index: return False
+                if producer not in needed:
+                    needed.add(producer)
+                    patterns.extend(_strings(rules[producer].antecedent()))
+    return True
+
+def _overlap(first, second):
+    # Whether some fact might match both templates
+    first, second = compile_pattern(first), compile_pattern(second)
+    if first.length is None or second.length is None: return True
+    if first.length != second.length: return False
+    constants = dict(first.constants)
+    for position, word in second.constants:
+        if constants.get(position, word) != word: return False
+    return True
+
+def _unsettled(rules, store, since):
+    """
+    Whether a fact added to 'store' from the stamp 'since' on
+    matches a NOT that some binding of a rule among the older facts
+    would have tested: had it been there from the start, the rules
+    might not have derived everything that they did.
+    """
+    new = list(store.window(since))
+    old = store.window(0, since)
+    def matched(patterns):
+        for pattern in patterns:
+            for fact in new:
+                if compile_pattern(pattern).match(fact) is not None:
+                    return True
+        return False
+
+    for rule in rules:
+        condition = rule.antecedent()
+        if isinstance(condition, AND):
+            parts = list(condition)
+        else:
+            parts = [condition]
+        positive = [part for part in parts if not isinstance(part, NOT)]
+        bound = set()
+        for part in parts:
+            if not isinstance(part, NOT):
+                # A NOT inside a nested AND or OR is tested without
+                # any of the bindings so far
+                if matched(_negated(part)): return True
+                bound |= bound_vars(part)
+            elif (not isinstance(part[0], str) or
+                  not set(AIStringVars(part[0])) <= bound):
+                # Tested without all of its variables bound
+                if matched(_negated(part)): return True
+            else:
+                pattern = compile_pattern(part[0])
+                for fact in new:
+                    bindings = pattern.match(fact)
+                    if bindings is None: continue
+                    for found in join(positive, [old] * len(positive),
+                                      bindings):
+                        return True
+    return False
+
+def _negated(condition, negated=False):
+    # The patterns under a NOT in 'condition'
+    if isinstance(condition, str):
+        return negated and [condition] or []
+    negated = negated or isinstance(condition, NOT)
+    result = []
+    for part in condition:
+        result.extend(_negated(part, negated))
+    return result
+
+def _strings(condition):
+    if isinstance(condition, str):
+        return [condition]
+    result = []
+    for part in condition:
+        result.extend(_strings(part))
+    return result
+
+def cached_forward_chain(rules, data, path):
+    """
+    Return forward_chain(rules, data), using the snapshot in the file
+    'path' (if there is one) to save work, and then saving one there.
+    """
+    data = list(data)
+    base = set(data)
+    store = None
+    if os.path.exists(path):
+        # A snapshot that can't be read is just started over
+        try:
+            snapshot = load(path)
+        except ValueError:
+            snapshot = None
+        if snapshot is not None:
+            try:
+                if snapshot.rules_digest != rules_digest(rules):
+                    pass
+                elif snapshot.data_digest == data_digest(base):
+                    return tuple(sorted(snapshot))
+                elif (not [rule for rule in rules if rule.delete_clause()]
+                      and _stratified(rules)):
+                    if not [fact for fact in snapshot.base()
+                            if fact not in base]:
+                        store = snapshot.store()
+            except ValueError:
+                store = None
+            finally:
+                snapshot.close()
+
+    if store is not None:
+        since = store.clock()
+        for fact in data:
+            store.add(fact)
+        seminaive_forward_chain(rules, store, since=since)
+        if _unsettled(rules, store, since):
+            store = None
+    if store is None:
+        store = FactStore(data)
+        forward_chain(rules, store)
+    save(path, rules, base, store)
+    return store.as_tuple()
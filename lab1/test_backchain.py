@@ -0,0 +1,87 @@
+"""
+Tests for backchain_to_goal_tree() (backchain.py).
+
+Run them from this directory with 'python -m unittest test_backchain'.
+"""
+
+import unittest
+
+from production import AND, OR, match
+from backchain import backchain_to_goal_tree, rename_apart, RuleIndex
+from lab1 import transitive_rule, family_rules
+from zookeeper import ZOOKEEPER_RULES
+
+
+class BackchainTest(unittest.TestCase):
+    def test_zookeeper(self):
+        self.assertEqual(backchain_to_goal_tree(ZOOKEEPER_RULES,
+                                                'alice is an albatross'),
+                         OR('alice is an albatross',
+                            AND(OR('alice is a bird', 'alice has feathers',
+                                   AND('alice flies', 'alice lays eggs')),
+                                'alice is a good flyer')))
+
+    def test_rule_variables_renamed_apart(self):
+        # Expanding 'a beats (?y)' brings in another (?y) of the rule's
+        # own, which mustn't be taken for the first one
+        tree = backchain_to_goal_tree([transitive_rule], 'a beats c')
+        self.assertEqual(tree[0], 'a beats c')
+        self.assertEqual(tree[1][0],
+                         OR('a beats (?y)',
+                            AND('a beats (?y1)',
+                                OR('(?y1) beats (?y)',
+                                   AND('(?y1) beats (?y2)',
+                                       '(?y2) beats (?y)')))))
+        self.assertNotIn('(?y) beats (?y)', str(tree))
+
+    def test_hypothesis_variables(self):
+        self.assertEqual(backchain_to_goal_tree([transitive_rule],
+                                                'a beats (?z)'),
+                         OR('a beats (?z)',
+                            AND('a beats (?y)',
+                                OR('(?y) beats (?z)',
+                                   AND('(?y) beats (?y1)',
+                                       '(?y1) beats (?z)')))))
+
+    def test_rename_apart(self):
+        used = set(['y', 'y1'])
+        binding = rename_apart(transitive_rule, {'x': 'a', 'z': 'c'}, used)
+        self.assertEqual(binding, {'x': 'a', 'z': 'c', 'y': '(?y2)'})
+        self.assertIn('y2', used)
+
+    def test_repeated_variables(self):
+        # autoidentity concludes 'self (?x) (?x)', which doesn't match
+        # 'self (?x) (?z)'
+        tree = backchain_to_goal_tree(family_rules, 'cousin bart lisa')
+        self.assertEqual(tree[0], 'cousin bart lisa')
+        self.assertIn("'self (?x) (?z)'", str(tree))
+        self.assertNotIn('male', str(tree))
+
+    def test_no_rules(self):
+        self.assertEqual(backchain_to_goal_tree(ZOOKEEPER_RULES,
+                                                'alice is a unicorn'),
+                         'alice is a unicorn')
+        self.assertEqual(backchain_to_goal_tree([], 'alice is a bird'),
+                         'alice is a bird')
+
+    def test_recursive_rules_end(self):
+        # The rule concludes what it tests for, over and over
+        tree = backchain_to_goal_tree([transitive_rule], 'a beats c')
+        self.assertEqual(tree[0], 'a beats c')
+        self.assertIsInstance(tree, OR)
+
+    def test_rule_index(self):
+        index = RuleIndex(list(ZOOKEEPER_RULES) + family_rules)
+        for hypothesis in ('alice is a zebra', 'alice has hair',
+                           'brother bart lisa', 'self a a', 'self a b',
+                           'nothing at all', 'odd  spacing'):
+            expected = [number for number, rule in enumerate(index.rules)
+                        if match(rule.consequent()[0],
+                                 hypothesis) is not None]
+            self.assertEqual([number for number in
+                              index.candidates(hypothesis)
+                              if number in expected], expected, hypothesis)
+
+
+if __name__ == '__main__':
+    unittest.main()
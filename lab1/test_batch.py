@@ -0,0 +1,40 @@
+"""
+Tests for batch_forward_chain() (batch.py).
+
+Run them from this directory with 'python -m unittest test_batch'.
+"""
+
+import unittest
+
+from production import IF, THEN, DELETE, forward_chain
+from batch import batch_forward_chain
+from lab1 import family_rules, simpsons_data, black_data
+
+
+class BatchTest(unittest.TestCase):
+    def test_same_as_forward_chain(self):
+        datasets = [simpsons_data, black_data, (), simpsons_data]
+        results = batch_forward_chain(family_rules, datasets)
+        self.assertEqual(list(results),
+                         [forward_chain(family_rules, data)
+                          for data in datasets])
+        self.assertEqual(results.input_facts,
+                         sum([len(data) for data in datasets]))
+
+    def test_workers(self):
+        datasets = [simpsons_data, black_data] * 3
+        self.assertEqual(list(batch_forward_chain(family_rules, datasets,
+                                                  workers=2)),
+                         list(batch_forward_chain(family_rules, datasets)))
+
+    def test_cancelling_rule(self):
+        # Its add and delete cancel out, so it must not fire forever,
+        # nor leave anything behind for the next data set
+        rules = [IF('s (?z)', THEN('p (?z) (?z)'), DELETE('p (?z) (?z)'))]
+        datasets = [['s a'], ['s a', 's b'], ['p a a'], ['s a']]
+        self.assertEqual(list(batch_forward_chain(rules, datasets)),
+                         [('s a',), ('s a', 's b'), ('p a a',), ('s a',)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+"""
+Tests that every forward_chain() engine comes to the same result as
+the naive one.
+
+Run them from this directory with 'python -m unittest test_engines'.
+"""
+
+import unittest
+
+from production import IF, AND, OR, NOT, THEN, DELETE, forward_chain
+from factstore import FactStore
+from lab1 import (transitive_rule, family_rules, poker_data,
+                  simpsons_data, black_data)
+from zookeeper import ZOOKEEPER_RULES, ZOO_DATA
+
+# The keyword arguments to forward_chain() for each engine
+ENGINES = [{'engine': 'rete'}, {'engine': 'seminaive'}, {'plan_joins': True},
+           {'engine': 'parallel'}]
+
+theft_rules = [IF('you have (?x)', THEN('i have (?x)'),
+                  DELETE('you have (?x)')),
+               IF(AND('i have (?x)', NOT('you want (?x)')),
+                  THEN('nobody wants (?x)'))]
+theft_data = ['you have apple', 'you have pear', 'you want pear']
+
+RULE_SETS = [
+    ([transitive_rule], poker_data),
+    ([transitive_rule], ['rock beats scissors', 'scissors beats paper',
+                         'paper beats rock']),
+    (family_rules, simpsons_data),
+    (family_rules, black_data),
+    (ZOOKEEPER_RULES, ZOO_DATA),
+    (theft_rules, theft_data),
+    ([IF(OR('a (?x)', 'b (?x)'), THEN('c (?x)'))], ['a 1', 'b 2', 'c 3']),
+    ([IF('s (?z)', THEN('p (?z) (?z)'), DELETE('p (?z) (?z)'))], ['s a']),
+    ]
+
+
+class EngineTest(unittest.TestCase):
+    def test_lab_rule_sets(self):
+        for rules, data in RULE_SETS:
+            expected = forward_chain(rules, data)
+            for engine in ENGINES:
+                self.assertEqual(forward_chain(rules, data, **engine),
+                                 expected, (engine, rules))
+
+    def test_apply_only_one(self):
+        for rules, data in RULE_SETS[:6]:
+            expected = forward_chain(rules, data, apply_only_one=True)
+            for engine in ENGINES:
+                self.assertEqual(forward_chain(rules, data,
+                                               apply_only_one=True,
+                                               **engine),
+                                 expected, (engine, rules))
+
+    def test_fact_store(self):
+        for engine in ENGINES:
+            store = FactStore(simpsons_data)
+            self.assertIs(forward_chain(family_rules, store, **engine),
+                          store)
+            self.assertEqual(store.as_tuple(),
+                             forward_chain(family_rules, simpsons_data))
+
+    def test_unbound_delete(self):
+        # A DELETE pattern the antecedent doesn't bind is skipped
+        rules = [IF('a (?x)', THEN('b (?x)'), DELETE('c (?y)', 'a (?x)'))]
+        expected = forward_chain(rules, ['a 1', 'c 2'])
+        self.assertEqual(expected, ('b 1', 'c 2'))
+        for engine in ENGINES:
+            self.assertEqual(forward_chain(rules, ['a 1', 'c 2'], **engine),
+                             expected, engine)
+
+    def test_unknown_engine(self):
+        self.assertRaises(ValueError, forward_chain, family_rules,
+                          simpsons_data, engine='magic')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,131 @@
+"""
+Tests for FactStore (factstore.py).
+
+Run them from this directory with 'python -m unittest test_factstore'.
+"""
+
+import unittest
+
+from production import match
+from factstore import FactStore
+from utils import VariableTable, compile_pattern
+from lab1 import simpsons_data
+
+FACTS = list(simpsons_data) + ['self bart bart', 'self lisa bart',
+                               'odd  spacing here', 'trailing space ',
+                               'parent marge bart\n']
+
+TEMPLATES = ['parent (?x) (?y)', 'parent marge (?y)', 'parent (?x) bart',
+             'male (?x)', '(?relation) bart', 'self (?x) (?x)',
+             'odd  (?x) here', 'trailing (?x) ', '(?x) (?y) bart',
+             'parent (?x) (?y)\n', '(?anything)']
+
+
+def brute_force(template, facts, bound=None):
+    # The bindings that production.match() finds, fact by fact
+    result = []
+    for fact in facts:
+        bindings = match(template, fact)
+        if bindings is None: continue
+        if bound and [var for var in bindings
+                      if var in bound and bound[var] != bindings[var]]:
+            continue
+        result.append(bindings)
+    return result
+
+def sort(bindings):
+    return sorted([sorted(binding.items()) for binding in bindings])
+
+
+class FactStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.store = FactStore(FACTS)
+
+    def test_set_like(self):
+        self.assertEqual(len(self.store), len(set(FACTS)))
+        self.assertEqual(set(self.store), set(FACTS))
+        self.assertIn('male bart', self.store)
+        self.assertNotIn('male lisa', self.store)
+        self.assertEqual(self.store.as_tuple(), tuple(sorted(set(FACTS))))
+        self.assertFalse(self.store.add('male bart'))
+        self.assertEqual(self.store.copy().as_tuple(),
+                         self.store.as_tuple())
+
+    def test_match(self):
+        for template in TEMPLATES:
+            self.assertEqual(sort(self.store.match(template)),
+                             sort(brute_force(template, FACTS)), template)
+
+    def test_match_bound(self):
+        for bound in ({'x': 'marge'}, {'y': 'bart'}, {'x': 'nobody'},
+                      {'relation': 'male'}):
+            for template in TEMPLATES:
+                self.assertEqual(sort(self.store.match(template, bound)),
+                                 sort(brute_force(template, FACTS, bound)),
+                                 (template, bound))
+
+    def test_remove(self):
+        removed = ['parent marge bart', 'self bart bart', 'odd  spacing here']
+        for fact in removed:
+            self.assertTrue(self.store.remove(fact))
+            self.assertFalse(self.store.remove(fact))
+        left = [fact for fact in FACTS if fact not in removed]
+        self.assertEqual(set(self.store), set(left))
+        for template in TEMPLATES:
+            self.assertEqual(sort(self.store.match(template)),
+                             sort(brute_force(template, left)), template)
+        self.assertEqual(list(self.store.candidates('male (?x)',
+                                                    {'x': 'nobody'})), [])
+
+    def test_match_slots(self):
+        for bound in ({}, {'x': 'marge'}, {'y': 'bart'}, {'x': 'nobody'}):
+            for template in TEMPLATES:
+                # The slot array has room for every variable
+                table = VariableTable(compile_pattern(template).variables)
+                values = table.unify(table.empty(), bound)
+                found = [table.as_dict(extended) for extended in
+                         self.store.match_slots(template, table, values)]
+                self.assertEqual(sort(found),
+                                 sort([dict(bound, **bindings) for bindings
+                                       in brute_force(template, FACTS,
+                                                      bound)]),
+                                 (template, bound))
+
+    def test_estimate(self):
+        # The 7 parent facts, plus the 3 that can't be indexed
+        self.assertEqual(self.store.estimate('parent (?x) (?y)'), 7 + 3)
+        self.assertLess(self.store.estimate('parent (?x) (?y)', ['x']),
+                        self.store.estimate('parent (?x) (?y)'))
+
+    def test_windows(self):
+        store = FactStore(['a 1', 'a 2'])
+        since = store.clock()
+        store.add('a 3')
+        store.add('b 3')
+        window = store.window(since)
+        self.assertEqual(list(window), ['a 3', 'b 3'])
+        self.assertEqual(sort(window.match('a (?x)')), [[('x', '3')]])
+        self.assertEqual(list(store.window(0, since)), ['a 1', 'a 2'])
+        store.remove('a 3')
+        self.assertEqual(list(window), ['b 3'])
+        self.assertNotIn('a 3', window)
+        # Added again, it is new again
+        store.add('a 1')
+        store.remove('a 1')
+        store.add('a 1')
+        self.assertEqual(list(store.window(since)), ['b 3', 'a 1'])
+        self.assertRaises(TypeError, window.add, 'c 1')
+
+    def test_churn(self):
+        # Facts that keep coming and going don't make the store grow
+        store = FactStore(['base'])
+        for round in range(1000):
+            store.add('temporary %d' % (round % 3))
+            store.remove('temporary %d' % ((round + 1) % 3))
+        self.assertEqual(store.clock(), 1001)
+        self.assertEqual(len(store._by_stamp), len(store))
+        self.assertEqual(list(store.window(990)), list(store)[1:])
+
+
+if __name__ == '__main__':
+    unittest.main()
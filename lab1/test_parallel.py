@@ -0,0 +1,55 @@
+"""
+Tests for the parallel engine (parallel.py).
+
+Run them from this directory with 'python -m unittest test_parallel'.
+"""
+
+import unittest
+
+from production import forward_chain
+from factstore import FactStore
+from parallel import parallel_forward_chain, shard_bindings
+from lab1 import family_rules, black_data
+from test_engines import RULE_SETS, theft_rules, theft_data
+
+
+class ParallelTest(unittest.TestCase):
+    def test_pool(self):
+        for rules, data in ((family_rules, black_data),
+                            (theft_rules, theft_data)):
+            expected = forward_chain(rules, data)
+            for workers, shards in ((1, 1), (2, 1), (2, 2)):
+                self.assertEqual(parallel_forward_chain(rules, data,
+                                                        workers=workers,
+                                                        shards=shards),
+                                 expected, (workers, shards))
+
+    def test_rule_sets(self):
+        # Rules skipped as quiet must be matched again once a rule
+        # after them changes what they match
+        for rules, data in RULE_SETS:
+            self.assertEqual(parallel_forward_chain(rules, data, workers=2),
+                             forward_chain(rules, data), rules)
+
+    def test_min_facts(self):
+        # Too few facts for a pool; the FactStore is still updated
+        store = FactStore(black_data)
+        self.assertIs(parallel_forward_chain(family_rules, store,
+                                             min_facts=1000), store)
+        self.assertEqual(store.as_tuple(),
+                         forward_chain(family_rules, black_data))
+
+    def test_shards(self):
+        store = FactStore(black_data)
+        condition = family_rules[1].antecedent()
+        found = []
+        for shard in range(3):
+            found.extend([sorted(bindings.items()) for bindings in
+                          shard_bindings(condition, store, shard, 3)])
+        self.assertEqual(sorted(found),
+                         sorted([sorted(bindings.items()) for bindings in
+                                 shard_bindings(condition, store)]))
+
+
+if __name__ == '__main__':
+    unittest.main()
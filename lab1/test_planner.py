@@ -0,0 +1,71 @@
+"""
+Tests for the join planner (planner.py).
+
+Run them from this directory with 'python -m unittest test_planner'.
+"""
+
+import unittest
+
+from production import AND, OR, NOT, RuleExpression
+from factstore import FactStore
+from planner import plan, order, explain, bound_vars, estimator
+from lab1 import family_rules, simpsons_data, black_data
+
+
+def bindings(condition, store):
+    return sorted([sorted(found.items()) for found in
+                   RuleExpression().test_term_matches(condition, store)])
+
+
+class PlannerTest(unittest.TestCase):
+    def setUp(self):
+        facts = list(black_data) + ['sibling sirius regulus',
+                                    'self sirius sirius']
+        self.store = FactStore(facts)
+
+    def test_same_bindings(self):
+        conditions = [rule.antecedent() for rule in family_rules]
+        conditions.append(AND('parent (?x) (?y)', 'sibling (?x) (?z)',
+                              NOT('self (?x) (?z)'), 'male (?z)'))
+        conditions.append(AND(NOT('self nobody nobody'), 'male (?x)',
+                              OR('parent (?x) (?y)', 'parent (?y) (?x)')))
+        for condition in conditions:
+            self.assertEqual(bindings(plan(condition, self.store),
+                                      self.store),
+                             bindings(condition, self.store), condition)
+
+    def test_cheapest_first(self):
+        condition = AND('parent (?x) (?y)', 'sibling (?x) (?z)')
+        self.assertEqual(list(plan(condition, self.store)),
+                         ['sibling (?x) (?z)', 'parent (?x) (?y)'])
+
+    def test_not_placement(self):
+        cost = estimator(self.store)
+        # Bound where it was written: goes in as soon as it can be
+        conditions = ['parent (?x) (?y)', 'sibling (?x) (?z)',
+                      NOT('self (?x) (?z)')]
+        self.assertEqual(order(conditions, cost),
+                         (['sibling (?x) (?z)', NOT('self (?x) (?z)'),
+                           'parent (?x) (?y)'], [1, 2, 0]))
+        # Never bound: checked first
+        conditions = ['parent (?x) (?y)', NOT('self (?w) (?w)')]
+        self.assertEqual(order(conditions, cost)[1], [1, 0])
+        # Bound by some bindings and not others: left as written
+        conditions = [OR('parent (?x) (?y)', 'male (?x)'),
+                      'sibling (?x) (?z)', NOT('self (?y) (?y)')]
+        self.assertEqual(order(conditions, cost)[1], [0, 1, 2])
+
+    def test_bound_vars(self):
+        self.assertEqual(bound_vars(OR('a (?x) (?y)', 'b (?x)')),
+                         set(['x']))
+        self.assertEqual(bound_vars(AND('a (?x)', NOT('b (?y)'))),
+                         set(['x']))
+
+    def test_explain(self):
+        text = explain(family_rules[8], simpsons_data)
+        self.assertIn('sibling (?x) (?z)', text)
+        self.assertEqual(len(text.splitlines()), 2 + 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,167 @@
+"""
+Tests for matching and the naive forward chainer (production.py).
+
+Run them from this directory with 'python -m unittest test_production'.
+"""
+
+import unittest
+
+from production import IF, AND, OR, NOT, THEN, PASS, FAIL, match, populate, \
+     forward_chain, forward_chain_iter, derives, join, simplify, uniq
+from factstore import FactStore
+from lab1 import transitive_rule, family_rules, poker_data, simpsons_data
+
+
+class MatchTest(unittest.TestCase):
+    def test_match(self):
+        self.assertEqual(match('parent (?x) (?y)', 'parent marge bart'),
+                         {'x': 'marge', 'y': 'bart'})
+        self.assertEqual(match('parent (?x) (?y)', 'parent marge'), None)
+        self.assertEqual(match('male bart', 'male bart'), {})
+
+    def test_repeated_variable(self):
+        # The second (?x) has to be the same word as the first
+        self.assertEqual(match('self (?x) (?x)', 'self bart bart'),
+                         {'x': 'bart'})
+        self.assertEqual(match('self (?x) (?x)', 'self bart lisa'), None)
+        self.assertEqual(match('(?x) and (?y) and (?x)', 'a and b and a'),
+                         {'x': 'a', 'y': 'b'})
+        self.assertEqual(populate('self (?x) (?x)', {'x': 'bart'}),
+                         'self bart bart')
+
+
+def brute_force(conditions, facts, bindings=None):
+    # Every way of matching the patterns and NOTs in 'conditions', one
+    # after the other
+    if bindings is None: bindings = {}
+    if not conditions:
+        yield bindings
+        return
+    condition, rest = conditions[0], conditions[1:]
+    if isinstance(condition, NOT):
+        found = _agreeing(condition[0], facts, bindings)
+        if not found:
+            for result in brute_force(rest, facts, bindings):
+                yield result
+        return
+    for found in _agreeing(condition, facts, bindings):
+        for result in brute_force(rest, facts, dict(bindings, **found)):
+            yield result
+
+def _agreeing(template, facts, bindings):
+    # The matches of 'template' that agree with 'bindings'
+    result = []
+    for fact in facts:
+        found = match(template, fact)
+        if found is not None and not [var for var in found if var in bindings
+                                      and bindings[var] != found[var]]:
+            result.append(found)
+    return result
+
+def sort(bindings):
+    return sorted([sorted(dict(binding).items()) for binding in bindings])
+
+
+class JoinTest(unittest.TestCase):
+    CONDITIONS = [
+        ['parent (?x) (?y)', 'parent (?x) (?z)'],
+        ['parent (?x) (?y)', 'male (?y)', NOT('female (?x)')],
+        ['male (?x)', 'parent (?y) (?x)', 'parent (?y) (?z)',
+         NOT('male (?z)')],
+        ['parent (?x) (?y)', 'parent (?y) (?z)'],
+        ]
+
+    def test_join(self):
+        facts = set(simpsons_data)
+        for conditions in self.CONDITIONS:
+            expected = sort(brute_force(conditions, sorted(facts)))
+            self.assertEqual(sort(join(conditions,
+                                       [facts] * len(conditions))),
+                             expected, conditions)
+            self.assertEqual(sort(join(conditions, [FactStore(facts)] *
+                                       len(conditions))),
+                             expected, conditions)
+
+    def test_nested(self):
+        facts = FactStore(simpsons_data)
+        conditions = ['parent (?x) (?y)', OR('male (?y)', 'female (?y)')]
+        self.assertEqual(sort(join(conditions, [facts] * 2)),
+                         sort(join(['parent (?x) (?y)'], [facts])))
+        self.assertEqual(list(join(['parent (?x) (?y)', 'male nobody'],
+                                   [facts] * 2)), [])
+
+
+class SimplifyTest(unittest.TestCase):
+    def test_simplify(self):
+        self.assertEqual(simplify(OR('a', AND('b', 'c'), AND('b', 'c'),
+                                     OR('a', 'd'))),
+                         OR('a', AND('b', 'c'), 'a', 'd'))
+        self.assertEqual(simplify(AND('a', AND('b', FAIL))), FAIL)
+        self.assertEqual(simplify(OR('a', PASS)), PASS)
+        self.assertEqual(simplify(OR(AND('a'))), 'a')
+
+    def test_shared_subtrees(self):
+        # Equal subtrees come out as one object, however they went in
+        tree = simplify(AND(OR('a', 'b'), OR('x', AND(OR('a', 'b'), 'y'))))
+        self.assertEqual(tree, AND(OR('a', 'b'), OR('x', AND(OR('a', 'b'),
+                                                             'y'))))
+        self.assertIs(tree[0], tree[1][1][0])
+        shared = OR('p', AND('q', 'r'))
+        tree = simplify(AND(shared, OR('s', shared), shared))
+        self.assertEqual(tree, AND(shared, OR('s', 'p', AND('q', 'r'))))
+
+    def test_uniq(self):
+        self.assertEqual(uniq(['a', AND('a'), 'a', AND('a'), ['b'], ['b']]),
+                         ['a', AND('a'), ['b']])
+
+
+class ForwardChainTest(unittest.TestCase):
+    def test_repeated_variable(self):
+        rules = [IF('self (?x) (?x)', THEN('same (?x)')),
+                 IF(AND('parent (?x) (?y)', 'parent (?y) (?x)'),
+                    THEN('self (?x) (?x)'))]
+        self.assertEqual(forward_chain(rules, ['self a a', 'self a b',
+                                               'parent c d',
+                                               'parent d c']),
+                         ('parent c d', 'parent d c', 'same a', 'same c',
+                          'same d', 'self a a', 'self a b', 'self c c',
+                          'self d d'))
+
+
+class ForwardChainIterTest(unittest.TestCase):
+    def test_events(self):
+        # Replaying the events on the data comes to forward_chain()'s
+        # result, and each one changes it
+        for rules, data in (([transitive_rule], poker_data),
+                            (family_rules, simpsons_data)):
+            facts = set(data)
+            for rule, bindings, added, deleted in forward_chain_iter(rules,
+                                                                     data):
+                self.assertIn(rule, rules)
+                self.assertTrue(added or deleted)
+                self.assertFalse(facts & set(added))
+                facts |= set(added)
+                facts -= set(deleted)
+            self.assertEqual(tuple(sorted(facts)),
+                             forward_chain(rules, data))
+
+    def test_stop_early(self):
+        store = FactStore(poker_data)
+        events = forward_chain_iter([transitive_rule], store)
+        rule, bindings, added, deleted = next(events)
+        self.assertEqual(added, [populate('(?x) beats (?z)', bindings)])
+        self.assertEqual(len(store), len(poker_data) + 1)
+        events.close()
+        self.assertEqual(len(store), len(poker_data) + 1)
+
+    def test_derives(self):
+        self.assertTrue(derives([transitive_rule], poker_data,
+                                'straight-flush beats pair'))
+        self.assertTrue(derives([transitive_rule], poker_data,
+                                'flush beats straight'))
+        self.assertFalse(derives([transitive_rule], poker_data,
+                                 'pair beats flush'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+"""
+Tests for the rule-engine profiler (profiler.py).
+
+Run them from this directory with 'python -m unittest test_profiler'.
+"""
+
+import json
+import unittest
+
+from production import forward_chain
+from profiler import Profiler
+from lab1 import transitive_rule, family_rules, simpsons_data
+
+
+class ProfilerTest(unittest.TestCase):
+    def test_same_result(self):
+        profile = Profiler()
+        self.assertEqual(forward_chain(family_rules, simpsons_data,
+                                       profiler=profile),
+                         forward_chain(family_rules, simpsons_data))
+        self.assertEqual([p.rule for p in profile.rules], family_rules)
+
+    def test_counts(self):
+        profile = Profiler()
+        result = forward_chain([transitive_rule],
+                               ['a beats b', 'b beats c', 'c beats d'],
+                               profiler=profile)
+        (rule,) = profile.rules
+        # Two passes that add facts, then one that finds nothing new
+        self.assertEqual(rule.tried, 3)
+        self.assertEqual(rule.fired, 3)
+        self.assertEqual(rule.added, len(result) - 3)
+        self.assertEqual(rule.deleted, 0)
+        first, second = [rule.conditions[key] for key in rule._order]
+        self.assertEqual(first.calls, rule.tried)
+        # Each binding of the first condition is matched against the
+        # second, and what comes out of that is every binding found
+        self.assertEqual(second.calls, first.produced)
+        self.assertEqual(second.produced, rule.bindings)
+        self.assertTrue(second.scanned >= second.produced)
+
+    def test_adds_up(self):
+        profile = Profiler()
+        for run in range(2):
+            forward_chain([transitive_rule], ['a beats b', 'b beats c'],
+                          profiler=profile)
+        self.assertEqual(profile.rules[0].tried, 4)
+
+    def test_output(self):
+        profile = Profiler()
+        forward_chain(family_rules, simpsons_data, profiler=profile)
+        exported = json.loads(profile.as_json())
+        self.assertEqual(len(exported), len(family_rules))
+        self.assertEqual(exported[1]['conditions'][0]['condition'],
+                         'parent (?x) (?y)')
+        table = profile.table().splitlines()
+        self.assertEqual(len(table), 2 + len(family_rules) +
+                         sum([len(p.conditions) for p in profile.rules]))
+
+    def test_other_engines(self):
+        self.assertRaises(ValueError, forward_chain, family_rules,
+                          simpsons_data, engine='rete',
+                          profiler=Profiler())
+
+
+if __name__ == '__main__':
+    unittest.main()
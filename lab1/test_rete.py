@@ -0,0 +1,90 @@
+"""
+Tests for the Rete engine (rete.py) and its agenda (agenda.py).
+
+Run them from this directory with 'python -m unittest test_rete'.
+"""
+
+import unittest
+
+from production import IF, AND, NOT, THEN, DELETE, forward_chain
+from lab1 import family_rules, simpsons_data, black_data
+
+
+class AgendaTest(unittest.TestCase):
+    # 'go' lets both rules fire, but the second takes it away
+    rules = [IF('go', THEN('first')),
+             IF(AND('go', 'ready'), THEN('second'), DELETE('go'),
+                salience=1)]
+    data = ['go', 'ready']
+
+    def strategy(self, strategy):
+        return forward_chain(self.rules, self.data, engine='rete',
+                             strategy=strategy)
+
+    def test_order(self):
+        self.assertEqual(self.strategy('order'),
+                         forward_chain(self.rules, self.data))
+        self.assertEqual(self.strategy('order'),
+                         ('first', 'ready', 'second'))
+
+    def test_salience(self):
+        self.assertEqual(self.strategy('salience'), ('ready', 'second'))
+
+    def test_specificity(self):
+        self.assertEqual(self.strategy('specificity'), ('ready', 'second'))
+
+    def test_recency(self):
+        # The second rule's activation came about when 'ready' was added
+        self.assertEqual(self.strategy('recency'), ('ready', 'second'))
+        self.assertEqual(forward_chain(self.rules, ['ready', 'go'],
+                                       engine='rete', strategy='recency'),
+                         ('ready', 'second'))
+
+    def test_unknown_strategy(self):
+        self.assertRaises(ValueError, forward_chain, self.rules, self.data,
+                          engine='rete', strategy='random')
+
+    def test_family_rules(self):
+        for data in (simpsons_data, black_data):
+            for strategy in ('order', 'salience'):
+                self.assertEqual(forward_chain(family_rules, data,
+                                               engine='rete',
+                                               strategy=strategy),
+                                 forward_chain(family_rules, data))
+
+
+class CancellingRulesTest(unittest.TestCase):
+    def test_add_and_delete_same_fact(self):
+        rule = IF('s (?z)', THEN('p (?z) (?z)'), DELETE('p (?z) (?z)'))
+        self.assertEqual(forward_chain([rule], ['s a']), ('s a',))
+        self.assertEqual(forward_chain([rule], ['s a'], engine='rete'),
+                         ('s a',))
+
+    def test_rules_that_undo_each_other(self):
+        rules = [IF('p (?x) (?y)', THEN('r (?x) (?y)', 's (?y)'),
+                    DELETE('q (?x)', 's (?x)')),
+                 IF(AND('s (?y)', 'p (?y) (?x)'), THEN('t (?y)'),
+                    DELETE('p (?x) (?y)'))]
+        data = ['s 0', 's 2', 'p 0 1', 'p 1 0']
+        # The first rule's two activations swap 's 0' and 's 1' back
+        # and forth, and firing both in turn leaves the data as it
+        # was.  Which 'p' fact the second rule deletes depends on
+        # which binding comes first: the naive engine can end up with
+        # either, while Rete takes its activations in sorted order
+        outcomes = [('p 0 1', 'r 0 1', 'r 1 0', 's 1', 's 2', 't 0'),
+                    ('p 1 0', 'r 0 1', 'r 1 0', 's 0', 's 2', 't 1')]
+        self.assertIn(forward_chain(rules, data), outcomes)
+        self.assertEqual(forward_chain(rules, data, engine='rete'),
+                         outcomes[0])
+
+    def test_not_let_go(self):
+        # Adding and deleting 'b x' blocks the second rule and lets it
+        # go again
+        rules = [IF('a (?x)', THEN('b (?x)'), DELETE('b (?x)')),
+                 IF(AND('a (?x)', NOT('b (?x)')), THEN('c (?x)'))]
+        self.assertEqual(forward_chain(rules, ['a x'], engine='rete'),
+                         forward_chain(rules, ['a x']))
+
+
+if __name__ == '__main__':
+    unittest.main()
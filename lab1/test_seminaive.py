@@ -0,0 +1,87 @@
+"""
+Tests for semi-naive evaluation (seminaive.py).
+
+Run them from this directory with 'python -m unittest test_seminaive'.
+"""
+
+import unittest
+
+from production import IF, AND, OR, NOT, THEN, RuleExpression, forward_chain
+from factstore import FactStore
+from seminaive import delta_matches, seminaive_forward_chain
+from lab1 import transitive_rule, family_rules, poker_data, simpsons_data
+
+CONDITIONS = [
+    '(?x) beats (?y)',
+    AND('(?x) beats (?y)', '(?y) beats (?z)'),
+    OR('(?x) beats flush', 'flush beats (?x)'),
+    AND('(?x) beats (?y)', OR('(?y) beats pair', '(?y) beats (?x)')),
+    ]
+
+
+def bindings(condition, store):
+    return set([tuple(sorted(dict(found).items())) for found in
+                RuleExpression().test_term_matches(condition, store)])
+
+
+class DeltaTest(unittest.TestCase):
+    def test_delta_matches(self):
+        # Without NOT, the bindings that use a new fact are all those
+        # there are now, less those there were before it was added
+        store = FactStore(poker_data[:5])
+        old = store.copy()
+        since = store.clock()
+        for fact in poker_data[5:] + ('pair beats straight',):
+            store.add(fact)
+        for condition in CONDITIONS:
+            found = set([tuple(sorted(dict(delta).items())) for delta in
+                         delta_matches(condition, store, since)])
+            self.assertEqual(found, bindings(condition, store) -
+                             bindings(condition, old), condition)
+        # NOT is checked against all of the data, new facts included
+        condition = AND('(?x) beats (?y)', NOT('(?y) beats pair'))
+        found = set([tuple(sorted(dict(delta).items())) for delta in
+                     delta_matches(condition, store, since)])
+        self.assertEqual(found, bindings(condition, store) &
+                         (bindings(condition[0], store) -
+                          bindings(condition[0], old)))
+
+    def test_nothing_new(self):
+        store = FactStore(poker_data)
+        self.assertEqual(list(delta_matches(CONDITIONS[1], store,
+                                            store.clock())), [])
+
+
+class SeminaiveTest(unittest.TestCase):
+    def test_same_result(self):
+        for rules, data in (([transitive_rule], poker_data),
+                            (family_rules, simpsons_data)):
+            self.assertEqual(seminaive_forward_chain(rules, data),
+                             forward_chain(rules, data))
+
+    def test_long_chain(self):
+        data = ['%d beats %d' % (number, number + 1) for number in range(15)]
+        result = seminaive_forward_chain([transitive_rule], data)
+        self.assertEqual(len(result), 15 * 16 // 2)
+        self.assertEqual(result, forward_chain([transitive_rule], data))
+
+    def test_fact_store(self):
+        # Chaining on from a store that was already chained
+        store = FactStore(poker_data[:4])
+        forward_chain([transitive_rule], store)
+        for fact in poker_data[4:]:
+            store.add(fact)
+        self.assertIs(seminaive_forward_chain([transitive_rule], store),
+                      store)
+        self.assertEqual(store.as_tuple(),
+                         forward_chain([transitive_rule], poker_data))
+
+    def test_apply_only_one(self):
+        rules = [IF(AND('(?x) beats (?y)', '(?y) beats (?z)'),
+                    THEN('(?x) beats (?z)'))]
+        self.assertEqual(seminaive_forward_chain(rules, poker_data, True),
+                         forward_chain(rules, poker_data, True))
+
+
+if __name__ == '__main__':
+    unittest.main()
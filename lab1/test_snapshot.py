@@ -0,0 +1,144 @@
+"""
+Tests for snapshot files (snapshot.py).
+
+Run them from this directory with 'python -m unittest test_snapshot'.
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from production import IF, THEN, DELETE, forward_chain
+from factstore import FactStore
+import snapshot
+from snapshot import save, load, cached_forward_chain
+from lab1 import transitive_rule, family_rules, simpsons_data, black_data
+
+
+class SnapshotTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'facts.snap')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_round_trip(self):
+        data = list(simpsons_data) + ['odd  spacing', 'café über']
+        store = FactStore(data)
+        forward_chain(family_rules, store)
+        save(self.path, family_rules, data, store)
+        loaded = load(self.path)
+        try:
+            self.assertEqual(len(loaded), len(store))
+            self.assertEqual(list(loaded),
+                             sorted(store, key=store.stamp))
+            self.assertEqual(loaded.base(), data)
+            self.assertIn('sibling bart lisa', loaded)
+            self.assertFalse(loaded.is_base(len(loaded) - 1))
+            self.assertEqual(loaded.store().as_tuple(), store.as_tuple())
+            self.assertEqual(loaded.rules_digest,
+                             snapshot.rules_digest(family_rules))
+            self.assertEqual(loaded.data_digest,
+                             snapshot.data_digest(reversed(data)))
+        finally:
+            loaded.close()
+
+    def test_not_a_snapshot(self):
+        with open(self.path, 'wb') as output:
+            output.write(b'not a snapshot file at all, no, not one bit')
+        self.assertRaises(ValueError, load, self.path)
+        store = FactStore(['a beats b'])
+        save(self.path, [transitive_rule], ['a beats b'], store)
+        with open(self.path, 'rb') as input:
+            whole = input.read()
+        with open(self.path, 'wb') as output:
+            output.write(whole[:-3])
+        self.assertRaises(ValueError, load, self.path)
+
+    def save_family(self):
+        store = FactStore(simpsons_data)
+        forward_chain(family_rules, store)
+        save(self.path, family_rules, simpsons_data, store)
+        with open(self.path, 'rb') as input:
+            return input.read()
+
+    def write(self, contents):
+        with open(self.path, 'wb') as output:
+            output.write(contents)
+
+    def test_cut_short(self):
+        whole = self.save_family()
+        for length in range(len(whole)):
+            self.write(whole[:length])
+            self.assertRaises(ValueError, load, self.path)
+        self.write(whole + b'\0')
+        self.assertRaises(ValueError, load, self.path)
+
+    def test_corrupt_header(self):
+        whole = self.save_family()
+        header = list(snapshot._HEADER.unpack_from(whole))
+        # The word, fact and fact word counts
+        for field in (5, 6, 7):
+            for change in (-1, 1, 1000, 2 ** 32 - 1 - header[field]):
+                corrupt = list(header)
+                corrupt[field] += change
+                self.write(snapshot._HEADER.pack(*corrupt) +
+                           whole[snapshot._HEADER.size:])
+                self.assertRaises(ValueError, load, self.path)
+
+    def test_corrupt_offsets(self):
+        whole = self.save_family()
+        header = snapshot._HEADER.unpack_from(whole)
+        tokens = snapshot._HEADER.size
+        offsets = tokens + (header[5] + 1) * snapshot._UINT
+        words = offsets + (header[6] + 1) * snapshot._UINT
+        for position in (tokens + snapshot._UINT, offsets + snapshot._UINT,
+                         words):
+            corrupt = bytearray(whole)
+            corrupt[position:position + snapshot._UINT] = b'\xff' * 4
+            self.write(bytes(corrupt))
+            self.assertRaises(ValueError, load, self.path)
+
+    def test_cached_cut_short(self):
+        # A snapshot that can't be read is worked out again
+        data = ['a beats b', 'b beats c', 'c beats d']
+        expected = forward_chain([transitive_rule], data)
+        cached_forward_chain([transitive_rule], data, self.path)
+        with open(self.path, 'rb') as input:
+            whole = input.read()
+        for length in range(len(whole)):
+            self.write(whole[:length])
+            self.assertEqual(cached_forward_chain([transitive_rule], data,
+                                                  self.path), expected)
+            with open(self.path, 'rb') as input:
+                self.assertEqual(input.read(), whole)
+
+    def test_cached_forward_chain(self):
+        expected = forward_chain(family_rules, simpsons_data)
+        self.assertEqual(cached_forward_chain(family_rules, simpsons_data,
+                                              self.path), expected)
+        # Same rules and data: straight from the snapshot
+        self.assertEqual(cached_forward_chain(family_rules, simpsons_data,
+                                              self.path), expected)
+        # More data: chained on from the snapshot
+        more = list(simpsons_data) + ['parent bart hugo', 'male hugo']
+        self.assertEqual(cached_forward_chain(family_rules, more,
+                                              self.path),
+                         forward_chain(family_rules, more))
+        # Different data altogether
+        self.assertEqual(cached_forward_chain(family_rules, black_data,
+                                              self.path),
+                         forward_chain(family_rules, black_data))
+
+    def test_cached_delete(self):
+        rules = [IF('you have (?x)', THEN('i have (?x)'),
+                    DELETE('you have (?x)'))]
+        for data in (['you have apple'], ['you have apple', 'you have pear']):
+            self.assertEqual(cached_forward_chain(rules, data, self.path),
+                             forward_chain(rules, data))
+
+
+if __name__ == '__main__':
+    unittest.main()
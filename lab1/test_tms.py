@@ -0,0 +1,94 @@
+"""
+Tests for truth maintenance (tms.py).
+
+Run them from this directory with 'python -m unittest test_tms'.
+"""
+
+import random
+import unittest
+
+from production import IF, AND, NOT, THEN, forward_chain
+from tms import TruthMaintenance
+from lab1 import transitive_rule, family_rules, poker_data, simpsons_data
+from zookeeper import ZOOKEEPER_RULES, ZOO_DATA
+
+
+class TruthMaintenanceTest(unittest.TestCase):
+    def check(self, rules, data, steps=30, seed=6034, exact=True):
+        # Retract and add back base facts at random, comparing with
+        # forward_chain() from scratch on the base data each time.
+        # With 'exact' false, only check that forward_chain() would
+        # leave the data as it is.
+        rng = random.Random(seed)
+        data = list(data)
+        tms = TruthMaintenance(rules, data)
+        base = set(data)
+        self.assertEqual(tms.as_tuple(), forward_chain(rules, data))
+        for step in range(steps):
+            fact = rng.choice(data)
+            before = set(tms)
+            if fact in base:
+                entered, left = tms.retract(fact)
+                base.discard(fact)
+            else:
+                entered, left = tms.add(fact)
+                base.add(fact)
+            if exact:
+                expected = forward_chain(rules, sorted(base))
+            else:
+                expected = forward_chain(rules, tms.as_tuple())
+            self.assertEqual(tms.as_tuple(), expected, (step, fact))
+            self.assertTrue(base <= set(tms))
+            self.assertEqual(entered, sorted(set(tms) - before))
+            self.assertEqual(left, sorted(before - set(tms)))
+
+    def test_transitive(self):
+        self.check([transitive_rule], poker_data)
+
+    def test_zookeeper(self):
+        self.check(ZOOKEEPER_RULES, ZOO_DATA + ('tim has hair',
+                                                'tim gives milk',
+                                                'tim has hoofs'))
+
+    def test_family(self):
+        # Once 'female maggie' is retracted, siblinghood's NOT lets
+        # 'sibling maggie maggie' in, and deriving 'self maggie maggie'
+        # again when she is added back doesn't take it out
+        self.check(family_rules, simpsons_data, exact=False)
+
+    def test_retraction(self):
+        tms = TruthMaintenance([transitive_rule], poker_data)
+        self.assertIn('full-house beats pair', tms)
+        entered, left = tms.retract('flush beats straight')
+        self.assertEqual(entered, [])
+        self.assertIn('full-house beats pair', left)
+        self.assertNotIn('full-house beats pair', tms)
+        self.assertIn('straight-flush beats flush', tms)
+        self.assertIn('straight beats pair', tms)
+        # Derived facts can't be retracted
+        self.assertEqual(tms.retract('straight beats pair'), ([], []))
+        self.assertIn('straight beats pair', tms)
+        self.assertEqual(tms.add('flush beats straight'),
+                         (sorted(left), []))
+
+    def test_why(self):
+        tms = TruthMaintenance([transitive_rule],
+                               ['a beats b', 'b beats c'])
+        (justification,) = tms.why('a beats c')
+        self.assertEqual(sorted(justification.facts),
+                         ['a beats b', 'b beats c'])
+        self.assertEqual(tms.why('a beats b'), [])
+
+    def test_not(self):
+        rules = [IF(AND('bird (?x)', NOT('penguin (?x)')),
+                    THEN('flies (?x)'))]
+        tms = TruthMaintenance(rules, ['bird tweety', 'bird opus'])
+        self.assertIn('flies opus', tms)
+        self.assertEqual(tms.add('penguin opus'),
+                         (['penguin opus'], ['flies opus']))
+        self.assertEqual(tms.retract('penguin opus'),
+                         (['flies opus'], ['penguin opus']))
+
+
+if __name__ == '__main__':
+    unittest.main()
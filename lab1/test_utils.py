@@ -0,0 +1,101 @@
+"""
+Tests for compiled templates and slot-array bindings (utils.py).
+
+Run them from this directory with 'python -m unittest test_utils'.
+"""
+
+import re
+import unittest
+
+from utils import AIStringToRegex, AIPattern, compile_pattern, \
+     VariableTable, unify, merge
+
+TEMPLATES = ['parent (?x) (?y)', 'male bart', '(?x) beats (?y)',
+             '(?x) is a (?y).', 'self (?x) (?x)', '(?x)', 'a.b (?x) c*d',
+             '(?x) costs $(?y)', 'odd  spacing (?x)']
+
+FACTS = ['parent marge bart', 'parent marge', 'male bart', 'male bart\n',
+         'rock beats scissors', 'rock beats', 'tweety is a bird.',
+         'tweety is a birdx', 'self bart bart', 'self bart lisa', 'bart',
+         'a.b 1 c*d', 'axb 1 c*d', 'apple costs $3', 'apple costs 3',
+         'odd  spacing here', 'odd spacing here', '']
+
+
+def regex_match(template, fact):
+    # How production.match() matched before templates were compiled
+    found = re.match(AIStringToRegex(template), fact)
+    return found and found.groupdict()
+
+
+class AIPatternTest(unittest.TestCase):
+    def test_match(self):
+        for template in TEMPLATES:
+            pattern = AIPattern(template)
+            for fact in FACTS:
+                self.assertEqual(pattern.match(fact),
+                                 regex_match(template, fact),
+                                 (template, fact))
+
+    def test_fill(self):
+        pattern = AIPattern('(?x) costs $(?y)')
+        self.assertEqual(pattern.variables, ('x', 'y'))
+        self.assertEqual(pattern.fill({'x': 'tea', 'y': '2'}),
+                         'tea costs $2')
+        self.assertRaises(KeyError, pattern.fill, {'x': 'tea'})
+
+    def test_prefix_and_suffix(self):
+        pattern = AIPattern('parent (?x) of (?y) too')
+        self.assertEqual((pattern.prefix, pattern.suffix),
+                         ('parent ', ' too'))
+        # Text with regex specials in it is left to the regex
+        pattern = AIPattern('a.b (?x) c*d')
+        self.assertEqual((pattern.prefix, pattern.suffix), (None, None))
+
+    def test_cache(self):
+        self.assertIs(compile_pattern('parent (?x) (?y)'),
+                      compile_pattern('parent (?x) (?y)'))
+        self.assertEqual(compile_pattern('male bart').template, 'male bart')
+
+
+class VariableTableTest(unittest.TestCase):
+    def test_numbers(self):
+        table = VariableTable(['x', 'y'])
+        self.assertEqual(table.number('y'), 1)
+        self.assertEqual(table.number('z'), 2)
+        self.assertEqual(table.names, ['x', 'y', 'z'])
+        self.assertEqual(table.empty(), (None, None, None))
+        pattern = compile_pattern('parent (?z) (?x)')
+        self.assertEqual(table.slots(pattern), ((1, 2), (2, 0)))
+
+    def test_unify(self):
+        table = VariableTable(['x', 'y'])
+        values = table.unify(table.empty(), {'x': 'marge'})
+        self.assertEqual(values, ('marge', None))
+        self.assertIs(table.unify(values, {'x': 'marge'}), values)
+        self.assertIsNone(table.unify(values, {'x': 'homer'}))
+        # A variable the table hasn't seen gets a new slot
+        self.assertEqual(table.unify(values, {'w': 'bart'}),
+                         ('marge', None, 'bart'))
+        self.assertEqual(dict(table.as_dict(('marge', None, 'bart'))),
+                         {'x': 'marge', 'w': 'bart'})
+
+    def test_unify_words(self):
+        slots = ((1, 0), (2, 1))
+        values = (None, 'bart')
+        self.assertEqual(unify(values, slots, ('parent', 'marge', 'bart')),
+                         ('marge', 'bart'))
+        self.assertIsNone(unify(values, slots, ('parent', 'marge', 'lisa')))
+        self.assertIs(unify(('marge', 'bart'), slots,
+                            ('parent', 'marge', 'bart')),
+                      ('marge', 'bart'))
+
+    def test_merge(self):
+        self.assertEqual(merge(('a', None, None), (None, 'b', None)),
+                         ('a', 'b', None))
+        self.assertIsNone(merge(('a', None), ('c', None)))
+        values = ('a', 'b')
+        self.assertIs(merge(values, (None, 'b')), values)
+
+
+if __name__ == '__main__':
+    unittest.main()
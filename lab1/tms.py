@@ -0,0 +1,434 @@
+"""
+Truth maintenance for a long-lived set of rules and data.
+
+forward_chain() starts from scratch: once a base fact is taken back,
+there is no telling which of the conclusions drawn from it still
+hold, so the only way to bring the data up to date is to run all of
+the rules again on what is left.  A TruthMaintenance object keeps,
+alongside the data, a Justification for every change a rule made:
+the facts its bindings matched, the facts its NOT conditions needed
+to be absent, and what it added and deleted.  Updating the base data
+then only touches what depends on the update:
+
+ - When a fact leaves the data, every justification that matched it
+   is withdrawn.  What those added is taken out too (unless it is
+   base data), along with everything that depends on that in turn;
+   base facts that only they had deleted come back.
+
+ - When a fact comes into the data, the justifications that needed
+   it to be absent are withdrawn in the same way.
+
+ - Then the rules that the facts taken out or brought back could
+   make fire again -- and only those -- are re-run, just as
+   forward_chain() would run them, so that whatever still follows
+   by some other route is derived again.
+
+Like forward_chain(), the rules only draw conclusions: deleting a
+fact with a DELETE clause doesn't take back what was already derived
+from it, and neither does a rule's conclusion contradicting a NOT.
+For rules without NOT or DELETE, the data always comes out the same
+as forward_chain(rules, base data).  With them, the data is still
+left as forward_chain() leaves it, with no rule that would change it
+-- and, as with forward_chain(), rules that keep deleting facts that
+other rules add back may never get there.
+"""
+
+from production import AND, OR, NOT, RuleExpression, join, populate
+from utils import AIStringVars, compile_pattern
+from factstore import FactStore
+from planner import bound_vars, order, plan, estimator
+
+try:
+    set()
+except NameError:
+    from sets import Set as set, ImmutableSet as frozenset
+
+
+class Justification(object):
+    """
+    A record of a rule firing: rules[rule] fired on 'bindings', which
+    matched 'facts' and no fact matching one of the patterns in
+    'absent', and added the facts in 'added' and deleted those in
+    'deleted'.
+    """
+    def __init__(self, rule, bindings, facts, absent, added, deleted):
+        self.rule = rule
+        self.bindings = bindings
+        self.facts = facts
+        self.absent = absent
+        self.added = added
+        self.deleted = deleted
+        self.live = True
+
+    def __repr__(self):
+        return 'Justification(%r, %r, %r, %r, %r, %r)' % (
+            self.rule, dict(self.bindings), self.facts, self.absent,
+            self.added, self.deleted)
+
+
+def support(condition, bindings, present):
+    """
+    The facts and the NOT patterns that 'condition' used to find
+    'bindings', as a pair of lists, or None if it couldn't have.
+    'present(fact)' tells whether a fact was in the data then.
+    """
+    if isinstance(condition, str):
+        try:
+            fact = populate(condition, bindings)
+        except KeyError:
+            return None
+        if present(fact):
+            return [fact], []
+        return None
+    elif isinstance(condition, NOT):
+        # The same pattern NOT.test_matches looks for
+        try:
+            pattern = populate(condition[0], bindings)
+        except KeyError:
+            pattern = condition[0]
+        return [], _strings(pattern)
+    elif isinstance(condition, AND):
+        facts, absent = [], []
+        for part in condition:
+            found = support(part, bindings, present)
+            if found is None: return None
+            facts.extend(found[0])
+            absent.extend(found[1])
+        return facts, absent
+    elif isinstance(condition, OR):
+        for part in condition:
+            found = support(part, bindings, present)
+            if found is not None: return found
+        return None
+    raise ValueError("Don't know how to support a %s" % type(condition))
+
+def _strings(condition):
+    if isinstance(condition, str):
+        return [condition]
+    result = []
+    for part in condition:
+        result.extend(_strings(part))
+    return result
+
+def _patterns(condition, negated=False):
+    # The patterns in a condition, with whether each one is under a NOT
+    if isinstance(condition, str):
+        return [(condition, negated)]
+    negated = negated or isinstance(condition, NOT)
+    result = []
+    for part in condition:
+        result.extend(_patterns(part, negated))
+    return result
+
+def _seedable(condition):
+    """
+    Whether binding some of the variables of 'condition' ahead of
+    time can't change what its NOT conditions test: True unless one
+    of its own NOTs comes before the conditions that bind all of its
+    variables.  (Nested ANDs and ORs ignore the bindings so far.)
+    """
+    if isinstance(condition, NOT):
+        return False
+    if not isinstance(condition, AND):
+        return True
+    bound = set()
+    for part in condition:
+        if isinstance(part, NOT):
+            for pattern in _strings(part):
+                if not set(AIStringVars(pattern)) <= bound:
+                    return False
+        else:
+            bound |= bound_vars(part)
+    return True
+
+def _seed(pattern, fact, variables):
+    """
+    The bindings of 'variables' that make 'pattern' (an AIPattern)
+    equal to 'fact', or None if there aren't any.  When there is no
+    telling which bindings, the answer is {}, which any binding
+    agrees with.
+    """
+    bindings = pattern.match(fact)
+    if bindings is None or pattern.length is None:
+        # Without single-word values, there may be more than one way
+        # to match it
+        return bindings and {}
+    return dict([(var, bindings[var]) for var in bindings
+                 if var in variables])
+
+
+class _Triggers(object):
+    """
+    Which rules might act differently once a fact comes into or
+    leaves the data -- those with a condition it matches (or, under a
+    NOT, stops matching), and those that add or delete facts like it
+    -- and what bindings could make them do so.
+    """
+    def __init__(self, rules):
+        self.entering = []
+        self.leaving = []
+        for index, rule in enumerate(rules):
+            condition = rule.antecedent()
+            if _seedable(condition):
+                variables = bound_vars(condition)
+            else:
+                variables = set()
+            for pattern, negated in _patterns(condition):
+                if negated:
+                    self.leaving.append((compile_pattern(pattern), index,
+                                         set()))
+                else:
+                    self.entering.append((compile_pattern(pattern), index,
+                                          variables))
+            for pattern in rule.consequent():
+                self.leaving.append((compile_pattern(pattern), index,
+                                     variables))
+            for pattern in rule.delete_clause():
+                self.entering.append((compile_pattern(pattern), index,
+                                      variables))
+
+    def rules(self, entered, left, result=None):
+        """
+        Add to 'result' (a dictionary, which is returned) the index of
+        each rule that the facts in 'entered' and 'left' could make
+        fire, with a list of the bindings that its new bindings must
+        agree with; [{}] if that could be any of them.
+        """
+        if result is None: result = {}
+        for facts, triggers in ((entered, self.entering),
+                                (left, self.leaving)):
+            for pattern, index, variables in triggers:
+                if result.get(index) == [{}]: continue
+                for fact in facts:
+                    seed = _seed(pattern, fact, variables)
+                    if seed == {}:
+                        result[index] = [{}]
+                        break
+                    elif seed is not None:
+                        result.setdefault(index, []).append(seed)
+        return result
+
+
+class TruthMaintenance(object):
+    """
+    The data that 'rules' derive from a set of base facts, kept up
+    to date as base facts are added and retracted.  It supports 'in',
+    len() and iteration over the data, like a FactStore.
+    """
+    def __init__(self, rules, data=()):
+        self.rules = list(rules)
+        self.store = FactStore(data)
+        self.base = set(self.store)
+        self._triggers = _Triggers(self.rules)
+        # fact -> the live justifications that added it, deleted it,
+        # matched it and needed it to be absent.  Patterns with
+        # variables in them, which a NOT leaves unfilled when it is
+        # tested without some of its variables bound, are in _open.
+        self._added_by = {}
+        self._deleted_by = {}
+        self._used_by = {}
+        self._absent = {}
+        self._open = set()
+        self._run(dict([(index, [{}])
+                        for index in range(len(self.rules))]), {})
+
+    def __contains__(self, fact):
+        return fact in self.store
+
+    def __len__(self):
+        return len(self.store)
+
+    def __iter__(self):
+        return iter(self.store)
+
+    def __repr__(self):
+        return 'TruthMaintenance(%r, %r)' % (self.rules,
+                                             tuple(sorted(self.base)))
+
+    def as_tuple(self):
+        return self.store.as_tuple()
+
+    def why(self, fact):
+        """The live justifications that added 'fact' to the data."""
+        return list(self._added_by.get(fact, ()))
+
+    def add(self, fact):
+        """Add a base fact; see update()."""
+        return self.update([fact], ())
+
+    def retract(self, fact):
+        """Retract a base fact; see update()."""
+        return self.update((), [fact])
+
+    def update(self, added=(), retracted=()):
+        """
+        Add the facts in 'added' to the base data and take those in
+        'retracted' out of it, then bring the rest of the data up to
+        date.  Retracting a fact that was derived rather than given
+        does nothing.  Returns the facts that came into the data and
+        the facts that left it, as two sorted lists.
+        """
+        store = self.store
+        # Whether each fact that changed was in the data beforehand
+        before = {}
+        withdrawn, entered, left = [], set(), set()
+        for fact in retracted:
+            if fact not in self.base: continue
+            self.base.discard(fact)
+            withdrawn.extend(self._used_by.get(fact, ()))
+            if store.remove(fact):
+                before.setdefault(fact, True)
+                left.add(fact)
+                # It might also have been derived, so let it be
+                # derived again from scratch
+                withdrawn.extend(self._added_by.get(fact, ()))
+        for fact in added:
+            self.base.add(fact)
+            if store.add(fact):
+                before.setdefault(fact, False)
+                entered.add(fact)
+                withdrawn.extend(self._blocked(fact))
+        self._withdraw(withdrawn, entered, left, before)
+        self._run(self._triggers.rules(entered, left), before)
+        changed = [fact for fact in before if before[fact] != (fact in store)]
+        return (sorted([fact for fact in changed if fact in store]),
+                sorted([fact for fact in changed if fact not in store]))
+
+    def _withdraw(self, withdrawn, entered, left, before):
+        """
+        Withdraw the justifications in 'withdrawn', and then those
+        that depended on them, adding the facts that come into the
+        data to 'entered' and those that leave it to 'left', and
+        recording in 'before' whether they were there to begin with.
+        """
+        store = self.store
+        while withdrawn:
+            restore = []
+            while withdrawn:
+                justification = withdrawn.pop()
+                if not justification.live: continue
+                justification.live = False
+                self._forget(justification)
+                for fact in justification.added:
+                    if fact in self.base or not store.remove(fact):
+                        continue
+                    before.setdefault(fact, True)
+                    left.add(fact)
+                    # Take out everything it supported, including
+                    # its other justifications, which will be found
+                    # again if they still hold
+                    withdrawn.extend(self._added_by.get(fact, ()))
+                    withdrawn.extend(self._used_by.get(fact, ()))
+                restore.extend(justification.deleted)
+            for fact in restore:
+                if fact in self._deleted_by or fact in store:
+                    continue
+                if fact in self.base:
+                    store.add(fact)
+                    before.setdefault(fact, False)
+                    entered.add(fact)
+                    withdrawn.extend(self._blocked(fact))
+                else:
+                    # Whatever derived it can now derive it again
+                    left.add(fact)
+
+    def _blocked(self, fact):
+        """The live justifications that needed 'fact' to be absent."""
+        result = list(self._absent.get(fact, ()))
+        for pattern in self._open:
+            if compile_pattern(pattern).match(fact) is not None:
+                result.extend(self._absent[pattern])
+        return result
+
+    def _record(self, justification):
+        for fact in justification.added:
+            self._added_by.setdefault(fact, set()).add(justification)
+        for fact in justification.deleted:
+            self._deleted_by.setdefault(fact, set()).add(justification)
+        for fact in justification.facts:
+            self._used_by.setdefault(fact, set()).add(justification)
+        for pattern in justification.absent:
+            self._absent.setdefault(pattern, set()).add(justification)
+            if AIStringVars(pattern):
+                self._open.add(pattern)
+
+    def _forget(self, justification):
+        for index, facts in ((self._added_by, justification.added),
+                             (self._deleted_by, justification.deleted),
+                             (self._used_by, justification.facts),
+                             (self._absent, justification.absent)):
+            for fact in facts:
+                justifications = index.get(fact)
+                if justifications is None: continue
+                justifications.discard(justification)
+                if not justifications:
+                    del index[fact]
+                    self._open.discard(fact)
+
+    def _run(self, dirty, before):
+        """
+        Forward chain, as the naive engine does, but only trying the
+        rules in 'dirty' (a dictionary from the index of a rule to the
+        bindings to start matching it from, as _Triggers.rules()
+        makes) and those that the changes they make could make fire.
+        'before' records whether each fact changed was in the data
+        beforehand.
+        """
+        while dirty:
+            for index in sorted(dirty):
+                entered, left = self._fire(index, dirty.pop(index), before)
+                if entered or left:
+                    self._triggers.rules(entered, left, dirty)
+                    break
+
+    def _fire(self, index, seeds, before):
+        """
+        Fire rules[index] on all of its bindings that agree with one
+        of 'seeds', recording why, and return the facts that came
+        into the data and those that left it.
+        """
+        rule, store = self.rules[index], self.store
+        condition = rule.antecedent()
+        bindings = self._bindings(plan(condition, store), seeds)
+        # The bindings were all found before anything changed
+        fired = {}
+        def present(fact):
+            if fact in fired: return fired[fact]
+            return fact in store
+        for k, added, deleted in rule.carry_out(
+                store, zip(bindings, rule.effects(bindings)), fired):
+            found = support(condition, k, present) or ([], [])
+            self._record(Justification(index, k, found[0], found[1],
+                                       added, deleted))
+        entered, left = set(), set()
+        for fact in fired:
+            before.setdefault(fact, fired[fact])
+            if fired[fact] and fact not in store: left.add(fact)
+            elif not fired[fact] and fact in store: entered.add(fact)
+        return entered, left
+
+    def _bindings(self, condition, seeds):
+        store = self.store
+        if seeds == [{}]:
+            return list(RuleExpression().test_term_matches(condition,
+                                                           store))
+        if isinstance(condition, AND):
+            conditions = list(condition)
+        else:
+            conditions = [condition]
+        # Each seed binds the variables of the pattern it came from,
+        # so the ones from the same pattern share a join order
+        orders = {}
+        bindings, seen = [], set()
+        for seed in seeds:
+            variables = frozenset(seed)
+            if variables not in orders:
+                orders[variables] = order(conditions, estimator(store),
+                                          variables)[0]
+            ordered = orders[variables]
+            for k in join(ordered, [store] * len(ordered), seed):
+                key = tuple(sorted(k.items()))
+                if key not in seen:
+                    seen.add(key)
+                    bindings.append(k)
+        return bindings
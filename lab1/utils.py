@@ -1,4 +1,8 @@
-from collections import MutableMapping
+try:
+    from collections.abc import MutableMapping
+except ImportError:
+    from collections import MutableMapping
+from functools import lru_cache
 import re
 
 class ClobberedDictKey(Exception):
@@ -36,7 +40,7 @@ class NoClobberDict(MutableMapping):
         return self._dict.__iter__()
 
     def __len__(self):
-        return MutableMapping.__len__(self)
+        return len(self._dict)
 
     def iteritems(self):
         return self._dict.iteritems()
@@ -44,11 +48,22 @@ class NoClobberDict(MutableMapping):
     def keys(self):
         return self._dict.keys()
 
+    def __repr__(self):
+        return 'NoClobberDict(%r)' % (self._dict,)
+
 # A regular expression for finding variables.
 AIRegex = re.compile(r'\(\?(\S+)\)')
 
 def AIStringToRegex(AIStr):
-    return AIRegex.sub( r'(?P<\1>\S+)', AIStr )+'$'
+    # A variable that comes up again has to match the same text again
+    seen = set()
+    def group(variable):
+        name = variable.group(1)
+        if name in seen:
+            return '(?P=%s)' % name
+        seen.add(name)
+        return '(?P<%s>\\S+)' % name
+    return AIRegex.sub( group, AIStr )+'$'
 
 def AIStringToPyTemplate(AIStr):
     return AIRegex.sub( r'%(\1)s', AIStr )
@@ -58,3 +73,200 @@ def AIStringVars(AIStr):
     # it is probably the most explicit and robust
     return set([ AIRegex.sub(r'\1', x) for x in AIRegex.findall(AIStr) ])
 
+# Characters that mean something in a regular expression.  A literal
+# piece of a template that contains none of them can be tested with
+# plain string comparisons.
+_RegexSpecials = re.compile(r'[.^$*+?{}\[\]\\|()]')
+
+def is_plain(literal):
+    """Whether 'literal' has no characters special to a regex."""
+    return _RegexSpecials.search(literal) is None
+
+class AIPattern(object):
+    """
+    A template such as 'parent (?x) (?y)', compiled once so that it
+    can be matched against many facts and filled in with many sets
+    of bindings.  Use compile_pattern() to get one.
+
+    'variables' lists the template's variables in the order they
+    appear.  'prefix' and 'suffix' are the literal text before the
+    first and after the last variable (the whole template if it has
+    none), or None when that text isn't plain; they let match()
+    reject most facts without running the regular expression.
+
+    If the template is a plain run of single-space separated words,
+    each either a variable or literal text, 'length' is its number of
+    words, 'constants' lists its (position, word) literals and
+    'slots' its (position, variable) variables; FactStore uses them
+    to match facts word by word.  Otherwise 'length' is None.
+    """
+    def __init__(self, template):
+        self.template = template
+        self.variables = tuple(AIRegex.findall(template))
+        # Compiled on first use
+        self.regex = None
+        self.py_template = AIStringToPyTemplate(template)
+
+        pieces = AIRegex.split(template)
+        prefix, suffix = pieces[0], pieces[-1]
+        self.prefix = is_plain(prefix) and prefix or None
+        self.suffix = is_plain(suffix) and suffix or None
+
+        self.length, self.constants, self.slots = None, (), ()
+        if ' '.join(template.split()) != template: return
+        constants, slots = [], []
+        words = template.split(' ')
+        for position, word in enumerate(words):
+            variable = AIRegex.match(word)
+            if variable and variable.end() == len(word):
+                slots.append((position, variable.group(1)))
+            elif '(?' not in word and is_plain(word):
+                constants.append((position, word))
+            else:
+                return
+        if len(set(self.variables)) == len(self.variables) == len(slots):
+            self.length = len(words)
+            self.constants, self.slots = tuple(constants), tuple(slots)
+
+    def match(self, AIStr):
+        """
+        Return the bindings that make this template equal to 'AIStr',
+        or None if there are none, exactly like production.match().
+        """
+        if self.prefix and not AIStr.startswith(self.prefix):
+            return None
+        # '$' also matches just before a trailing newline
+        if (self.suffix and not AIStr.endswith(self.suffix) and
+            not AIStr.endswith(self.suffix + '\n')):
+            return None
+        if self.regex is None:
+            self.regex = re.compile(AIStringToRegex(self.template))
+        m = self.regex.match(AIStr)
+        if m is None: return None
+        return m.groupdict()
+
+    def fill(self, values_dict):
+        """Replace this template's variables with their values."""
+        return self.py_template % values_dict
+
+    def __repr__(self):
+        return 'AIPattern(%r)' % self.template
+
+@lru_cache(maxsize=4096)
+def compile_pattern(AIStr):
+    """
+    Return the AIPattern for a template.  Patterns are kept in a
+    bounded least-recently-used cache, so every rule that uses the
+    same template shares one compiled pattern.
+    """
+    return AIPattern(AIStr)
+
+
+
+class VariableTable(object):
+    """
+    Numbers the variables of a rule, so that a set of bindings can be
+    kept as a slot array: a tuple with one value per variable, in
+    number order, and None for the variables that aren't bound yet.
+
+    Slot arrays are never changed in place.  Binding more variables
+    makes a new one (see unify), so a set of bindings can be shared
+    by every match that extends it instead of being copied for each
+    of them, as NoClobberDict bindings are.
+    """
+    def __init__(self, variables=()):
+        self.names = []
+        self.numbers = {}
+        self._slots = {}
+        for variable in variables:
+            self.number(variable)
+
+    def number(self, variable):
+        """The number of a variable, giving it the next one if it's new."""
+        if variable not in self.numbers:
+            self.numbers[variable] = len(self.names)
+            self.names.append(variable)
+        return self.numbers[variable]
+
+    def __len__(self):
+        return len(self.names)
+
+    def empty(self):
+        """A slot array with nothing bound."""
+        return (None,) * len(self.names)
+
+    def slots(self, pattern):
+        """
+        The (position, number) of each variable of a word-matchable
+        AIPattern: where its value is found in a fact's words, and
+        which slot it goes in.
+        """
+        template = pattern.template
+        if template not in self._slots:
+            self._slots[template] = tuple([(position, self.number(var))
+                                           for (position, var)
+                                           in pattern.slots])
+        return self._slots[template]
+
+    def as_dict(self, values):
+        """The bindings in a slot array, as a NoClobberDict."""
+        bindings = NoClobberDict()
+        bindings._dict = dict([(self.names[number], value)
+                               for number, value in enumerate(values)
+                               if value is not None])
+        return bindings
+
+    def unify(self, values, bindings):
+        """
+        Add the bindings in a dictionary to a slot array.  Return the
+        new slot array, or None if they give a variable a different
+        value than it already has.
+        """
+        new = None
+        for variable, value in bindings.items():
+            number = self.number(variable)
+            if number >= len(values):
+                values = values + (None,) * (number + 1 - len(values))
+            old = values[number]
+            if old is None:
+                if new is None: new = list(values)
+                new[number] = value
+            elif old != value:
+                return None
+        if new is None: return values
+        return tuple(new)
+
+def unify(values, slots, words):
+    """
+    Bind the (position, number) slots of a pattern to the words of a
+    fact, in a slot array.  Return the new slot array -- the same one
+    if nothing new was bound -- or None if a slot is already bound to
+    a different word.  Nothing is allocated unless the match succeeds.
+    """
+    new = None
+    for position, number in slots:
+        old = values[number]
+        if old is None:
+            if new is None: new = list(values)
+            new[number] = words[position]
+        elif old != words[position]:
+            return None
+    if new is None: return values
+    return tuple(new)
+
+def merge(values, other):
+    """
+    Combine two slot arrays from the same VariableTable, or return
+    None if they bind a variable to different values.
+    """
+    new = None
+    for number, value in enumerate(other):
+        if value is None: continue
+        old = values[number]
+        if old is None:
+            if new is None: new = list(values)
+            new[number] = value
+        elif old != value:
+            return None
+    if new is None: return values
+    return tuple(new)
@@ -0,0 +1,100 @@
+# Fall 2012 6.034 Lab 2: Search
+#
+# Checking heuristics without searching.
+#
+# A heuristic is admissible for a goal if it never says a node is
+# further from the goal than it is, and consistent if no two nodes'
+# heuristic values differ by more than the distance between them.
+# Both can be found out from shortest distances alone:
+#
+#  - admissibility takes the distance from every node to the goal,
+#    which one run of Dijkstra's algorithm from the goal gives, rather
+#    than an A* search from every node;
+#  - consistency only has to be checked across each edge: if
+#    |h(u) - h(v)| <= length(u, v) for every edge, then adding it up
+#    along a shortest path gives |h(u) - h(v)| <= distance(u, v) for
+#    every pair of nodes, and the other way around.
+#
+# The length of the edge between two nodes is that of graph.get_edge(),
+# as in path_length().  A node that can't reach the goal at all is
+# infinitely far from it, so any heuristic value is admissible there.
+#
+# A DistanceMatrix keeps the distances it has worked out, so checking
+# several heuristics on the same graph only runs Dijkstra's algorithm
+# once per goal.  It doesn't notice edges added to the graph after it
+# was made.
+
+from heapq import heappush, heappop
+
+
+def shortest_distances(graph, source):
+    """
+    The length of the shortest path from 'source' to each node that
+    can be reached from it, as a dictionary, found with Dijkstra's
+    algorithm.
+    """
+    distances = {}
+    agenda = [(0, source)]
+    while agenda:
+        distance, node = heappop(agenda)
+        if node in distances: continue
+        distances[node] = distance
+        for neighbour in graph.get_connected_nodes(node):
+            if neighbour not in distances:
+                length = graph.get_edge(node, neighbour).length
+                heappush(agenda, (distance + length, neighbour))
+    return distances
+
+
+class DistanceMatrix:
+    """
+    Shortest distances between the nodes of a graph, worked out one
+    source at a time as they are asked for, and kept.
+    """
+    def __init__(self, graph):
+        self.graph = graph
+        self.rows = {}
+
+    def row(self, source):
+        """The distances from 'source', as from shortest_distances()."""
+        if source not in self.rows:
+            self.rows[source] = shortest_distances(self.graph, source)
+        return self.rows[source]
+
+    def distance(self, start, end):
+        """The distance from 'start' to 'end', or None if there's no path."""
+        return self.row(end).get(start)
+
+
+def inadmissible_nodes(graph, goal, distances=None):
+    """
+    The nodes whose heuristic value for 'goal' is more than their
+    distance to it.  'distances' is a DistanceMatrix to use.
+    """
+    if distances is None:
+        to_goal = shortest_distances(graph, goal)
+    else:
+        to_goal = distances.row(goal)
+    return [node for node in graph.nodes
+            if node in to_goal and
+            graph.get_heuristic(node, goal) > to_goal[node]]
+
+def inconsistent_edges(graph, goal):
+    """
+    The edges across which the heuristic values for 'goal' differ by
+    more than the edge's length.
+    """
+    heuristic = dict([(node, graph.get_heuristic(node, goal))
+                      for node in graph.nodes])
+    result = []
+    for edge in graph.edges:
+        length = graph.get_edge(edge.node1, edge.node2).length
+        if abs(heuristic[edge.node1] - heuristic[edge.node2]) > length:
+            result.append(edge)
+    return result
+
+def is_admissible(graph, goal, distances=None):
+    return not inadmissible_nodes(graph, goal, distances)
+
+def is_consistent(graph, goal):
+    return not inconsistent_edges(graph, goal)
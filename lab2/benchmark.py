@@ -0,0 +1,596 @@
+# Timing runs for the Graph in search.py and the searches in lab2.py.
+#
+# Run 'python benchmark.py' from this directory.  The graphs are
+# generated grids, big enough that how Graph finds a node's
+# neighbours and the edge between two nodes shows up.
+
+import gc
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+from search import Graph, Edge
+from csrgraph import CSRGraph
+from lab2 import path_length, a_star, bfs, dfs, hill_climbing
+from lab2 import branch_and_bound
+from lab2 import bidirectional_bfs, bidirectional_a_star
+import graphs
+from graphs import GRAPH1
+from analysis import DistanceMatrix, is_admissible, is_consistent
+from landmarks import Landmarks
+from contraction import ContractionHierarchy
+
+
+def grid_edges(rows, columns, seed=6034):
+    """
+    The edges of a rows x columns grid of nodes named 'r,c', each
+    joined to the ones below and beside it by an edge of random
+    length 1-9, as (node1, node2, length) tuples.
+    """
+    rng = random.Random(seed)
+    for row in range(rows):
+        for column in range(columns):
+            node = "%d,%d" % (row, column)
+            if row + 1 < rows:
+                yield (node, "%d,%d" % (row + 1, column), rng.randint(1, 9))
+            if column + 1 < columns:
+                yield (node, "%d,%d" % (row, column + 1), rng.randint(1, 9))
+
+def grid_graph(rows, columns, seed=6034):
+    """A Graph of the grid of grid_edges()."""
+    graph = Graph(nodes=["%d,%d" % (row, column) for row in range(rows)
+                         for column in range(columns)])
+    for node1, node2, length in grid_edges(rows, columns, seed):
+        graph.add_edge(node1, node2, length)
+    return graph
+
+def csr_grid_graph(rows, columns, seed=6034):
+    """A CSRGraph of the grid of grid_edges()."""
+    return CSRGraph(grid_edges(rows, columns, seed),
+                    ["%d,%d" % (row, column) for row in range(rows)
+                     for column in range(columns)])
+
+
+def timed(fn, *args, **kwargs):
+    start = time.time()
+    result = fn(*args, **kwargs)
+    return result, time.time() - start
+
+
+def _scan_connected_nodes(graph, node):
+    # How Graph.get_connected_nodes used to work: two scans of the
+    # edges and a sort
+    result = [x.node2 for x in graph.edges if x.node1 == node]
+    result += [x.node1 for x in graph.edges if x.node2 == node]
+    return sorted(result)
+
+def _scan_edge(graph, node1, node2):
+    # How Graph.get_edge used to work: a scan of the edges
+    for edge in graph.edges:
+        if ((edge.node1, edge.node2) == (node1, node2) or
+            (edge.node2, edge.node1) == (node1, node2)):
+            return edge
+    return None
+
+
+def bench_grid(rows=250, columns=400, sample=20):
+    """
+    Neighbour and edge lookups on a rows x columns grid: every node
+    and every edge through the Graph's indexes, and a sample of them
+    by scanning the edge list, as Graph used to.
+    """
+    graph, build_time = timed(grid_graph, rows, columns)
+    print("Graph on a %dx%d grid: %d nodes, %d edges, built in %.3f s"
+          % (rows, columns, len(graph.nodes), len(graph.edges),
+             build_time))
+    rng = random.Random(6034)
+    nodes = rng.sample(graph.nodes, sample)
+    edges = rng.sample(graph.edges, sample)
+
+    print("%-24s %10s %14s %14s" % ("", "calls", "indexed (us)",
+                                    "scan (us)"))
+    def per_call(fn, items):
+        ignored, elapsed = timed(lambda: [fn(*item) for item in items])
+        return 1e6 * elapsed / len(items)
+    pairs = [(edge.node2, edge.node1) for edge in graph.edges]
+    for label, lookup, scan, all_items, items in (
+            ("get_connected_nodes", graph.get_connected_nodes,
+             _scan_connected_nodes, [(node,) for node in graph.nodes],
+             [(graph, node) for node in nodes]),
+            ("get_edge", graph.get_edge, _scan_edge, pairs,
+             [(graph, edge.node2, edge.node1) for edge in edges])):
+        print("%-24s %10d %14.2f %14.2f" %
+              (label, len(all_items), per_call(lookup, all_items),
+               per_call(scan, items)))
+
+    path = (["0,%d" % column for column in range(columns)] +
+            ["%d,%d" % (row, columns - 1) for row in range(1, rows)])
+    length, elapsed = timed(path_length, graph, path)
+    print("path_length of a %d-node path along the edge: %.3f s"
+          % (len(path), elapsed))
+    path, elapsed = timed(a_star, graph, "0,0", "3,3")
+    print("a_star from a corner, 6 steps: %.3f s" % elapsed)
+    print()
+
+
+def _sorted_a_star(graph, start, goal):
+    # How a_star used to work: re-sorting the whole agenda by
+    # path_length() on every expansion
+    agenda = [[start]]
+    extended_set = set()
+    while agenda:
+        considered_path = agenda.pop(0)
+        extended_set.add(considered_path[-1])
+        if considered_path[-1] == goal: return considered_path
+        agenda = sorted([considered_path + [node] for node in
+                         graph.get_connected_nodes(considered_path[-1])
+                         if node not in considered_path and
+                         node not in extended_set] + agenda,
+                        key=lambda x: (path_length(graph, x) +
+                                       graph.get_heuristic(x[-1], goal)))
+    return []
+
+def set_grid_heuristic(graph, goal):
+    """Use the grid distance to 'goal' as the heuristic: edges are >= 1."""
+    goal_row, goal_column = map(int, goal.split(','))
+    for node in graph.nodes:
+        row, column = map(int, node.split(','))
+        graph.set_heuristic(node, goal,
+                            abs(goal_row - row) + abs(goal_column - column))
+
+def bench_a_star(sizes=(20, 30, 100, 300, 700), sorted_limit=30):
+    """
+    a_star from one corner of a grid to the other, and from the
+    middle of the first row to the middle of the last, with the
+    agenda in a heap and, up to 'sorted_limit' rows, re-sorted on
+    every expansion as it used to be.
+    """
+    print("a_star across an NxN grid: heap vs. sorted agenda")
+    print("%6s %10s %8s %12s %12s" % ("N", "edges", "path", "heap (s)",
+                                       "sorted (s)"))
+    for size in sizes:
+        graph = grid_graph(size, size)
+        for start, goal in (("0,0", "%d,%d" % (size - 1, size - 1)),
+                            ("0,%d" % (size // 2),
+                             "%d,%d" % (size - 1, size // 2))):
+            set_grid_heuristic(graph, goal)
+            path, heap_time = timed(a_star, graph, start, goal)
+            if size > sorted_limit:
+                sorted_time = "-"
+            else:
+                old, elapsed = timed(_sorted_a_star, graph, start, goal)
+                assert old == path, "different path from the heap"
+                sorted_time = "%.3f" % elapsed
+            print("%6d %10d %8d %12.3f %12s" % (size, len(graph.edges),
+                                                 len(path), heap_time,
+                                                 sorted_time))
+    print()
+
+
+def scaled_graph(graph, copies):
+    """
+    'copies' copies of 'graph', with the nodes of copy i named
+    'name#i', joined into a binary tree: the first node (in sorted
+    order) of copy i is joined to the last node of copy (i - 1) // 2
+    by an edge of length 1.  Returns the graph, the first node of
+    the first copy and the last node of the last copy.
+    """
+    nodes = sorted(graph.nodes)
+    scaled = Graph(nodes=["%s#%d" % (node, copy) for copy in range(copies)
+                          for node in nodes])
+    for copy in range(copies):
+        for edge in graph.edges:
+            scaled.add_edge("%s#%d" % (edge.node1, copy),
+                            "%s#%d" % (edge.node2, copy), edge.length,
+                            "%s#%d" % (edge.name, copy))
+        if copy > 0:
+            scaled.add_edge("%s#%d" % (nodes[-1], (copy - 1) // 2),
+                            "%s#%d" % (nodes[0], copy), 1,
+                            "link#%d" % copy)
+    return scaled, "%s#0" % nodes[0], "%s#%d" % (nodes[-1], copies - 1)
+
+def _copying_bfs(graph, start, goal):
+    # bfs with an extended set, copying the queue on every expansion
+    # as bfs used to
+    queue = [[start]]
+    extended_set = set()
+    while queue:
+        considered_path = queue[0]
+        queue = queue[1:]
+        if considered_path[-1] == goal: return considered_path
+        if considered_path[-1] in extended_set: continue
+        extended_set.add(considered_path[-1])
+        queue = queue + [considered_path + [node] for node in
+                         graph.get_connected_nodes(considered_path[-1])
+                         if node not in extended_set]
+    return []
+
+def bench_scaling(copies=(10, 100, 1000, 3000, 10000), copying_limit=3000):
+    """
+    bfs, dfs and hill_climbing with an extended set, on trees of
+    copies of GRAPH1, from the root to the last leaf, and bfs copying
+    its queue on every expansion as it used to (up to 'copying_limit'
+    copies).  The time per node should stay about flat as the graph
+    grows.
+    """
+    print("Searches with an extended set on trees of GRAPH1s, "
+          "in us per node")
+    searches = (("bfs", bfs), ("dfs", dfs), ("hill_climbing",
+                                               hill_climbing))
+    print("%8s %8s" % ("copies", "nodes") +
+          "".join(["%15s" % name for name, search in searches]) +
+          "%15s" % "copying bfs")
+    for count in copies:
+        graph, start, goal = scaled_graph(GRAPH1, count)
+        line = "%8d %8d" % (count, len(graph.nodes))
+        for name, search in searches:
+            path, elapsed = timed(search, graph, start, goal, True)
+            assert path and path[-1] == goal, "no path"
+            line += "%15.2f" % (1e6 * elapsed / len(graph.nodes))
+        if count > copying_limit:
+            line += "%15s" % "-"
+        else:
+            old, elapsed = timed(_copying_bfs, graph, start, goal)
+            assert old == bfs(graph, start, goal, True), "different path"
+            line += "%15.2f" % (1e6 * elapsed / len(graph.nodes))
+        print(line)
+    print()
+
+
+def _searching_is_admissible(graph, goal):
+    # How is_admissible used to work: an A* search from every node
+    for node in graph.nodes:
+        path = a_star(graph, node, goal)
+        if graph.get_heuristic(node, goal) > path_length(graph, path):
+            return False
+    return True
+
+def bench_heuristics(sizes=(10, 30, 100), searching_limit=30,
+                     scales=(0, 0.5, 1, 10)):
+    """
+    is_admissible and is_consistent for the grid distance to the far
+    corner of an NxN grid, and one DistanceMatrix used to check that
+    heuristic scaled by each of 'scales' (edges are 1-9 long, so it
+    is admissible up to 1, and not at 10).  Up to 'searching_limit',
+    also is_admissible by an A* search from every node.
+    """
+    print("Checking heuristics on an NxN grid")
+    print("%6s %8s %14s %14s %14s %14s" % ("N", "nodes", "admissible (s)",
+                                           "consistent (s)", "audit (s)",
+                                           "searching (s)"))
+    for size in sizes:
+        graph = grid_graph(size, size)
+        goal = "%d,%d" % (size - 1, size - 1)
+        set_grid_heuristic(graph, goal)
+        admissible, admissible_time = timed(is_admissible, graph, goal)
+        consistent, consistent_time = timed(is_consistent, graph, goal)
+        assert admissible and consistent
+
+        grid_distance = dict([(node, graph.get_heuristic(node, goal))
+                              for node in graph.nodes])
+        def audit():
+            distances = DistanceMatrix(graph)
+            results = []
+            for scale in scales:
+                for node in graph.nodes:
+                    graph.set_heuristic(node, goal,
+                                        scale * grid_distance[node])
+                results.append(is_admissible(graph, goal, distances))
+            return results
+        results, audit_time = timed(audit)
+        assert results == [scale <= 1 for scale in scales], results
+        for node in graph.nodes:
+            graph.set_heuristic(node, goal, grid_distance[node])
+
+        if size > searching_limit:
+            searching = "-"
+        else:
+            old, elapsed = timed(_searching_is_admissible, graph, goal)
+            assert old == admissible
+            searching = "%.3f" % elapsed
+        print("%6d %8d %14.3f %14.3f %14.3f %14s" %
+              (size, len(graph.nodes), admissible_time, consistent_time,
+               audit_time, searching))
+    print()
+
+
+def _allocated(fn, *args):
+    # The memory still allocated by what fn(*args) returns
+    gc.collect()
+    tracemalloc.start()
+    try:
+        result = fn(*args)
+        gc.collect()
+        size = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    return result, size
+
+def bench_csr(sizes=(100, 300, 700)):
+    """
+    Graph and CSRGraph of an NxN grid: the memory each takes, with the
+    grid distance to the far corner as the heuristic, and a_star
+    across each of them.
+    """
+    print("Graph vs. CSRGraph of an NxN grid")
+    print("%6s %10s %12s %12s %8s %12s %12s" %
+          ("N", "edges", "Graph (MB)", "CSR (MB)", "ratio",
+           "Graph a* (s)", "CSR a* (s)"))
+    for size in sizes:
+        goal = "%d,%d" % (size - 1, size - 1)
+        def build(make):
+            graph = make(size, size)
+            set_grid_heuristic(graph, goal)
+            return graph
+        line = []
+        times = []
+        for make in (grid_graph, csr_grid_graph):
+            graph, allocated = _allocated(build, make)
+            path, elapsed = timed(a_star, graph, "0,0", goal)
+            line.append(allocated)
+            times.append((path, elapsed))
+            del graph
+        assert times[0][0] == times[1][0], "different paths"
+        print("%6d %10d %12.1f %12.1f %8.1f %12.3f %12.3f" %
+              (size, 2 * size * (size - 1), line[0] / 1e6, line[1] / 1e6,
+               float(line[0]) / line[1], times[0][1], times[1][1]))
+    print()
+
+
+def _legacy_validate(graph):
+    # How Graph.validate used to work: membership tests on the node
+    # list, and get_heuristic() for every pair of nodes
+    nodes = list(graph.nodes)
+    for name in nodes:
+        assert isinstance(name, str)
+    assert len(nodes) == len(set(nodes)), "no duplicate nodes"
+    edgenames = [edge.name for edge in graph.edges]
+    assert len(edgenames) == len(set(edgenames)), "no duplicate edges"
+    for edge in graph.edges:
+        assert isinstance(edge.name, str)
+        assert edge.node1 in nodes
+        assert edge.node2 in nodes
+        assert edge.length > 0, "positive edges only today"
+    for start in nodes:
+        for end in nodes:
+            assert graph.get_heuristic(start, end) >= 0
+
+def bench_validation(sizes=(30, 100, 225), legacy_limit=30):
+    """
+    Making a Graph of an NxN grid, with the grid distance to the far
+    corner as the heuristic, with each validation mode; and, up to
+    'legacy_limit', validating it as Graph used to.  Also an a_star
+    search across it made without validation, with validate_async()
+    checking it alongside, until both are done.
+    """
+    print("Graph(edges=..., heuristic=...) of an NxN grid, by validation")
+    print("%6s %8s %10s %10s %10s %10s %12s" %
+          ("N", "nodes", "off (s)", "sample (s)", "full (s)", "legacy (s)",
+           "async (s)"))
+    for size in sizes:
+        nodes = ["%d,%d" % (row, column) for row in range(size)
+                 for column in range(size)]
+        edges = [Edge("e%d" % index, node1, node2, length)
+                 for index, (node1, node2, length)
+                 in enumerate(grid_edges(size, size))]
+        goal = nodes[-1]
+        heuristic = {goal: dict([(node, abs(size - 1 - int(row)) +
+                                  abs(size - 1 - int(column)))
+                                 for node in nodes
+                                 for row, column in [node.split(',')]])}
+        line = "%6d %8d" % (size, len(nodes))
+        for mode in ('off', 'sample', 'full'):
+            graph, elapsed = timed(Graph, list(nodes), None, heuristic,
+                                   list(edges), mode)
+            line += " %10.3f" % elapsed
+        if size > legacy_limit:
+            line += " %10s" % "-"
+        else:
+            ignored, elapsed = timed(_legacy_validate, graph)
+            line += " %10.3f" % elapsed
+        # A search started right away, while the whole graph is
+        # checked in the background
+        start = time.time()
+        future = graph.validate_async()
+        path = a_star(graph, nodes[0], goal)
+        future.result()
+        line += " %12.3f" % (time.time() - start)
+        print(line)
+    print()
+
+
+class _Counting:
+    """A graph that counts how many nodes a search extends."""
+    def __init__(self, graph):
+        self.graph = graph
+        self.extended = 0
+
+    def get_connected_nodes(self, node):
+        self.extended += 1
+        return self.graph.get_connected_nodes(node)
+
+    def __getattr__(self, name):
+        return getattr(self.graph, name)
+
+def _extended(search, graph, start, goal):
+    counting = _Counting(graph)
+    path, elapsed = timed(search, counting, start, goal)
+    return path, counting.extended, elapsed
+
+def bench_bidirectional(sizes=(30, 100, 300)):
+    """
+    Nodes extended by bfs (with an extended set) and a_star, and by
+    bidirectional_bfs and bidirectional_a_star: over every pair of
+    nodes of the graphs in graphs.py, and from corner to corner of
+    NxN grids with the grid distance to both corners as heuristics.
+    """
+    print("Nodes extended (and time) by one- and two-way searches")
+    print("%-14s %8s %18s %18s %18s %18s" %
+          ("graph", "pairs", "bfs", "bidirectional bfs", "a_star",
+           "bidirectional a*"))
+    def row(label, cases):
+        totals = [[0, 0.0] for index in range(4)]
+        for graph, start, goal in cases:
+            results = [_extended(search, graph, start, goal) for search in
+                       (lambda *args: bfs(*args, use_extended_set=True),
+                        bidirectional_bfs, a_star, bidirectional_a_star)]
+            assert len(results[0][0]) == len(results[1][0])
+            if results[2][0]:
+                assert (path_length(graph, results[2][0]) ==
+                        path_length(graph, results[3][0]))
+            for total, (path, extended, elapsed) in zip(totals, results):
+                total[0] += extended
+                total[1] += elapsed
+        print("%-14s %8d" % (label, len(cases)) +
+              "".join([" %9d %7.3fs" % (extended, elapsed)
+                       for extended, elapsed in totals]))
+
+    for name in ('GRAPH1', 'GRAPH2', 'GRAPH3', 'GRAPH4', 'GRAPH5',
+                 'NEWGRAPH1', 'NEWGRAPH2', 'NEWGRAPH4', 'AGRAPH'):
+        graph = getattr(graphs, name)
+        # The paths are only shortest with consistent heuristics, and
+        # bidirectional_a_star uses the start's as well as the goal's
+        ends = [node for node in graph.nodes if is_consistent(graph, node)]
+        row(name, [(graph, start, goal) for goal in ends
+                   for start in ends])
+    for size in sizes:
+        graph = grid_graph(size, size)
+        start, goal = "0,0", "%d,%d" % (size - 1, size - 1)
+        set_grid_heuristic(graph, goal)
+        set_grid_heuristic(graph, start)
+        row("%dx%d grid" % (size, size), [(graph, start, goal)])
+    print()
+
+
+def bench_landmarks(sizes=(50, 100), counts=(1, 4, 8, 16), queries=10):
+    """
+    a_star between random pairs of nodes of NxN grids with no
+    heuristic values, so that it is Dijkstra's algorithm, and with
+    the bounds from different numbers of landmarks; and how long the
+    landmarks take to work out, save and load.
+    """
+    print("a_star with landmark heuristics: %d random queries per grid"
+          % queries)
+    print("%-12s %9s %9s %9s %9s %11s %10s" %
+          ("graph", "landmarks", "build", "save+load", "file", "extended",
+           "a_star"))
+    for size in sizes:
+        graph = grid_graph(size, size)
+        rng = random.Random(size)
+        pairs = [(rng.choice(graph.nodes), rng.choice(graph.nodes))
+                 for index in range(queries)]
+        lengths = None
+        for count in (0,) + tuple(counts):
+            build_time = save_time = file_size = 0
+            if count:
+                landmarks, build_time = timed(Landmarks, graph, count)
+                filename = tempfile.mktemp()
+                start = time.time()
+                landmarks.save(filename)
+                landmarks = Landmarks.load(filename, graph)
+                save_time = time.time() - start
+                file_size = os.path.getsize(filename)
+                os.remove(filename)
+                graph.use_landmarks(landmarks)
+            extended = elapsed = 0
+            found = []
+            for start, goal in pairs:
+                path, count_extended, time_taken = _extended(a_star, graph,
+                                                             start, goal)
+                found.append(path_length(graph, path))
+                extended += count_extended
+                elapsed += time_taken
+            graph.use_landmarks(None)
+            if lengths is None: lengths = found
+            assert found == lengths
+            print("%-12s %9d %8.3fs %8.3fs %8dK %11d %9.3fs" %
+                  ("%dx%d grid" % (size, size), count, build_time,
+                   save_time, file_size // 1024, extended, elapsed))
+    print()
+
+
+def road_graph(count=200000, missing=0.15, seed=6034):
+    """
+    A Graph standing in for a road network of about 'count'
+    junctions: the grid of grid_edges(), with a fraction 'missing'
+    of its streets taken out at random.
+    """
+    size = int(round(count ** 0.5))
+    rng = random.Random(seed)
+    graph = Graph(nodes=["%d,%d" % (row, column) for row in range(size)
+                         for column in range(size)])
+    for node1, node2, length in grid_edges(size, size, seed):
+        if rng.random() >= missing:
+            graph.add_edge(node1, node2, length)
+    return graph
+
+def bench_contraction(count=200000, queries=1000, checked=20):
+    """
+    ContractionHierarchy queries against branch_and_bound on every
+    pair of nodes of the graphs in graphs.py, and on a road_graph() of
+    'count' nodes: how long the hierarchy takes to build and to answer
+    random queries, with bidirectional_a_star (with no heuristic
+    values, so bidirectional Dijkstra) on the first 'checked' of them
+    for comparison -- branch_and_bound would take far too long there.
+    """
+    print("Contraction hierarchies: the same path lengths as "
+          "branch_and_bound")
+    for name in ('GRAPH1', 'GRAPH2', 'GRAPH3', 'GRAPH4', 'GRAPH5',
+                 'NEWGRAPH1', 'NEWGRAPH2', 'NEWGRAPH4', 'AGRAPH'):
+        graph = getattr(graphs, name)
+        hierarchy = ContractionHierarchy(graph)
+        same = 0
+        for start in graph.nodes:
+            for goal in graph.nodes:
+                expected = branch_and_bound(graph, start, goal)
+                path = hierarchy.shortest_path(start, goal)
+                assert bool(path) == bool(expected)
+                if path:
+                    assert (path_length(graph, path) ==
+                            path_length(graph, expected))
+                if path == expected: same += 1
+        print("%-10s %4d pairs, %4d with the same path" %
+              (name, len(graph.nodes) ** 2, same))
+
+    graph, build_time = timed(road_graph, count)
+    print("Road graph: %d nodes, %d edges, built in %.3f s" %
+          (len(graph.nodes), len(graph.edges), build_time))
+    hierarchy, preprocess_time = timed(ContractionHierarchy, graph)
+    print("Contracted in %.3f s, adding %d shortcuts" %
+          (preprocess_time, hierarchy.shortcut_count))
+    rng = random.Random(count)
+    pairs = [(rng.choice(graph.nodes), rng.choice(graph.nodes))
+             for index in range(queries)]
+    paths, query_time = timed(lambda: [hierarchy.shortest_path(start, goal)
+                                       for start, goal in pairs])
+    distances, distance_time = timed(lambda: [hierarchy.distance(start, goal)
+                                              for start, goal in pairs])
+    found = [(path, timed(bidirectional_a_star, graph, start, goal))
+             for path, (start, goal) in zip(paths, pairs[:checked])]
+    search_time = 0
+    for path, (expected, elapsed) in found:
+        assert bool(path) == bool(expected)
+        if path:
+            assert path_length(graph, path) == path_length(graph, expected)
+        search_time += elapsed
+    print("%-38s %10.3f ms" % ("ContractionHierarchy.shortest_path",
+                               1000 * query_time / queries))
+    print("%-38s %10.3f ms" % ("ContractionHierarchy.distance",
+                               1000 * distance_time / queries))
+    print("%-38s %10.3f ms" % ("bidirectional_a_star",
+                               1000 * search_time / len(found)))
+    print()
+
+
+if __name__ == '__main__':
+    bench_grid()
+    bench_a_star()
+    bench_scaling()
+    bench_heuristics()
+    bench_csr()
+    bench_validation()
+    bench_bidirectional()
+    bench_landmarks()
+    bench_contraction()
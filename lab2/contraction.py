@@ -0,0 +1,233 @@
+# Fall 2012 6.034 Lab 2: Search
+#
+# Contraction hierarchies: answering many shortest-path questions
+# about one graph that doesn't change.
+#
+# The nodes are "contracted" one at a time, least important first.
+# Contracting a node takes it out of the graph, and wherever the
+# shortest way between two of its neighbours went through it, joins
+# them with a shortcut edge of the same length, which remembers the
+# node it goes through.  Before adding one, a short search (a
+# "witness" search) looks for some other way between them that is no
+# longer; only if there isn't one is the shortcut needed.
+#
+# How important a node is, is guessed from how many shortcuts taking
+# it out would add, less the edges it would take away, plus how many
+# of its neighbours are gone already (so that the contracted nodes
+# are spread out over the graph).  The guesses change as the graph
+# does, so each is worked out again when its node comes up, and the
+# node is put back if it is no longer the least important.
+#
+# Every shortest path then goes up the order of contraction and back
+# down again, so a query only has to search upwards, from both ends,
+# along the edges and shortcuts to nodes contracted later.  That
+# search reaches few nodes, however big the graph is.  The path it
+# finds is unpacked by replacing each shortcut with the two edges it
+# stands for, over and over, until only edges of the graph are left.
+#
+# The length of the edge between two nodes is that of graph.get_edge(),
+# as in path_length(), so the paths are as long as those that
+# branch_and_bound and a_star find.  When several paths are equally
+# short, the one returned may not be the same one they return.  The
+# hierarchy doesn't notice edges added to the graph after it was made.
+
+from heapq import heapify, heappush, heappop
+
+from search import _pair
+
+INFINITY = float('inf')
+
+
+class ContractionHierarchy:
+    """
+    A contraction hierarchy of a Graph (or CSRGraph), for
+    shortest_path() and distance() queries.  Witness searches stop
+    after 'settle_limit' nodes: a lower limit makes the hierarchy
+    faster to build, but adds shortcuts that aren't needed.
+    """
+    def __init__(self, graph, settle_limit=50):
+        self.nodes = list(graph.nodes)
+        self.settle_limit = settle_limit
+        self._numbers = dict([(node, number) for number, node
+                              in enumerate(self.nodes)])
+        # The graph as it is while it's contracted: for each node
+        # still in it, the length of the edge to each neighbour
+        adjacency = []
+        for node in self.nodes:
+            lengths = {}
+            for neighbour in graph.get_connected_nodes(node):
+                # No shortest path goes round a loop
+                if neighbour == node: continue
+                lengths[self._numbers[neighbour]] = \
+                    graph.get_edge(node, neighbour).length
+            adjacency.append(lengths)
+        # For each node, the edges and shortcuts to the nodes that were
+        # contracted after it, as (node, length) pairs
+        self._upward = [None] * len(self.nodes)
+        # For each shortcut, the node it goes through, by _pair()
+        self._middle = {}
+        self._contract(adjacency)
+        self.shortcut_count = len(self._middle)
+
+    def _contract(self, adjacency):
+        removed_neighbours = [0] * len(self.nodes)
+        agenda = [(self._priority(adjacency, removed_neighbours, node,
+                                  self._shortcuts(adjacency, node)), node)
+                  for node in range(len(self.nodes))]
+        heapify(agenda)
+        while agenda:
+            priority, node = heappop(agenda)
+            # Make sure it is still the least important
+            shortcuts = self._shortcuts(adjacency, node)
+            priority = self._priority(adjacency, removed_neighbours, node,
+                                      shortcuts)
+            if agenda and priority > agenda[0][0]:
+                heappush(agenda, (priority, node))
+                continue
+            neighbours = adjacency[node]
+            for node1, node2, length in shortcuts:
+                if length < adjacency[node1].get(node2, INFINITY):
+                    adjacency[node1][node2] = length
+                    adjacency[node2][node1] = length
+                    self._middle[_pair(node1, node2)] = node
+            self._upward[node] = list(neighbours.items())
+            for neighbour in neighbours:
+                del adjacency[neighbour][node]
+                removed_neighbours[neighbour] += 1
+            adjacency[node] = None
+
+    def _priority(self, adjacency, removed_neighbours, node, shortcuts):
+        # The edge difference, plus the neighbours already contracted
+        return (len(shortcuts) - len(adjacency[node]) +
+                removed_neighbours[node])
+
+    def _shortcuts(self, adjacency, node):
+        """
+        The shortcuts that contracting 'node' would need, as
+        (node1, node2, length) triples.
+        """
+        neighbours = list(adjacency[node].items())
+        result = []
+        for index, (node1, length1) in enumerate(neighbours):
+            through = dict([(node2, length1 + length2) for node2, length2
+                            in neighbours[index + 1:]])
+            if not through: continue
+            witnesses = self._witness_search(adjacency, node1, node,
+                                             through)
+            for node2, length in through.items():
+                if witnesses.get(node2, INFINITY) > length:
+                    result.append((node1, node2, length))
+        return result
+
+    def _witness_search(self, adjacency, source, avoid, targets):
+        # Dijkstra's algorithm from 'source', without going through
+        # 'avoid', until it has found all of 'targets' or gone further
+        # than any of their lengths, or given up after settle_limit
+        # nodes.  The distances are upper bounds.
+        limit = max(targets.values())
+        left = len(targets)
+        distances = {source: 0}
+        agenda = [(0, source)]
+        settled = 0
+        while agenda and settled < self.settle_limit:
+            distance, node = heappop(agenda)
+            if distance > distances[node]: continue
+            if distance > limit: break
+            if node in targets:
+                left -= 1
+                if left == 0: break
+            settled += 1
+            for neighbour, length in adjacency[node].items():
+                if neighbour == avoid: continue
+                new_distance = distance + length
+                if new_distance < distances.get(neighbour, INFINITY):
+                    distances[neighbour] = new_distance
+                    heappush(agenda, (new_distance, neighbour))
+        return distances
+
+    def _search(self, start, goal):
+        # Dijkstra's algorithm upwards from both ends.  Returns the
+        # length of the shortest path, the node where the two
+        # searches meet on it, and how each side reached each node.
+        distances = ({start: 0}, {goal: 0})
+        parents = ({start: None}, {goal: None})
+        agendas = ([(0, start)], [(0, goal)])
+        best_length, meeting = INFINITY, None
+        while True:
+            # A side is done when the rest of its paths are too long
+            for side in (0, 1):
+                if agendas[side] and agendas[side][0][0] >= best_length:
+                    agendas[side][:] = []
+            if not agendas[0] and not agendas[1]: break
+            if not agendas[0]:
+                side = 1
+            elif not agendas[1]:
+                side = 0
+            else:
+                side = agendas[1][0][0] < agendas[0][0][0] and 1 or 0
+            distance, node = heappop(agendas[side])
+            if distance > distances[side][node]: continue
+            if node in distances[1 - side]:
+                total = distance + distances[1 - side][node]
+                if total < best_length:
+                    best_length, meeting = total, node
+            for neighbour, length in self._upward[node]:
+                new_distance = distance + length
+                if new_distance < distances[side].get(neighbour, INFINITY):
+                    distances[side][neighbour] = new_distance
+                    parents[side][neighbour] = node
+                    heappush(agendas[side], (new_distance, neighbour))
+        return best_length, meeting, parents
+
+    def _unpack(self, node1, node2, path):
+        # Add the nodes after node1 on the way to node2 to 'path',
+        # going through what each shortcut stands for
+        stack = [(node1, node2)]
+        while stack:
+            node1, node2 = stack.pop()
+            middle = self._middle.get(_pair(node1, node2))
+            if middle is None:
+                path.append(node2)
+            else:
+                # The second half goes under the first
+                stack.append((middle, node2))
+                stack.append((node1, middle))
+
+    def shortest_path(self, start, goal):
+        """
+        A shortest path from 'start' to 'goal', as a list of nodes, or
+        [] if there is none -- as branch_and_bound would return.
+        """
+        if start == goal: return [start]
+        start, goal = self._numbers[start], self._numbers[goal]
+        best_length, meeting, parents = self._search(start, goal)
+        if meeting is None: return []
+        # The nodes the search went through, up from the start to
+        # the meeting and down again to the goal
+        hops = []
+        node = meeting
+        while node is not None:
+            hops.append(node)
+            node = parents[0][node]
+        hops.reverse()
+        node = parents[1][meeting]
+        while node is not None:
+            hops.append(node)
+            node = parents[1][node]
+        path = [start]
+        for node1, node2 in zip(hops, hops[1:]):
+            self._unpack(node1, node2, path)
+        return [self.nodes[node] for node in path]
+
+    def distance(self, start, goal):
+        """The length of a shortest path, or None if there is none."""
+        if start == goal: return 0
+        best_length, meeting, parents = self._search(self._numbers[start],
+                                                     self._numbers[goal])
+        if meeting is None: return None
+        return best_length
+
+    def __str__(self):
+        return "ContractionHierarchy: %d nodes, %d shortcuts" % (
+            len(self.nodes), self.shortcut_count)
+
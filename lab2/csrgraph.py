@@ -0,0 +1,280 @@
+# Fall 2012 6.034 Lab 2: Search
+#
+# A compact, read-only alternative to search.Graph for big graphs.
+#
+# A CSRGraph keeps its edges in compressed sparse row form: the nodes
+# are numbered in sorted order of their names, and the neighbours of
+# node i are targets[offsets[i]:offsets[i + 1]], sorted, with the
+# number of the edge that leads to each in slot_edges.  Each edge's
+# two ends and length are kept in arrays too, so there is no Python
+# object per edge or per neighbour, only a few machine words -- and
+# an Edge is only made when get_edge() is asked for one.  Edge names
+# are only kept if they aren't the ones add_edge() would have given.
+# A node's number is found by bisecting the sorted list of names, so
+# there is no dictionary of them either.  'nodes' is that list.
+#
+# The heuristic values for each goal are kept in an array with a
+# value for every node when most of the nodes have one, and in a
+# dictionary from node numbers otherwise.  As for a Graph, goals with
+# no values get them from landmarks given with use_landmarks().
+#
+# It answers get_connected_nodes(), get_edge(), get_heuristic() and
+# the rest of the questions that the searches in lab2.py ask a Graph,
+# with the same answers, so they work on either.
+
+from array import array
+from bisect import bisect_left
+
+from search import Edge
+
+
+def _index_array(size, length=0):
+    """An array of 'length' zeros, for numbers up to 'size'."""
+    if size < 2**31:
+        return array('i', [0]) * length
+    return array('q', [0]) * length
+
+def _number_array(values):
+    """An array of 'values': of integers if they all are."""
+    for value in values:
+        if not isinstance(value, int):
+            return array('d', values)
+    if values and (min(values) < -2**31 or max(values) >= 2**31):
+        return array('q', values)
+    return array('i', values)
+
+
+class CSRGraph:
+    """
+    A graph with undirected, named edges, like search.Graph, stored
+    in compressed sparse row form.  'edges' is a sequence of
+    (node1, node2, length) or (node1, node2, length, name) tuples,
+    or of Edges; 'nodes' lists any nodes that aren't on an edge, and
+    'heuristic' is as for Graph: heuristic[goal][start].  Unlike a
+    Graph's, its 'nodes' are in sorted order.
+    """
+    def __init__(self, edges=(), nodes=None, heuristic=None):
+        edges = [self._edge_tuple(edge) for edge in edges]
+        names = list(nodes or ())
+        assert len(set(names)) == len(names), "no duplicate nodes"
+        names = set(names)
+        for edge in edges:
+            names.add(edge[0])
+            names.add(edge[1])
+        for name in names:
+            assert isinstance(name, str), str(type(name))+": "+str(name)
+        # The names of the nodes, by number
+        self.nodes = sorted(names)
+        del names
+        self._build(edges)
+        self.landmarks = None
+        self._heuristic = {}
+        for goal, values in (heuristic or {}).items():
+            for start, value in values.items():
+                # As in Graph, values for nodes that aren't in the
+                # graph can never be asked for
+                if self._find(start) is not None and \
+                   self._find(goal) is not None:
+                    self.set_heuristic(start, goal, value)
+
+    @classmethod
+    def from_graph(cls, graph):
+        """A CSRGraph with the nodes, edges and heuristic of a Graph."""
+        return cls(graph.edges, graph.nodes, graph.heuristic)
+
+    def _edge_tuple(self, edge):
+        if isinstance(edge, Edge):
+            return (edge.node1, edge.node2, edge.length, edge.name)
+        if len(edge) == 3:
+            return tuple(edge) + (None,)
+        return tuple(edge)
+
+    def _build(self, edges):
+        count = len(self.nodes)
+        numbers = dict([(name, number) for number, name
+                        in enumerate(self.nodes)])
+        self._node1 = _index_array(count)
+        self._node2 = _index_array(count)
+        self._node1.extend([numbers[edge[0]] for edge in edges])
+        self._node2.extend([numbers[edge[1]] for edge in edges])
+        del numbers
+        lengths = [edge[2] for edge in edges]
+        for length in lengths:
+            assert length > 0, "positive edges only today"
+        self._lengths = _number_array(lengths)
+        del lengths
+
+        names = [edge[3] for edge in edges]
+        self._edge_names = None
+        for index, edge in enumerate(edges):
+            if names[index] is None:
+                names[index] = "%s %s" % (edge[0], edge[1])
+            elif names[index] != "%s %s" % (edge[0], edge[1]):
+                self._edge_names = names
+        for name in names:
+            assert isinstance(name, str), type(name)
+        del names
+
+        # Each edge is a way out of both of its ends.  First bucket
+        # the ways out by where they lead, and then go through the
+        # buckets in order, so that each node's ways out come out
+        # sorted by where they lead, and in edge order after that.
+        degrees = [0] * (count + 1)
+        for node in self._node1: degrees[node + 1] += 1
+        for node in self._node2: degrees[node + 1] += 1
+        offsets = _index_array(2 * len(edges))
+        total = 0
+        for degree in degrees:
+            total += degree
+            offsets.append(total)
+        del degrees
+
+        fill = list(offsets[:-1])
+        sources = _index_array(count, total)
+        by_target = _index_array(len(edges), total)
+        for edge, (node1, node2) in enumerate(zip(self._node1,
+                                                  self._node2)):
+            for source, target in ((node1, node2), (node2, node1)):
+                sources[fill[target]] = source
+                by_target[fill[target]] = edge
+                fill[target] += 1
+
+        fill = list(offsets[:-1])
+        self._targets = _index_array(count, total)
+        self._slot_edges = _index_array(len(edges), total)
+        for target in range(count):
+            for slot in range(offsets[target], offsets[target + 1]):
+                source = sources[slot]
+                self._targets[fill[source]] = target
+                self._slot_edges[fill[source]] = by_target[slot]
+                fill[source] += 1
+        self._offsets = offsets
+
+    def _find(self, node):
+        """The number of 'node', or None if it isn't in the graph."""
+        number = bisect_left(self.nodes, node)
+        if number < len(self.nodes) and self.nodes[number] == node:
+            return number
+        return None
+
+    def _number(self, node):
+        # As _find, but for a node that has to be there
+        nodes = self.nodes
+        number = bisect_left(nodes, node)
+        if number == len(nodes) or nodes[number] != node:
+            # Raised even with assertions off, unlike Graph's, since
+            # otherwise we'd answer for some other node
+            raise AssertionError("No node "+str(node)+" in graph "+str(self))
+        return number
+
+    def _edge(self, index):
+        node1 = self.nodes[self._node1[index]]
+        node2 = self.nodes[self._node2[index]]
+        if self._edge_names is None:
+            name = "%s %s" % (node1, node2)
+        else:
+            name = self._edge_names[index]
+        return Edge(name, node1, node2, self._lengths[index])
+
+    @property
+    def edges(self):
+        """The edges, as a sequence of Edges made as they are asked for."""
+        return _EdgeList(self)
+
+    def get_connected_nodes(self, node):
+        """
+        gets a list of all node id values connected to a given node.
+        'node' should be a node name, not a dictionary.
+        The return value is a list of node names.
+        """
+        number = self._number(node)
+        names = self.nodes
+        return [names[target] for target in
+                self._targets[self._offsets[number]:
+                              self._offsets[number + 1]]]
+
+    def get_edge(self, node1, node2):
+        """
+        returns the first edge between the two nodes, or 'None' if
+        there isn't one.
+        'node1' and 'node2' are names of nodes, not 'NODE' dictionaries.
+        """
+        source, target = self._number(node1), self._number(node2)
+        end = self._offsets[source + 1]
+        slot = bisect_left(self._targets, target, self._offsets[source], end)
+        if slot == end or self._targets[slot] != target:
+            return None
+        return self._edge(self._slot_edges[slot])
+
+    def are_connected(self, node1, node2):
+        return bool( self.get_edge(node1, node2) )
+
+    def get_heuristic(self, start, goal):
+        """ Return the value of the heuristic from the start to the goal"""
+        start_number, goal_number = self._number(start), self._number(goal)
+        values = self._heuristic.get(goal_number)
+        if values is None:
+            if self.landmarks is not None:
+                return self.landmarks.lower_bound(start, goal)
+            return 0
+        if isinstance(values, dict):
+            return values.get(start_number, 0)
+        return values[start_number]
+
+    def set_heuristic(self, start, goal, value):
+        assert value >= 0, "heuristic values can't be negative"
+        start, goal = self._number(start), self._number(goal)
+        values = self._heuristic.setdefault(goal, {})
+        if isinstance(values, dict):
+            values[start] = value
+            # Once most of the nodes have a value, an array is smaller
+            if len(values) * 4 >= len(self.nodes):
+                self._heuristic[goal] = values = self._dense(values)
+            return
+        if values.typecode != 'd' and not isinstance(value, int):
+            self._heuristic[goal] = values = array('d', values)
+        values[start] = value
+
+    def use_landmarks(self, landmarks):
+        """
+        Answer get_heuristic() for goals with no heuristic values from
+        a landmarks.Landmarks for this graph, or not at all if None.
+        """
+        self.landmarks = landmarks
+
+    def _dense(self, values):
+        if [value for value in values.values() if not isinstance(value, int)]:
+            dense = array('d', [0]) * len(self.nodes)
+        else:
+            dense = array('q', [0]) * len(self.nodes)
+        for start, value in values.items():
+            dense[start] = value
+        return dense
+
+    def is_valid_path(self, path):
+        for node1, node2 in zip(path, path[1:]):
+            if not self.are_connected(node1, node2):
+                return False
+        return True
+
+    def __str__(self):
+        return "CSRGraph: %d nodes, %d edges" % (len(self.nodes),
+                                                 len(self._lengths))
+
+
+class _EdgeList:
+    """The edges of a CSRGraph, as a read-only sequence of Edges."""
+    def __init__(self, graph):
+        self.graph = graph
+
+    def __len__(self):
+        return len(self.graph._lengths)
+
+    def __getitem__(self, index):
+        if index < 0: index += len(self)
+        if not 0 <= index < len(self): raise IndexError(index)
+        return self.graph._edge(index)
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self.graph._edge(index)
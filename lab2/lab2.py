@@ -32,60 +32,90 @@ ANSWER6 = False
 
 # Import the Graph data structure from 'search.py'
 # Refer to search.py for documentation
-from search import Graph
+from search import Graph, SearchNode, PathTracker
+from heapq import heappush, heappop
+from collections import deque
+import analysis
+
+## All of the searches keep their agendas as SearchNodes, which point
+## back to the paths they extend, and only build the list of nodes
+## on a path when it reaches the goal.  A PathTracker moves along to
+## each path as it is extended, to tell which nodes are already on it.
+
+## bfs, dfs and hill_climbing take an optional use_extended_set: if
+## it is true, a path is only extended if no path to the same node
+## has been extended before, as in A*, so each node is extended at
+## most once.  Every node on a path has then been extended, so that
+## also keeps the paths from looping.
+## Their agendas are changed in place, never copied: bfs takes paths
+## off the front of a deque and adds them at the back, and dfs and
+## hill_climbing keep their stack with its top at the end of a list.
 
 ## Optional Warm-up: BFS and DFS
 # If you implement these, the offline tester will test them.
 # If you don't, it won't.
 # The online tester will not test them.
 
-def bfs(graph, start, goal):
+def bfs(graph, start, goal, use_extended_set=False):
     if start == goal: return [start]
-    queue = [[start]]
+    queue = deque([SearchNode(start)])
+    extended_set = set()
+    on_path = PathTracker()
     while len(queue) != 0:
-        considered_path = queue[0]
-        queue = queue[1:]
-        if considered_path[-1] == goal: return considered_path
-        connected_nodes = graph.get_connected_nodes(considered_path[-1])
-        queue_addition = [considered_path + [connected_node]
-                          for connected_node in connected_nodes
-                          if not connected_node in considered_path]
-        queue = queue + queue_addition
+        considered_path = queue.popleft()
+        if considered_path.node == goal: return considered_path.path()
+        if use_extended_set:
+            if considered_path.node in extended_set: continue
+            extended_set.add(considered_path.node)
+            visited = extended_set
+        else:
+            on_path.move_to(considered_path)
+            visited = on_path
+        connected_nodes = graph.get_connected_nodes(considered_path.node)
+        queue.extend([considered_path.extend(connected_node)
+                      for connected_node in connected_nodes
+                      if not connected_node in visited])
     return []
 
 ## Once you have completed the breadth-first search,
 ## this part should be very simple to complete.
-def dfs(graph, start, goal):
-    if start == goal: return [start]
-    stack = [[start]]
-    while len(stack) != 0:
-        considered_path = stack[0]
-        stack = stack[1:]
-        if considered_path[-1] == goal: return considered_path
-        connected_nodes = graph.get_connected_nodes(considered_path[-1])
-        stack_addition = [considered_path + [connected_node]
-                          for connected_node in connected_nodes
-                          if not connected_node in considered_path]
-        stack = stack_addition + stack
-    return []
+def dfs(graph, start, goal, use_extended_set=False):
+    return _depth_first(graph, start, goal, None, use_extended_set)
 
 ## Now we're going to add some heuristics into the search.  
 ## Remember that hill-climbing is a modified version of depth-first search.
 ## Search direction should be towards lower heuristic values to the goal.
-def hill_climbing(graph, start, goal):
+def hill_climbing(graph, start, goal, use_extended_set=False):
+    return _depth_first(graph, start, goal,
+                        lambda x: graph.get_heuristic(x.node, goal),
+                        use_extended_set)
+
+## Depth-first search, trying the nodes connected to a path in sorted
+## order, or in order of 'key' if it is given.
+def _depth_first(graph, start, goal, key, use_extended_set):
     if start == goal: return [start]
-    stack = [[start]]
+    stack = [SearchNode(start)]
+    extended_set = set()
+    on_path = PathTracker()
     while len(stack) != 0:
-        considered_path = stack[0]
-        stack = stack[1:]
-        if considered_path[-1] == goal: return considered_path
-        connected_nodes = graph.get_connected_nodes(considered_path[-1])
-        stack_addition = [considered_path + [connected_node]
+        considered_path = stack.pop()
+        if considered_path.node == goal: return considered_path.path()
+        if use_extended_set:
+            if considered_path.node in extended_set: continue
+            extended_set.add(considered_path.node)
+            visited = extended_set
+        else:
+            on_path.move_to(considered_path)
+            visited = on_path
+        connected_nodes = graph.get_connected_nodes(considered_path.node)
+        stack_addition = [considered_path.extend(connected_node)
                           for connected_node in connected_nodes
-                          if not connected_node in considered_path]
-        stack = sorted(stack_addition,
-                       key = lambda x: graph.get_heuristic(x[-1], goal),
-                       reverse = False) + stack
+                          if not connected_node in visited]
+        if key is not None:
+            stack_addition.sort(key = key)
+        # The first of them goes on top
+        stack_addition.reverse()
+        stack.extend(stack_addition)
     return []
 
 ## Now we're going to implement beam search, a variation on BFS
@@ -95,23 +125,25 @@ def hill_climbing(graph, start, goal):
 ## graph get_heuristic function, with lower values being better values.
 def beam_search(graph, start, goal, beam_width):
     if start == goal: return [start]
-    queue = [[start]]
+    queue = [SearchNode(start)]
+    on_path = PathTracker()
     while len(queue) != 0:
-        extending_length = len(queue[0])
+        extending_depth = queue[0].depth
         extending_paths = [path for path in queue
-                           if len(path) == extending_length]
+                           if path.depth == extending_depth]
         queue = queue[len(extending_paths):]
         queue_add_candidates = []
         for path in extending_paths:
-            if path[-1] == goal: return path
+            if path.node == goal: return path.path()
+            on_path.move_to(path)
             next_nodes = [node for node in
-                          graph.get_connected_nodes(path[-1])
-                          if not node in path]
+                          graph.get_connected_nodes(path.node)
+                          if not node in on_path]
             queue_add_candidates = (queue_add_candidates +
-                                    [path + [node]
+                                    [path.extend(node)
                                      for node in next_nodes])
         sort_candidates = sorted(queue_add_candidates,
-                                 key = lambda x:graph.get_heuristic(x[-1],
+                                 key = lambda x:graph.get_heuristic(x.node,
                                                                     goal),
                                  reverse = False)
         q_add = sort_candidates[:beam_width]
@@ -135,67 +167,155 @@ def path_length(graph, node_names):
         prev_node = node
     return total_length
 
-def branch_and_bound(graph, start, goal):
+## Both keep their agenda in a heap, ordered by the length of each
+## path (plus, for A*, the heuristic value of its last node).  The
+## length of a path is kept with it as its cost, so extending it only
+## adds the length of one edge.  Ties go to the paths added most
+## recently, in the order their nodes were found -- the order that
+## sorting the new paths in ahead of the old ones would give -- so
+## the heap entries are (priority, -expansion, position, path).
+def optimal_search(graph, start, goal, use_heuristic, use_extended_set):
     if start == goal: return [start]
-    agenda = [[start]]
+    agenda = [(0, 0, 0, SearchNode(start))]
+    extended_set = set()
+    on_path = PathTracker()
+    expansions = 0
     while len(agenda) != 0:
-        considered_path = agenda[0]
-        agenda = agenda[1:]
-        if considered_path[-1] == goal: return considered_path
-        connected_nodes = graph.get_connected_nodes(considered_path[-1])
-        agenda_addition = [considered_path + [connected_node]
-                           for connected_node in connected_nodes
-                           if not connected_node in considered_path]
-        agenda = sorted(agenda_addition + agenda,
-                        key = lambda x: path_length(graph, x),
-                        reverse = False)
+        considered_path = heappop(agenda)[3]
+        last_node = considered_path.node
+        extended_set.add(last_node)
+        if last_node == goal: return considered_path.path()
+        if not use_extended_set: on_path.move_to(considered_path)
+        expansions += 1
+        connected_nodes = graph.get_connected_nodes(last_node)
+        for position, connected_node in enumerate(connected_nodes):
+            if use_extended_set:
+                # Every node on the path has been extended already
+                if connected_node in extended_set: continue
+            elif connected_node in on_path: continue
+            new_path = considered_path.extend(
+                connected_node, graph.get_edge(last_node,
+                                               connected_node).length)
+            priority = new_path.cost
+            if use_heuristic:
+                priority += graph.get_heuristic(connected_node, goal)
+            heappush(agenda, (priority, -expansions, position, new_path))
     return []
 
+def branch_and_bound(graph, start, goal):
+    return optimal_search(graph, start, goal, False, False)
+
 def a_star(graph, start, goal):
+    return optimal_search(graph, start, goal, True, True)
+
+## Bidirectional search works from both ends at once, until the two
+## searches meet in the middle: on a big graph each of them only has
+## to go about half as far, which leaves far fewer nodes to extend.
+## The edges go both ways, so searching back from the goal is the
+## same as searching forward from it.  Each search remembers how it
+## reached each node it has seen, and the path is put together from
+## the two halves when they meet.
+def _join_paths(meeting, forward_parents, backward_parents):
+    path = []
+    node = meeting
+    while node is not None:
+        path.append(node)
+        node = forward_parents[node]
+    path.reverse()
+    node = backward_parents[meeting]
+    while node is not None:
+        path.append(node)
+        node = backward_parents[node]
+    return path
+
+## bidirectional_bfs extends a whole level of one side at a time, the
+## side with fewer paths to extend.  The first time it finds a node
+## the other side has seen, no shorter path can have been missed:
+## every node within the levels done so far on both sides has been
+## seen, so a shorter path would have met before.  So, like bfs, it
+## returns a path with the fewest nodes.
+def bidirectional_bfs(graph, start, goal):
     if start == goal: return [start]
-    agenda = [[start]]
-    extended_set = set()
-    while len(agenda) != 0:
-        considered_path = agenda[0]
-        extended_set.add(considered_path[-1])
-        agenda = agenda[1:]
-        if considered_path[-1] == goal: return considered_path
-        connected_nodes = graph.get_connected_nodes(considered_path[-1])
-        agenda_addition = [considered_path + [connected_node]
-                           for connected_node in connected_nodes
-                           if ((not connected_node in considered_path)
-                               and (not connected_node in extended_set))]
-        agenda = sorted(agenda_addition + agenda,
-                        key = lambda x: (path_length(graph, x) +
-                                         graph.get_heuristic(x[-1], goal)),
-                        reverse = False)
+    parents = ({start: None}, {goal: None})
+    frontiers = ([start], [goal])
+    while frontiers[0] and frontiers[1]:
+        side = len(frontiers[1]) < len(frontiers[0]) and 1 or 0
+        seen, other = parents[side], parents[1 - side]
+        next_frontier = []
+        for node in frontiers[side]:
+            for connected_node in graph.get_connected_nodes(node):
+                if connected_node in seen: continue
+                seen[connected_node] = node
+                if connected_node in other:
+                    return _join_paths(connected_node, parents[0],
+                                       parents[1])
+                next_frontier.append(connected_node)
+        frontiers = side and (frontiers[0], next_frontier) or \
+                    (next_frontier, frontiers[1])
     return []
 
+## bidirectional_a_star runs A* forward towards the goal and backward
+## towards the start, with the average of the two heuristics,
+##     p(node) = (h(node, goal) - h(node, start)) / 2,
+## added to the forward path lengths and taken off the backward ones.
+## That gives both sides the same (consistent) view of which edges
+## lead the right way, so they can stop as soon as the two paths
+## they would extend next together are at least as long as the best
+## path found through a node both have reached.  If the heuristics
+## for both the goal and the start are consistent, that path is as
+## short as the one a_star finds.  h(node, start) is 0 unless the
+## graph has values for the start.
+def bidirectional_a_star(graph, start, goal):
+    if start == goal: return [start]
+    potentials = {}
+    def potential(node):
+        if node not in potentials:
+            potentials[node] = (graph.get_heuristic(node, goal) -
+                                graph.get_heuristic(node, start)) / 2.0
+        return potentials[node]
+
+    # For each side: its agenda of (priority, length, node), the
+    # shortest length to each node so far, and how it got there
+    agendas = ([(potential(start), 0, start)], [(-potential(goal), 0, goal)])
+    lengths = ({start: 0}, {goal: 0})
+    parents = ({start: None}, {goal: None})
+    best_length, meeting = None, None
+    while agendas[0] and agendas[1]:
+        if (best_length is not None and
+            agendas[0][0][0] + agendas[1][0][0] >= best_length):
+            break
+        side = agendas[1][0][0] < agendas[0][0][0] and 1 or 0
+        sign = side and -1 or 1
+        priority, length, node = heappop(agendas[side])
+        if length > lengths[side][node]: continue
+        for connected_node in graph.get_connected_nodes(node):
+            new_length = length + graph.get_edge(node, connected_node).length
+            old_length = lengths[side].get(connected_node)
+            if old_length is not None and old_length <= new_length: continue
+            lengths[side][connected_node] = new_length
+            parents[side][connected_node] = node
+            heappush(agendas[side],
+                     (new_length + sign * potential(connected_node),
+                      new_length, connected_node))
+            if connected_node in lengths[1 - side]:
+                total = new_length + lengths[1 - side][connected_node]
+                if best_length is None or total < best_length:
+                    best_length, meeting = total, connected_node
+    if meeting is None: return []
+    return _join_paths(meeting, parents[0], parents[1])
+
 ## It's useful to determine if a graph has a consistent and admissible
 ## heuristic.  You've seen graphs with heuristics that are
 ## admissible, but not consistent.  Have you seen any graphs that are
 ## consistent, but not admissible?
 
+## Both are worked out from shortest distances, without searching:
+## see analysis.py.
 def is_admissible(graph, goal):
-    for node in graph.nodes:
-        heuristic = graph.get_heuristic(node, goal)
-        distance = path_length(graph, a_star(graph, node, goal))
-        if heuristic > distance: return False
-    return True
+    return analysis.is_admissible(graph, goal)
 
 def is_consistent(graph, goal):
-    pairs = [(n1, n2) for n1 in graph.nodes for n2 in graph.nodes]
-    checked_pairs = []
-    for pair in pairs:
-        if set(pair) in checked_pairs: continue
-        checked_pairs.append(set(pair))
-        h1 = graph.get_heuristic(pair[0], goal)
-        h2 = graph.get_heuristic(pair[1], goal)
-        distance = path_length(graph, branch_and_bound(graph,
-                                                       pair[0],
-                                                       pair[1]))
-        if abs(h1 - h2) > distance: return False
-    return True
+    return analysis.is_consistent(graph, goal)
 
 HOW_MANY_HOURS_THIS_PSET_TOOK = ' '
 WHAT_I_FOUND_INTERESTING = ' '
@@ -0,0 +1,174 @@
+# Fall 2012 6.034 Lab 2: Search
+#
+# Landmark heuristics: lower bounds on the distance between any two
+# nodes, worked out ahead of time (the "ALT" heuristic, for A*,
+# Landmarks and the Triangle inequality).
+#
+# A few nodes are picked as landmarks, and the distance from each of
+# them to every node is found once, with Dijkstra's algorithm (see
+# analysis.py).  The edges go both ways, so for any node n, goal g and
+# landmark L the triangle inequality gives
+#
+#     distance(n, g) >= |distance(L, n) - distance(L, g)|
+#
+# and the largest of these over all the landmarks is a heuristic for
+# any goal at all.  It is admissible, since each of them is a lower
+# bound, and consistent, since none of them changes by more than an
+# edge's length across the edge, so neither does the largest.
+#
+# The bounds are best for goals that lie behind a landmark, as seen
+# from the node, so the landmarks are picked far apart: each one is
+# the node furthest from all of those picked so far (starting from
+# the first node of the graph).  A node that can't be reached from
+# any of them is furthest of all, so each part of a graph that isn't
+# connected to the rest gets a landmark before any part gets two.
+#
+# A Graph or CSRGraph given Landmarks with use_landmarks() answers
+# get_heuristic() from them for every goal that it has no heuristic
+# values of its own for.  Landmarks can be saved to a file with save()
+# and read back with Landmarks.load(), which checks that the graph
+# has the same nodes and number of edges; it can't tell if the edges
+# have changed in some other way.  The file is JSON, with null for
+# the distance to a node that a landmark can't reach.
+
+from array import array
+import json
+
+from analysis import shortest_distances
+
+INFINITY = float('inf')
+# The version of the file format that save() writes
+VERSION = 1
+
+
+class Landmarks:
+    """
+    The distances from 'count' landmarks to every node of a graph, or
+    from the landmarks listed in 'landmarks', for lower_bound().
+    """
+    def __init__(self, graph, count=8, landmarks=None):
+        self.nodes = list(graph.nodes)
+        self.edge_count = len(graph.edges)
+        self._numbers = dict([(node, number) for number, node
+                              in enumerate(self.nodes)])
+        self.landmarks = []
+        self._distances = []
+        if landmarks is not None:
+            for landmark in landmarks:
+                self._add(graph, landmark)
+        elif self.nodes:
+            # How far each node is from the nearest landmark so far
+            nearest = self._row(graph, self.nodes[0])
+            for index in range(min(count, len(self.nodes))):
+                landmark = self.nodes[self._furthest(nearest)]
+                row = self._add(graph, landmark)
+                for number, distance in enumerate(row):
+                    if distance < nearest[number]:
+                        nearest[number] = distance
+        self._goal = None
+
+    def _row(self, graph, source):
+        distances = shortest_distances(graph, source)
+        row = array('d', [INFINITY]) * len(self.nodes)
+        for node, distance in distances.items():
+            row[self._numbers[node]] = distance
+        return row
+
+    def _add(self, graph, landmark):
+        row = self._row(graph, landmark)
+        self.landmarks.append(landmark)
+        self._distances.append(row)
+        return row
+
+    def _furthest(self, nearest):
+        # The first node furthest from the landmarks, skipping the
+        # landmarks themselves in case every node is one
+        best, best_distance = None, -1
+        chosen = set(self.landmarks)
+        for number, distance in enumerate(nearest):
+            if distance > best_distance and self.nodes[number] not in chosen:
+                best, best_distance = number, distance
+        return best
+
+    def distance(self, landmark, node):
+        """The distance from a landmark to 'node', or None if there's no path."""
+        row = self._distances[self.landmarks.index(landmark)]
+        distance = row[self._numbers[node]]
+        if distance == INFINITY: return None
+        return distance
+
+    def lower_bound(self, start, goal):
+        """
+        The largest of the landmarks' lower bounds on the distance
+        from 'start' to 'goal'.  Landmarks that can't reach both of
+        them give no bound.
+        """
+        number = self._numbers[start]
+        best = 0
+        for row, goal_distance in self._goal_distances(goal):
+            distance = row[number]
+            if distance != INFINITY:
+                bound = abs(distance - goal_distance)
+                if bound > best: best = bound
+        return best
+
+    def _goal_distances(self, goal):
+        # A search asks about the same goal over and over, so keep the
+        # distances to the last one, from each landmark that reaches it
+        if self._goal is None or self._goal[0] != goal:
+            number = self._numbers[goal]
+            self._goal = (goal, [(row, row[number]) for row in self._distances
+                                 if row[number] != INFINITY])
+        return self._goal[1]
+
+    def save(self, filename):
+        """Write the landmarks and their distances to 'filename'."""
+        state = {'version': VERSION, 'nodes': self.nodes,
+                 'edge_count': self.edge_count,
+                 'landmarks': self.landmarks,
+                 'distances': [[None if distance == INFINITY else distance
+                                for distance in row]
+                               for row in self._distances]}
+        with open(filename, 'w') as file:
+            json.dump(state, file, allow_nan=False)
+
+    @classmethod
+    def load(cls, filename, graph):
+        """
+        Read the Landmarks that save() wrote to 'filename', for 'graph'.
+        Raises ValueError if they were made for a different graph, or
+        the file isn't one that save() wrote.
+        """
+        with open(filename) as file:
+            state = json.load(file)
+        try:
+            if state['version'] != VERSION:
+                raise ValueError("Unknown landmarks version %s in %s"
+                                 % (state['version'], filename))
+            nodes, edge_count = state['nodes'], state['edge_count']
+            landmarks = state['landmarks']
+            distances = [array('d', [INFINITY if distance is None
+                                     else distance for distance in row])
+                         for row in state['distances']]
+        except (KeyError, TypeError):
+            raise ValueError("Not a landmarks file: %s" % (filename,))
+        if (len(distances) != len(landmarks) or
+            [row for row in distances if len(row) != len(nodes)]):
+            raise ValueError("Not a landmarks file: %s" % (filename,))
+        if (len(nodes) != len(graph.nodes) or
+            set(nodes) != set(graph.nodes) or
+            edge_count != len(graph.edges)):
+            raise ValueError("Landmarks in %s are for a different graph"
+                             % (filename,))
+        result = cls.__new__(cls)
+        result.nodes = nodes
+        result.edge_count = edge_count
+        result._numbers = dict([(node, number) for number, node
+                                in enumerate(nodes)])
+        result.landmarks = landmarks
+        result._distances = distances
+        result._goal = None
+        return result
+
+    def __str__(self):
+        return "Landmarks: %s" % (self.landmarks,)
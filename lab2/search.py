@@ -1,5 +1,10 @@
 # Fall 2012 6.034 Lab 2: Search
 
+from bisect import insort
+from concurrent.futures import Future
+import random
+import threading
+
 try:
     set()
 except NameError:
@@ -21,10 +26,35 @@ class Edge:
                ' from ' + self.node1 + ' to ' + self.node2 + \
                ' with length ' + str(self.length)
 
+def _pair(node1, node2):
+    """The key of an edge between two nodes, in either direction."""
+    if node2 < node1: return (node2, node1)
+    return (node1, node2)
+
 class Graph:
+    """
+    A graph with undirected, named edges.  Besides the list of its
+    nodes and the list of its edges, a Graph keeps a set of the nodes,
+    the sorted neighbours of each node and the edge between each pair
+    of nodes, so that looking up a node's neighbours takes time in
+    the number of them and looking up an edge takes constant time,
+    rather than a scan of every edge.  add_edge() keeps them up to
+    date; edges added to the list in some other way aren't seen.
+
+    'validation' says how much of the graph to check when it is made:
+    'full' (all of it, with validate()), 'sample' (a random sample,
+    with validate_sample()) or 'off'.  validate_async() checks all of
+    it in the background instead.
+
+    Goals with no heuristic values get them from the graph's
+    'landmarks', if use_landmarks() has given it some (see
+    landmarks.py), and are 0 otherwise.
+    """
     def __init__(self, nodes=None, edgesdict=None, heuristic=None,
-                 edges=None):
+                 edges=None, validation='full'):
         '''specify EITHER edgesdict OR edges'''
+        if validation not in ('full', 'sample', 'off'):
+            raise ValueError("Unknown validation mode: %s" % (validation,))
         if edges:
             self.edges = edges
         elif edgesdict:
@@ -45,22 +75,101 @@ class Graph:
         self.heuristic = heuristic
         if not heuristic:
             self.heuristic = {}
-        self.validate()
+        self.landmarks = None
+        self._index()
+        if validation == 'full':
+            self.validate()
+        elif validation == 'sample':
+            self.validate_sample()
+
+    def _index(self):
+        self._node_set = set(self.nodes)
+        # node -> sorted list of neighbours, once per edge
+        self._adjacent = {}
+        # _pair(node1, node2) -> the first edge between them
+        self._edge_index = {}
+        for edge in self.edges:
+            self._index_edge(edge)
+
+    def _index_edge(self, edge):
+        insort(self._adjacent.setdefault(edge.node1, []), edge.node2)
+        insort(self._adjacent.setdefault(edge.node2, []), edge.node1)
+        self._edge_index.setdefault(_pair(edge.node1, edge.node2), edge)
     
     def validate(self):
-        for name in self.nodes:
-            assert isinstance(name,str), str(type(name))+": "+str(name)
-        assert len(self.nodes) == len(set(self.nodes)), "no duplicate nodes"
-        edgenames = [edge.name for edge in self.edges]
-        assert len(edgenames) == len(set(edgenames)), "no duplicate edges"
-        for edge in self.edges:
-            assert isinstance(edge.name, str), type(edge.name)
-            assert edge.node1 in self.nodes
-            assert edge.node2 in self.nodes
-            assert edge.length > 0, "positive edges only today"
-        for start in self.nodes:
-            for end in self.nodes:
-                assert self.get_heuristic(start,end) >= 0
+        """
+        Check the whole graph, in one pass over each of its nodes, its
+        edges and its heuristic values, raising an AssertionError at
+        the first thing that is wrong.
+        """
+        # Copies, so that the graph can change while this runs in the
+        # background (see validate_async)
+        nodes, edges = list(self.nodes), list(self.edges)
+        for name in nodes:
+            self._check_node(name)
+        assert len(nodes) == len(set(nodes)), "no duplicate nodes"
+        edgenames = set()
+        for edge in edges:
+            self._check_edge(edge)
+            edgenames.add(edge.name)
+        assert len(edgenames) == len(edges), "no duplicate edges"
+        for goal, values in list(self.heuristic.items()):
+            for start, value in list(values.items()):
+                self._check_heuristic(start, goal, value)
+
+    def validate_sample(self, size=1000, seed=None):
+        """
+        Check 'size' random nodes and edges, and the heuristic values
+        of the sampled nodes, as validate() would: a quick check for
+        a big graph.  Duplicate nodes and edges aren't looked for.
+        """
+        rng = random.Random(seed)
+        nodes = self.nodes
+        if len(nodes) > size: nodes = rng.sample(nodes, size)
+        edges = self.edges
+        if len(edges) > size: edges = rng.sample(edges, size)
+        for name in nodes:
+            self._check_node(name)
+        for edge in edges:
+            self._check_edge(edge)
+        for goal, values in list(self.heuristic.items()):
+            for start in nodes:
+                if start in values:
+                    self._check_heuristic(start, goal, values[start])
+
+    def validate_async(self):
+        """
+        Run validate() in a background thread, and return a
+        concurrent.futures.Future for it: its result() is None if the
+        graph is fine, and raises validate()'s AssertionError if not.
+        """
+        future = Future()
+        def run():
+            if not future.set_running_or_notify_cancel(): return
+            try:
+                future.set_result(self.validate())
+            except BaseException as error:
+                future.set_exception(error)
+        thread = threading.Thread(target=run, name="Graph.validate_async")
+        thread.daemon = True
+        thread.start()
+        return future
+
+    def _check_node(self, name):
+        assert isinstance(name,str), str(type(name))+": "+str(name)
+
+    def _check_edge(self, edge):
+        assert isinstance(edge.name, str), type(edge.name)
+        assert edge.node1 in self._node_set
+        assert edge.node2 in self._node_set
+        assert edge.length > 0, "positive edges only today"
+
+    def _check_heuristic(self, start, goal, value):
+        # get_heuristic() is 0 for every pair of nodes not given a
+        # value, and values for nodes that aren't in the graph are
+        # never used
+        if start in self._node_set and goal in self._node_set:
+            assert value >= 0
 
     def get_connected_nodes(self, node):
         """
@@ -68,10 +177,8 @@ class Graph:
         'node' should be a node name, not a dictionary.
         The return value is a list of node names.
         """
-        assert node in self.nodes, "No node "+str(node)+" in graph "+str(self)
-        result = [x.node2 for x in self.edges if x.node1 == node]
-        result += [x.node1 for x in self.edges if x.node2 == node]
-        return sorted(result)
+        assert node in self._node_set, "No node "+str(node)+" in graph "+str(self)
+        return list(self._adjacent.get(node, ()))
 
     def get_edge(self, node1, node2):
         """
@@ -79,14 +186,9 @@ class Graph:
         both connected nodes are part of the edge, or 'None' otherwise.
         'node1' and 'node2' are names of nodes, not 'NODE' dictionaries.
         """
-        assert node1 in self.nodes, "No node "+str(node1)+" in graph "+str(self)
-        assert node2 in self.nodes, "No node "+str(node2)+" in graph "+str(self)
-        node_names = ( node1, node2 )
-        for edge in self.edges:
-            if ((edge.node1, edge.node2) == node_names or 
-                (edge.node2, edge.node1) == node_names):
-                return edge
-        return None
+        assert node1 in self._node_set, "No node "+str(node1)+" in graph "+str(self)
+        assert node2 in self._node_set, "No node "+str(node2)+" in graph "+str(self)
+        return self._edge_index.get(_pair(node1, node2))
 
     def are_connected(self, node1, node2):
         """
@@ -97,13 +199,15 @@ class Graph:
 
     def get_heuristic(self, start, goal):
         """ Return the value of the heuristic from the start to the goal"""
-        assert start in self.nodes, "No node "+str(start)+" in graph "+str(self)
-        assert goal in self.nodes, "No node "+str(goal)+" in graph "+str(self)
+        assert start in self._node_set, "No node "+str(start)+" in graph "+str(self)
+        assert goal in self._node_set, "No node "+str(goal)+" in graph "+str(self)
         if goal in self.heuristic:
             if start in self.heuristic[goal]:
                 return self.heuristic[goal][start]
             else:
                 return 0 # we have checked that everything is positive
+        elif self.landmarks is not None:
+            return self.landmarks.lower_bound(start, goal)
         else: 
             return 0 # we have checked that everything is positive
     
@@ -119,19 +223,100 @@ class Graph:
         return (tally != False)
 
     def add_edge(self, node1, node2, length, name=None):
-        if node1 not in self.nodes:
+        if node1 not in self._node_set:
             self.nodes.append(node1)
-        if node2 not in self.nodes:
+            self._node_set.add(node1)
+        if node2 not in self._node_set:
             self.nodes.append(node2)
+            self._node_set.add(node2)
         if name == None:
             name = ("%s %s" % (node1, node2))
-        self.edges.append(Edge(name, node1, node2, length))
+        edge = Edge(name, node1, node2, length)
+        self.edges.append(edge)
+        self._index_edge(edge)
 
     def set_heuristic(self, start, goal, value):
         if goal not in self.heuristic:
             self.heuristic[goal] = {}
         self.heuristic[goal][start] = value
 
+    def use_landmarks(self, landmarks):
+        """
+        Answer get_heuristic() for goals with no heuristic values from
+        a landmarks.Landmarks for this graph, or not at all if None.
+        """
+        self.landmarks = landmarks
+
     def __str__(self):
         return "Graph: \n  edges="+str(self.edges)+"\n  heuristic="+str(self.heuristic)
 
+
+
+class SearchNode(object):
+    """
+    A path in a search, kept as its last node and a pointer to the
+    path it extends, so that extending a path doesn't copy it.
+    'depth' is the number of edges in the path and 'cost' the sum of
+    their lengths, as far as the search keeps track of them.
+    """
+    __slots__ = ('node', 'parent', 'depth', 'cost')
+
+    def __init__(self, node, parent=None, cost=0):
+        self.node = node
+        self.parent = parent
+        if parent is None:
+            self.depth = 0
+        else:
+            self.depth = parent.depth + 1
+        self.cost = cost
+
+    def extend(self, node, length=0):
+        """The path that goes on from this one to 'node'."""
+        return SearchNode(node, self, self.cost + length)
+
+    def path(self):
+        """The list of the names of the nodes on the path."""
+        path = []
+        search_node = self
+        while search_node is not None:
+            path.append(search_node.node)
+            search_node = search_node.parent
+        path.reverse()
+        return path
+
+    def __repr__(self):
+        return 'SearchNode(%r)' % (self.path(),)
+
+
+class PathTracker(object):
+    """
+    The set of nodes on the path to one SearchNode at a time, for
+    telling whether a node is on it in constant time.  Moving to
+    another SearchNode takes off the nodes that aren't shared with
+    the new path and puts on the ones that are new, so it costs the
+    distance between the two in the search tree: for a search that
+    goes on from the path it just looked at, usually one step.
+    """
+    def __init__(self):
+        self.at = None
+        self.nodes = set()
+
+    def move_to(self, search_node):
+        old, new = self.at, search_node
+        added = []
+        while old is not None and (new is None or old.depth > new.depth):
+            self.nodes.discard(old.node)
+            old = old.parent
+        while new is not None and (old is None or new.depth > old.depth):
+            added.append(new.node)
+            new = new.parent
+        while old is not new:
+            self.nodes.discard(old.node)
+            old = old.parent
+            added.append(new.node)
+            new = new.parent
+        self.nodes.update(added)
+        self.at = search_node
+
+    def __contains__(self, node):
+        return node in self.nodes
@@ -0,0 +1,124 @@
+"""
+Tests for checking heuristics from shortest distances (analysis.py).
+
+Run them from this directory with 'python -m unittest test_analysis'.
+"""
+
+import random
+import unittest
+
+import graphs
+from analysis import shortest_distances, DistanceMatrix, \
+     inadmissible_nodes, inconsistent_edges
+from lab2 import is_admissible, is_consistent, branch_and_bound, path_length
+from test_search import lab_graphs, random_graph
+from test_lab2 import random_heuristic
+
+
+# The checks as they were, with a search for every node or pair
+
+def old_is_admissible(graph, goal):
+    for node in graph.nodes:
+        heuristic = graph.get_heuristic(node, goal)
+        distance = path_length(graph, branch_and_bound(graph, node, goal))
+        if heuristic > distance: return False
+    return True
+
+def old_is_consistent(graph, goal):
+    for node1 in graph.nodes:
+        for node2 in graph.nodes:
+            h1 = graph.get_heuristic(node1, goal)
+            h2 = graph.get_heuristic(node2, goal)
+            distance = path_length(graph, branch_and_bound(graph, node1,
+                                                           node2))
+            if abs(h1 - h2) > distance: return False
+    return True
+
+def connected_graph(rng, nodes, edges):
+    """A random graph with a path between every two of its nodes."""
+    graph = random_graph(rng, nodes, edges)
+    for node in range(1, nodes):
+        graph.add_edge(str(rng.randrange(node)), str(node),
+                       rng.choice([2, 3, 5]))
+    return graph
+
+
+class DistanceTest(unittest.TestCase):
+    def test_shortest_distances(self):
+        rng = random.Random(6034)
+        for trial in range(100):
+            graph = random_graph(rng, rng.randint(1, 8), rng.randint(0, 12))
+            for source in graph.nodes:
+                distances = shortest_distances(graph, source)
+                for node in graph.nodes:
+                    path = branch_and_bound(graph, source, node)
+                    if path:
+                        self.assertEqual(distances[node],
+                                         path_length(graph, path))
+                    else:
+                        self.assertNotIn(node, distances)
+
+    def test_distance_matrix(self):
+        graph = random_graph(random.Random(1), 4, 0)
+        graph.add_edge('0', '1', 2)
+        graph.add_edge('1', '2', 3)
+        matrix = DistanceMatrix(graph)
+        self.assertEqual(matrix.distance('0', '2'), 5)
+        self.assertEqual(matrix.distance('2', '0'), 5)
+        self.assertIsNone(matrix.distance('3', '0'))
+        self.assertEqual(matrix.distance('3', '3'), 0)
+        self.assertIs(matrix.row('2'), matrix.row('2'))
+
+
+class HeuristicTest(unittest.TestCase):
+    def test_lab_graphs(self):
+        for graph in lab_graphs():
+            if len(graph.nodes) >= 30: continue
+            for goal in graph.heuristic:
+                self.assertEqual(is_admissible(graph, goal),
+                                 old_is_admissible(graph, goal))
+                self.assertEqual(is_consistent(graph, goal),
+                                 old_is_consistent(graph, goal))
+
+    def test_random_graphs(self):
+        rng = random.Random(6034)
+        for trial in range(150):
+            graph = connected_graph(rng, rng.randint(1, 7),
+                                    rng.randint(0, 8))
+            random_heuristic(rng, graph, values=(0, 1, 2, 3, 5, 8))
+            for goal in graph.nodes:
+                self.assertEqual(is_admissible(graph, goal),
+                                 old_is_admissible(graph, goal))
+                self.assertEqual(is_consistent(graph, goal),
+                                 old_is_consistent(graph, goal))
+
+    def test_what_is_wrong(self):
+        graph = graphs.NEWGRAPH1
+        matrix = DistanceMatrix(graph)
+        for goal in graph.nodes:
+            distances = shortest_distances(graph, goal)
+            self.assertEqual(inadmissible_nodes(graph, goal, matrix),
+                             [node for node in graph.nodes
+                              if graph.get_heuristic(node, goal) >
+                              distances[node]])
+            for edge in graph.edges:
+                difference = abs(graph.get_heuristic(edge.node1, goal) -
+                                 graph.get_heuristic(edge.node2, goal))
+                self.assertEqual(edge in inconsistent_edges(graph, goal),
+                                 difference > edge.length)
+
+    def test_unreachable(self):
+        # No heuristic value is too big for a node that can't get there
+        graph = random_graph(random.Random(1), 3, 0)
+        graph.add_edge('0', '1', 1)
+        graph.set_heuristic('2', '0', 100)
+        self.assertTrue(is_admissible(graph, '0'))
+        graph.set_heuristic('1', '0', 2)
+        self.assertEqual(inadmissible_nodes(graph, '0'), ['1'])
+        self.assertEqual([edge.name for edge in inconsistent_edges(graph,
+                                                                   '0')],
+                         ['0 1'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+"""
+Tests for bidirectional_bfs and bidirectional_a_star (lab2.py).
+
+Run them from this directory with 'python -m unittest test_bidirectional'.
+"""
+
+import random
+import unittest
+
+from analysis import is_consistent, shortest_distances
+from csrgraph import CSRGraph
+from lab2 import bfs, branch_and_bound, a_star, path_length, \
+     bidirectional_bfs, bidirectional_a_star
+from test_search import lab_graphs, random_graph
+
+
+class BidirectionalTest(unittest.TestCase):
+    def check_path(self, graph, start, goal, path, expected, length):
+        # Any path is as good as 'expected' if it is just as long
+        if not expected:
+            self.assertEqual(path, [])
+            return
+        self.assertEqual((path[0], path[-1]), (start, goal))
+        self.assertTrue(graph.is_valid_path(path), path)
+        self.assertEqual(len(set(path)), len(path))
+        self.assertEqual(length(path), length(expected), (start, goal))
+
+    def check(self, graph, consistent=True):
+        length = lambda path: path_length(graph, path)
+        for start in graph.nodes:
+            for goal in graph.nodes:
+                self.check_path(graph, start, goal,
+                                bidirectional_bfs(graph, start, goal),
+                                bfs(graph, start, goal, True), len)
+                if not consistent: continue
+                if len(graph.nodes) < 10:
+                    expected = branch_and_bound(graph, start, goal)
+                else:
+                    expected = a_star(graph, start, goal)
+                self.check_path(graph, start, goal,
+                                bidirectional_a_star(graph, start, goal),
+                                expected, length)
+
+    def test_lab_graphs(self):
+        for graph in lab_graphs():
+            # Bidirectional A* needs heuristics that are consistent
+            # for every goal it might be given
+            self.check(graph, not [node for node in graph.nodes
+                                   if not is_consistent(graph, node)])
+
+    def test_random_graphs(self):
+        rng = random.Random(6034)
+        for trial in range(150):
+            graph = random_graph(rng, rng.randint(1, 10),
+                                 rng.randint(0, 16))
+            # Scaled shortest distances are consistent
+            for goal in graph.nodes:
+                scale = rng.choice([0, 0.5, 1])
+                for node, distance in shortest_distances(graph,
+                                                         goal).items():
+                    graph.set_heuristic(node, goal, scale * distance)
+            self.check(graph)
+            if trial % 10 == 0:
+                self.check(CSRGraph.from_graph(graph))
+
+    def test_unreachable(self):
+        graph = random_graph(random.Random(1), 2, 0)
+        self.assertEqual(bidirectional_bfs(graph, '0', '1'), [])
+        self.assertEqual(bidirectional_a_star(graph, '0', '1'), [])
+        self.assertEqual(bidirectional_a_star(graph, '0', '0'), ['0'])
+
+
+if __name__ == '__main__':
+    unittest.main()
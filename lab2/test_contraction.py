@@ -0,0 +1,80 @@
+"""
+Tests for contraction hierarchies (contraction.py).
+
+Run them from this directory with 'python -m unittest test_contraction'.
+"""
+
+import random
+import unittest
+
+from analysis import shortest_distances
+from csrgraph import CSRGraph
+from contraction import ContractionHierarchy
+from lab2 import branch_and_bound, path_length
+from test_search import lab_graphs, random_graph
+
+
+class ContractionTest(unittest.TestCase):
+    def check(self, graph, settle_limit=50):
+        hierarchy = ContractionHierarchy(graph, settle_limit)
+        for start in graph.nodes:
+            distances = shortest_distances(graph, start)
+            for goal in graph.nodes:
+                path = hierarchy.shortest_path(start, goal)
+                distance = hierarchy.distance(start, goal)
+                if goal not in distances:
+                    self.assertEqual(path, [])
+                    self.assertIsNone(distance)
+                    continue
+                self.assertEqual((path[0], path[-1]), (start, goal))
+                self.assertTrue(graph.is_valid_path(path), path)
+                self.assertAlmostEqual(path_length(graph, path),
+                                       distances[goal], msg=(start, goal))
+                self.assertAlmostEqual(distance, distances[goal])
+                if len(graph.nodes) < 10:
+                    expected = branch_and_bound(graph, start, goal)
+                    self.assertAlmostEqual(path_length(graph, path),
+                                           path_length(graph, expected))
+        return hierarchy
+
+    def test_lab_graphs(self):
+        for graph in lab_graphs():
+            self.check(graph)
+
+    def test_random_graphs(self):
+        rng = random.Random(6034)
+        for trial in range(150):
+            graph = random_graph(rng, rng.randint(1, 12),
+                                 rng.randint(0, 24))
+            # With witness searches cut short, shortcuts that aren't
+            # needed are added, but the paths are no longer
+            self.check(graph, rng.choice([1, 2, 50]))
+            if trial % 10 == 0:
+                self.check(CSRGraph.from_graph(graph))
+
+    def test_same_node(self):
+        graph = random_graph(random.Random(1), 3, 0)
+        graph.add_edge('0', '1', 2)
+        hierarchy = ContractionHierarchy(graph)
+        self.assertEqual(hierarchy.shortest_path('2', '2'), ['2'])
+        self.assertEqual(hierarchy.distance('2', '2'), 0)
+        self.assertEqual(hierarchy.shortest_path('0', '2'), [])
+        self.assertIsNone(hierarchy.distance('2', '1'))
+        self.assertEqual(hierarchy.shortest_path('1', '0'), ['1', '0'])
+
+    def test_shortcuts(self):
+        # Only contracting a path from its ends inwards needs no
+        # shortcuts, and counting the neighbours already contracted
+        # keeps it from doing that
+        graph = random_graph(random.Random(1), 6, 0)
+        for node in range(5):
+            graph.add_edge(str(node), str(node + 1), 1)
+        hierarchy = self.check(graph)
+        self.assertTrue(hierarchy.shortcut_count > 0)
+        self.assertEqual(hierarchy.shortest_path('0', '5'),
+                         ['0', '1', '2', '3', '4', '5'])
+        self.assertEqual(hierarchy.distance('5', '0'), 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+"""
+Tests that a CSRGraph (csrgraph.py) answers as the Graph it was made
+from does.
+
+Run them from this directory with 'python -m unittest test_csrgraph'.
+"""
+
+import random
+import unittest
+
+import graphs
+from csrgraph import CSRGraph
+from lab2 import bfs, dfs, hill_climbing, beam_search, branch_and_bound, \
+     a_star, path_length
+from test_search import lab_graphs, random_graph
+from test_lab2 import random_heuristic
+
+
+def edge_tuple(edge):
+    if edge is None: return None
+    return (edge.name, edge.node1, edge.node2, edge.length)
+
+
+class CSRGraphTest(unittest.TestCase):
+    def compare(self, graph, searches=True):
+        csr = CSRGraph.from_graph(graph)
+        self.assertEqual(csr.nodes, sorted(graph.nodes))
+        self.assertEqual([edge_tuple(edge) for edge in csr.edges],
+                         [edge_tuple(edge) for edge in graph.edges])
+        for node1 in graph.nodes:
+            self.assertEqual(csr.get_connected_nodes(node1),
+                             graph.get_connected_nodes(node1))
+            for node2 in graph.nodes:
+                self.assertEqual(edge_tuple(csr.get_edge(node1, node2)),
+                                 edge_tuple(graph.get_edge(node1, node2)))
+                self.assertEqual(csr.get_heuristic(node1, node2),
+                                 graph.get_heuristic(node1, node2))
+                if not searches: continue
+                for search in (bfs, dfs, hill_climbing, a_star):
+                    self.assertEqual(search(csr, node1, node2),
+                                     search(graph, node1, node2),
+                                     (search, node1, node2))
+                self.assertEqual(beam_search(csr, node1, node2, 2),
+                                 beam_search(graph, node1, node2, 2))
+
+    def test_lab_graphs(self):
+        for graph in lab_graphs():
+            self.compare(graph, searches=len(graph.nodes) < 30)
+
+    def test_random_graphs(self):
+        rng = random.Random(6034)
+        for trial in range(100):
+            graph = random_graph(rng, rng.randint(1, 8), rng.randint(0, 12))
+            random_heuristic(rng, graph, values=(0, 1, 2, 2.5))
+            self.compare(graph)
+
+    def test_branch_and_bound(self):
+        graph = graphs.GRAPH2
+        csr = CSRGraph.from_graph(graph)
+        for start in graph.nodes:
+            for goal in graph.nodes:
+                self.assertEqual(path_length(csr, branch_and_bound(csr, start,
+                                                                   goal)),
+                                 path_length(graph,
+                                             branch_and_bound(graph, start,
+                                                              goal)))
+
+    def test_set_heuristic(self):
+        csr = CSRGraph([('a', 'b', 1), ('b', 'c', 2, 'bc')], nodes=['d'])
+        self.assertEqual(csr.nodes, ['a', 'b', 'c', 'd'])
+        self.assertEqual(csr.get_edge('c', 'b').name, 'bc')
+        self.assertIsNone(csr.get_edge('a', 'd'))
+        self.assertEqual(csr.get_heuristic('a', 'c'), 0)
+        csr.set_heuristic('a', 'c', 3)
+        csr.set_heuristic('b', 'c', 2.5)
+        self.assertEqual(csr.get_heuristic('a', 'c'), 3)
+        self.assertEqual(csr.get_heuristic('b', 'c'), 2.5)
+        self.assertEqual(csr.get_heuristic('d', 'c'), 0)
+        self.assertTrue(csr.is_valid_path(['a', 'b', 'c']))
+        self.assertFalse(csr.is_valid_path(['a', 'c']))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,216 @@
+"""
+Tests that the searches in lab2.py return the paths the list-based
+searches they replaced did.
+
+Run them from this directory with 'python -m unittest test_lab2'.
+"""
+
+import random
+import unittest
+
+from search import Graph
+from lab2 import bfs, dfs, hill_climbing, beam_search, branch_and_bound, \
+     a_star, path_length
+from test_search import lab_graphs, random_graph
+
+
+# The searches as they were, copying each path and the whole agenda
+# on each step
+
+def old_bfs(graph, start, goal):
+    if start == goal: return [start]
+    queue = [[start]]
+    while len(queue) != 0:
+        considered_path = queue[0]
+        queue = queue[1:]
+        if considered_path[-1] == goal: return considered_path
+        connected_nodes = graph.get_connected_nodes(considered_path[-1])
+        queue_addition = [considered_path + [connected_node]
+                          for connected_node in connected_nodes
+                          if not connected_node in considered_path]
+        queue = queue + queue_addition
+    return []
+
+def old_dfs(graph, start, goal):
+    if start == goal: return [start]
+    stack = [[start]]
+    while len(stack) != 0:
+        considered_path = stack[0]
+        stack = stack[1:]
+        if considered_path[-1] == goal: return considered_path
+        connected_nodes = graph.get_connected_nodes(considered_path[-1])
+        stack_addition = [considered_path + [connected_node]
+                          for connected_node in connected_nodes
+                          if not connected_node in considered_path]
+        stack = stack_addition + stack
+    return []
+
+def old_hill_climbing(graph, start, goal):
+    if start == goal: return [start]
+    stack = [[start]]
+    while len(stack) != 0:
+        considered_path = stack[0]
+        stack = stack[1:]
+        if considered_path[-1] == goal: return considered_path
+        connected_nodes = graph.get_connected_nodes(considered_path[-1])
+        stack_addition = [considered_path + [connected_node]
+                          for connected_node in connected_nodes
+                          if not connected_node in considered_path]
+        stack = sorted(stack_addition,
+                       key = lambda x: graph.get_heuristic(x[-1], goal)) + \
+                stack
+    return []
+
+def old_beam_search(graph, start, goal, beam_width):
+    if start == goal: return [start]
+    queue = [[start]]
+    while len(queue) != 0:
+        extending_length = len(queue[0])
+        extending_paths = [path for path in queue
+                           if len(path) == extending_length]
+        queue = queue[len(extending_paths):]
+        queue_add_candidates = []
+        for path in extending_paths:
+            if path[-1] == goal: return path
+            next_nodes = [node for node in
+                          graph.get_connected_nodes(path[-1])
+                          if not node in path]
+            queue_add_candidates = (queue_add_candidates +
+                                    [path + [node]
+                                     for node in next_nodes])
+        sort_candidates = sorted(queue_add_candidates,
+                                 key = lambda x:graph.get_heuristic(x[-1],
+                                                                    goal))
+        queue = sort_candidates[:beam_width] + queue
+    return []
+
+def old_branch_and_bound(graph, start, goal):
+    if start == goal: return [start]
+    agenda = [[start]]
+    while len(agenda) != 0:
+        considered_path = agenda[0]
+        agenda = agenda[1:]
+        if considered_path[-1] == goal: return considered_path
+        connected_nodes = graph.get_connected_nodes(considered_path[-1])
+        agenda_addition = [considered_path + [connected_node]
+                           for connected_node in connected_nodes
+                           if not connected_node in considered_path]
+        agenda = sorted(agenda_addition + agenda,
+                        key = lambda x: path_length(graph, x))
+    return []
+
+def old_a_star(graph, start, goal):
+    if start == goal: return [start]
+    agenda = [[start]]
+    extended_set = set()
+    while len(agenda) != 0:
+        considered_path = agenda[0]
+        extended_set.add(considered_path[-1])
+        agenda = agenda[1:]
+        if considered_path[-1] == goal: return considered_path
+        connected_nodes = graph.get_connected_nodes(considered_path[-1])
+        agenda_addition = [considered_path + [connected_node]
+                           for connected_node in connected_nodes
+                           if ((not connected_node in considered_path)
+                               and (not connected_node in extended_set))]
+        agenda = sorted(agenda_addition + agenda,
+                        key = lambda x: (path_length(graph, x) +
+                                         graph.get_heuristic(x[-1], goal)))
+    return []
+
+def beam_searches(beam_width):
+    return (lambda graph, start, goal:
+            beam_search(graph, start, goal, beam_width),
+            lambda graph, start, goal:
+            old_beam_search(graph, start, goal, beam_width))
+
+SEARCHES = [(bfs, old_bfs), (dfs, old_dfs),
+            (hill_climbing, old_hill_climbing),
+            beam_searches(1), beam_searches(2), beam_searches(10),
+            (branch_and_bound, old_branch_and_bound), (a_star, old_a_star)]
+
+def random_heuristic(rng, graph, values=(0, 1, 2, 2.5, 4)):
+    """Give about half the pairs of nodes in 'graph' a heuristic value."""
+    for goal in graph.nodes:
+        for start in graph.nodes:
+            if rng.random() < .5:
+                graph.set_heuristic(start, goal, rng.choice(values))
+
+
+class SearchTest(unittest.TestCase):
+    def compare(self, graph):
+        for start in graph.nodes:
+            for goal in graph.nodes:
+                for search, old_search in SEARCHES:
+                    self.assertEqual(search(graph, start, goal),
+                                     old_search(graph, start, goal),
+                                     (old_search.__name__, start, goal))
+
+    def test_lab_graphs(self):
+        for graph in lab_graphs():
+            if len(graph.nodes) < 30:
+                self.compare(graph)
+
+    def test_random_graphs(self):
+        # Few different lengths make for many ties between paths
+        rng = random.Random(6034)
+        for trial in range(150):
+            graph = random_graph(rng, rng.randint(1, 7), rng.randint(0, 11),
+                                 lengths=rng.choice([(1,), (1, 2),
+                                                     (1, 2, 3, 5, 1.5)]))
+            random_heuristic(rng, graph)
+            self.compare(graph)
+
+
+class CountingGraph(object):
+    """A graph that counts the calls to its get_connected_nodes()."""
+    def __init__(self, graph):
+        self.graph = graph
+        self.expanded = []
+
+    def get_connected_nodes(self, node):
+        self.expanded.append(node)
+        return self.graph.get_connected_nodes(node)
+
+    def get_heuristic(self, start, goal):
+        return self.graph.get_heuristic(start, goal)
+
+
+class ExtendedSetTest(unittest.TestCase):
+    def test_paths(self):
+        rng = random.Random(6034)
+        for trial in range(150):
+            graph = random_graph(rng, rng.randint(1, 8), rng.randint(0, 14))
+            random_heuristic(rng, graph)
+            for start in graph.nodes:
+                for goal in graph.nodes:
+                    shortest = old_bfs(graph, start, goal)
+                    for search in (bfs, dfs, hill_climbing):
+                        path = search(graph, start, goal, True)
+                        if not shortest:
+                            self.assertEqual(path, [])
+                            continue
+                        self.assertEqual((path[0], path[-1]), (start, goal))
+                        self.assertTrue(graph.is_valid_path(path), path)
+                        self.assertEqual(len(set(path)), len(path))
+                    self.assertEqual(len(bfs(graph, start, goal, True)),
+                                     len(shortest))
+
+    def test_each_node_once(self):
+        # Every order of the nodes of a complete graph is a path, but
+        # each node is extended at most once
+        nodes = [str(node) for node in range(8)]
+        graph = Graph(nodes=nodes + ['goal'])
+        for node1 in nodes:
+            for node2 in nodes:
+                if node1 < node2:
+                    graph.add_edge(node1, node2, 1)
+        graph.add_edge('0', '0', 1, name='loop')
+        for search in (bfs, dfs, hill_climbing):
+            counting = CountingGraph(graph)
+            self.assertEqual(search(counting, '0', 'goal', True), [])
+            self.assertEqual(sorted(counting.expanded), nodes)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,124 @@
+"""
+Tests for landmark lower bounds (landmarks.py).
+
+Run them from this directory with 'python -m unittest test_landmarks'.
+"""
+
+import json
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+import graphs
+from search import Graph
+from analysis import shortest_distances
+from csrgraph import CSRGraph
+from landmarks import Landmarks
+from lab2 import branch_and_bound, a_star, path_length
+from test_search import lab_graphs, random_graph
+
+
+def without_heuristic(graph):
+    """A copy of 'graph' with no heuristic values of its own."""
+    return Graph(nodes=list(graph.nodes), edges=list(graph.edges))
+
+
+class LandmarksTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'landmarks.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def check_bounds(self, graph, landmarks):
+        for start in graph.nodes:
+            distances = shortest_distances(graph, start)
+            for goal in graph.nodes:
+                bound = landmarks.lower_bound(start, goal)
+                self.assertTrue(bound >= 0)
+                if goal in distances:
+                    self.assertTrue(bound <= distances[goal] + 1e-9,
+                                    (start, goal))
+
+    def check_searches(self, graph):
+        length = lambda path: path_length(graph, path)
+        for start in graph.nodes:
+            for goal in graph.nodes:
+                path = a_star(graph, start, goal)
+                expected = branch_and_bound(graph, start, goal)
+                if not expected:
+                    self.assertEqual(path, [])
+                    continue
+                self.assertTrue(graph.is_valid_path(path), path)
+                self.assertEqual(length(path), length(expected),
+                                 (start, goal))
+
+    def test_lab_graphs(self):
+        for graph in lab_graphs():
+            self.check_bounds(graph, Landmarks(graph, count=4))
+
+    def test_random_graphs(self):
+        rng = random.Random(6034)
+        for trial in range(60):
+            graph = random_graph(rng, rng.randint(1, 9), rng.randint(0, 14))
+            landmarks = Landmarks(graph, count=rng.randint(1, 4))
+            self.check_bounds(graph, landmarks)
+            graph.use_landmarks(landmarks)
+            self.check_searches(graph)
+            if trial % 10 == 0:
+                csr = CSRGraph.from_graph(graph)
+                csr.use_landmarks(Landmarks(csr, count=3))
+                self.check_searches(csr)
+
+    def test_a_star(self):
+        graph = without_heuristic(graphs.GRAPH2)
+        graph.use_landmarks(Landmarks(graph, count=3))
+        self.check_searches(graph)
+
+    def test_chosen_landmarks(self):
+        graph = random_graph(random.Random(2), 5, 0)
+        graph.add_edge('0', '1', 2)
+        landmarks = Landmarks(graph, landmarks=['0', '4'])
+        self.assertEqual(landmarks.landmarks, ['0', '4'])
+        self.assertEqual(landmarks.distance('0', '1'), 2)
+        self.assertIsNone(landmarks.distance('0', '4'))
+        self.assertEqual(landmarks.lower_bound('1', '0'), 2)
+        self.assertEqual(landmarks.lower_bound('1', '4'), 0)
+
+    def test_save_and_load(self):
+        graph = random_graph(random.Random(3), 8, 6)
+        landmarks = Landmarks(graph, count=3)
+        landmarks.save(self.path)
+        with open(self.path) as file:
+            self.assertEqual(json.load(file)['landmarks'],
+                             landmarks.landmarks)
+        loaded = Landmarks.load(self.path, graph)
+        self.assertEqual(loaded.landmarks, landmarks.landmarks)
+        for landmark in landmarks.landmarks:
+            for node in graph.nodes:
+                self.assertEqual(loaded.distance(landmark, node),
+                                 landmarks.distance(landmark, node))
+        for start in graph.nodes:
+            for goal in graph.nodes:
+                self.assertEqual(loaded.lower_bound(start, goal),
+                                 landmarks.lower_bound(start, goal))
+
+    def test_load_errors(self):
+        graph = random_graph(random.Random(4), 6, 8)
+        Landmarks(graph, count=2).save(self.path)
+        graph.add_edge('0', '5', 1)
+        self.assertRaises(ValueError, Landmarks.load, self.path, graph)
+        self.assertRaises(ValueError, Landmarks.load, self.path,
+                          random_graph(random.Random(4), 7, 8))
+        for contents in ('not json', '[1, 2]', '{"version": 1}',
+                         '{"version": 99}'):
+            with open(self.path, 'w') as file:
+                file.write(contents)
+            self.assertRaises(ValueError, Landmarks.load, self.path, graph)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,172 @@
+"""
+Tests for the Graph indexes and validation, and the search paths,
+in search.py.
+
+Run them from this directory with 'python -m unittest test_search'.
+"""
+
+import random
+import unittest
+
+import graphs
+from search import Graph, SearchNode, PathTracker
+
+
+def lab_graphs():
+    """The graphs in graphs.py."""
+    return [getattr(graphs, name) for name in sorted(dir(graphs))
+            if isinstance(getattr(graphs, name), Graph)]
+
+def random_graph(rng, nodes, edges, lengths=(1, 2, 3, 5, 1.5)):
+    """A Graph with 'nodes' nodes and up to 'edges' random edges."""
+    graph = Graph(nodes=[str(node) for node in range(nodes)])
+    for edge in range(edges):
+        node1, node2 = rng.randrange(nodes), rng.randrange(nodes)
+        graph.add_edge(str(node1), str(node2), rng.choice(lengths),
+                       name=rng.choice([None, 'e%d' % edge]))
+    return graph
+
+def scanned_neighbours(graph, node):
+    # How get_connected_nodes() found them before the indexes
+    result = [x.node2 for x in graph.edges if x.node1 == node]
+    result += [x.node1 for x in graph.edges if x.node2 == node]
+    return sorted(result)
+
+def scanned_edge(graph, node1, node2):
+    # How get_edge() found it before the indexes
+    for edge in graph.edges:
+        if ((edge.node1, edge.node2) == (node1, node2) or
+            (edge.node2, edge.node1) == (node1, node2)):
+            return edge
+    return None
+
+
+class GraphTest(unittest.TestCase):
+    def compare(self, graph):
+        for node1 in graph.nodes:
+            self.assertEqual(graph.get_connected_nodes(node1),
+                             scanned_neighbours(graph, node1))
+            for node2 in graph.nodes:
+                self.assertIs(graph.get_edge(node1, node2),
+                              scanned_edge(graph, node1, node2))
+
+    def test_lab_graphs(self):
+        for graph in lab_graphs():
+            self.compare(graph)
+
+    def test_random_graphs(self):
+        # Small graphs have parallel edges and loops to spare
+        rng = random.Random(6034)
+        for trial in range(200):
+            self.compare(random_graph(rng, rng.randint(1, 8),
+                                      rng.randint(0, 16)))
+
+    def test_add_edge(self):
+        graph = Graph(edges=list(graphs.GRAPH1.edges))
+        graph.add_edge('Common Area', 'Roof', 4)
+        graph.add_edge('Roof', 'Common Area', 2, name='stairs')
+        self.assertIn('Roof', graph.nodes)
+        self.assertEqual(graph.get_connected_nodes('Roof'),
+                         ['Common Area', 'Common Area'])
+        self.assertEqual(graph.get_edge('Roof', 'Common Area').length, 4)
+        self.compare(graph)
+        self.assertRaises(AssertionError, graph.get_edge, 'Roof', 'Attic')
+
+    def test_heuristic(self):
+        graph = Graph(edges=list(graphs.GRAPH1.edges),
+                      heuristic={'Common Area': {'Stairs': 2}})
+        self.assertEqual(graph.get_heuristic('Stairs', 'Common Area'), 2)
+        self.assertEqual(graph.get_heuristic('Common Area', 'Stairs'), 0)
+        # Values for nodes not in the graph are left alone, but the
+        # ones that are have to be at least 0
+        Graph(edges=list(graphs.GRAPH1.edges),
+              heuristic={'Attic': {'Stairs': -1}})
+        self.assertRaises(AssertionError, Graph,
+                          edges=list(graphs.GRAPH1.edges),
+                          heuristic={'Common Area': {'Stairs': -1}})
+
+
+class ValidationTest(unittest.TestCase):
+    # Each of these is wrong in one way
+    BAD = [dict(nodes=['a', 'b', 'a']),
+           dict(nodes=['a', 1]),
+           dict(nodes=['a', 'b'], edgesdict=[
+               {'NAME': 'e1', 'LENGTH': 0, 'NODE1': 'a', 'NODE2': 'b'}]),
+           dict(nodes=['a', 'b'], edgesdict=[
+               {'NAME': 'e1', 'LENGTH': 1, 'NODE1': 'a', 'NODE2': 'c'}]),
+           dict(nodes=['a', 'b'], edgesdict=[
+               {'NAME': 'e1', 'LENGTH': 1, 'NODE1': 'a', 'NODE2': 'b'},
+               {'NAME': 'e1', 'LENGTH': 2, 'NODE1': 'b', 'NODE2': 'a'}]),
+           dict(nodes=['a', 'b'], heuristic={'a': {'b': -1}})]
+
+    def test_full(self):
+        for arguments in self.BAD:
+            self.assertRaises(AssertionError, Graph, **arguments)
+            graph = Graph(validation='off', **arguments)
+            self.assertRaises(AssertionError, graph.validate)
+            self.assertRaises(AssertionError,
+                              graph.validate_async().result, 10)
+
+    def test_sample(self):
+        # A sample as big as the graph finds all but duplicates
+        for arguments in self.BAD[1:4] + self.BAD[5:]:
+            self.assertRaises(AssertionError, Graph, validation='sample',
+                              **arguments)
+        graph = Graph(validation='sample', **self.BAD[0])
+        graph.validate_sample(size=1)
+        # A small one looks at only some of a big graph
+        nodes = [str(node) for node in range(100)]
+        graph = Graph(nodes=nodes + [100], validation='off')
+        found = 0
+        for seed in range(20):
+            try:
+                graph.validate_sample(size=10, seed=seed)
+            except AssertionError:
+                found += 1
+        self.assertTrue(0 < found < 20)
+
+    def test_good_graphs(self):
+        for graph in lab_graphs():
+            for validation in ('full', 'sample', 'off'):
+                Graph(nodes=list(graph.nodes), edges=list(graph.edges),
+                      heuristic=graph.heuristic, validation=validation)
+            self.assertIsNone(graph.validate_async().result(10))
+
+    def test_unknown_mode(self):
+        self.assertRaises(ValueError, Graph, nodes=['a'], validation='lazy')
+
+
+class SearchNodeTest(unittest.TestCase):
+    def test_extend(self):
+        root = SearchNode('a')
+        child = root.extend('b', 2).extend('c', 1.5)
+        self.assertEqual(child.path(), ['a', 'b', 'c'])
+        self.assertEqual((child.depth, child.cost), (2, 3.5))
+        self.assertIs(child.parent.parent, root)
+        self.assertEqual(root.path(), ['a'])
+        self.assertEqual((root.depth, root.cost), (0, 0))
+
+    def test_path_tracker(self):
+        # Moving about a random search tree, the tracker holds the
+        # nodes of the path it is at, and nothing else
+        rng = random.Random(6034)
+        search_nodes = [SearchNode('0')]
+        for trial in range(300):
+            parent = rng.choice(search_nodes)
+            path = parent.path()
+            node = rng.choice([str(node) for node in range(12)
+                               if str(node) not in path] or [None])
+            if node is not None:
+                search_nodes.append(parent.extend(node))
+        tracker = PathTracker()
+        self.assertNotIn('0', tracker)
+        for trial in range(500):
+            search_node = rng.choice(search_nodes)
+            tracker.move_to(search_node)
+            self.assertEqual(tracker.nodes, set(search_node.path()))
+        tracker.move_to(None)
+        self.assertEqual(tracker.nodes, set())
+
+
+if __name__ == '__main__':
+    unittest.main()